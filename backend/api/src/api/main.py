@@ -1,6 +1,8 @@
 import asyncio
 import json
+import os
 import re
+import socket
 import time
 from collections import defaultdict
 from contextlib import asynccontextmanager
@@ -13,11 +15,18 @@ from fastapi import HTTPException, Query, websockets
 from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from loguru import logger
-from pydantic import BaseModel
-from shared.cty import ensure_cty_available
+from pydantic import BaseModel, ValidationError
+from shared.cty import ensure_cty_available, run_cty_refresh_loop
 from shared.db import GeoCache, HolySpot, PropagationMeasurement, SpotsWithIssues
-from shared.geo import GeoException, get_geo_details
-from shared.metrics import push_exception_event, set_timestamp, set_value
+from shared.geo import (
+    GeoException,
+    configure_local_geo_cache,
+    get_geo_details,
+    get_geo_details_batch,
+    prepare_cty_resolver,
+)
+from shared.metrics import push_exception_event, queue_timestamp, queue_values, report_worker_value, set_timestamp
+from shared.qrz import configure_qrz_client
 from sqlalchemy import desc, func
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
@@ -26,6 +35,10 @@ from sqlmodel import select
 
 from . import propagation, submit_spot, voacap
 from .settings import settings
+from .spot_buffer import SpotBuffer
+from .spot_filters import SpotFilter, SpotIndex, filter_spots
+from .spot_frames import encode_spots_message, negotiate_frame_format
+from .websocket_clients import SpotsClient, broadcast_spots
 
 
 def build_propagation_measurement_rows(history, collected_at):
@@ -92,11 +105,34 @@ async def propagation_data_collector(app):
         await asyncio.sleep(sleep)
 
 
-async def spots_broadcast_task(app):
-    STREAM_NAME = "stream-api"
-    CONSUMER_GROUP = "api-group"
-    CONSUMER_NAME = "consumer_1"
+async def get_spots_stream_cursor(valkey_client) -> tuple[str, int | None]:
+    """
+    Return the ID and seq of the newest spot in the stream, reading from the ID returns only later spots.
+
+    The seq is None for an empty stream or a spot without one.
+    """
+    entries = await valkey_client.xrevrange(SPOTS_STREAM_NAME, count=1)
+    if not entries:
+        return "0-0", None
+    entry_id, fields = entries[0]
+    seq = fields.get("seq")
+    return entry_id, int(seq) if seq is not None else None
+
+
+async def report_broadcast(valkey_client, metrics: dict):
+    async with valkey_client.pipeline(transaction=False) as pipeline:
+        queue_timestamp(pipeline, "api:last_broadcast_time")
+        queue_values(pipeline, metrics)
+        await pipeline.execute()
 
+
+async def spots_broadcast_task(app, stream_cursor: str):
+    """
+    Read every spot of the stream and broadcast it to this worker's clients.
+
+    Each worker keeps its own cursor with plain XREAD, so several workers or replicas
+    all see the full stream. The collector caps the stream length when adding to it.
+    """
     valkey_client = redis.asyncio.Redis(
         host=settings.valkey_effective_host,
         port=settings.valkey_effective_port,
@@ -104,59 +140,72 @@ async def spots_broadcast_task(app):
         decode_responses=True,
     )
 
-    try:
-        await valkey_client.xgroup_create(STREAM_NAME, CONSUMER_GROUP, id="0", mkstream=True)
-    except redis.exceptions.ResponseError:
-        pass
-
     while True:
         await set_timestamp(valkey_client, "api:heartbeat")
 
-        response = await valkey_client.xreadgroup(
-            CONSUMER_GROUP, CONSUMER_NAME, {STREAM_NAME: ">"}, count=10, block=60000
+        response = await valkey_client.xread(
+            {SPOTS_STREAM_NAME: stream_cursor},
+            count=settings.spots_stream_read_count,
+            block=60000,
         )
         if not response:
             continue
 
-        try:
-            for stream_name, messages in response:
-                spots = []
-                for msg_id, spot in messages:
-                    await valkey_client.xack(STREAM_NAME, CONSUMER_GROUP, msg_id)
-                    await valkey_client.xtrim(STREAM_NAME, minid=msg_id, approximate=False)
+        # The cursor moves past the batch even if the broadcast fails, clients that missed it catch up from the buffer.
+        for _stream_name, messages in response:
+            stream_cursor = messages[-1][0]
 
+        try:
+            spots = []
+            for _stream_name, messages in response:
+                for _msg_id, spot in messages:
                     spot = cleanup_spot(spot)
                     if spot is not None:
                         spots.append(spot)
 
-                message = {"type": "update", "spots": spots}
-
-                disconnected = set()
-                for websocket in app.state.active_connections.copy():
-                    try:
-                        await websocket.send_json(message)
-                    except Exception as e:
-                        logger.warning(f"Failed to send to websocket: {e}")
-                        disconnected.add(websocket)
+            app.state.spot_buffer.extend(spots)
+            spot_index = SpotIndex(spots)
 
-                for websocket in disconnected:
-                    app.state.active_connections.discard(websocket)
-
-                await set_timestamp(valkey_client, "api:last_broadcast_time")
-                await set_value(valkey_client, "api:ws_clients", len(app.state.active_connections))
+            fanout_start = time.perf_counter()
+            max_send_lag = broadcast_spots(app.state.active_connections, spot_index)
+            fanout_ms = (time.perf_counter() - fanout_start) * 1000
 
+            await report_broadcast(
+                valkey_client,
+                {
+                    "api:broadcast_fanout_ms": round(fanout_ms, 3),
+                    "api:ws_max_send_lag_ms": round(max_send_lag * 1000, 3),
+                },
+            )
         except Exception as e:
             logger.exception(f"Error in spots broadcast task: {e}")
             await push_exception_event(valkey_client, "api", f"broadcast: {e}")
 
 
+async def ws_clients_report_task(app):
+    while True:
+        try:
+            await report_worker_value(
+                app.state.valkey_client,
+                "api:ws_clients",
+                app.state.worker_id,
+                len(app.state.active_connections),
+                WS_CLIENTS_REPORT_TTL,
+            )
+        except Exception as e:
+            logger.exception(f"Failed to report websocket clients: {e}")
+        await asyncio.sleep(WS_CLIENTS_REPORT_INTERVAL)
+
+
 @asynccontextmanager
 async def lifespan(app: fastapi.FastAPI):
     if not settings.ui_dist_path.is_dir():
         raise RuntimeError(f"UI directory does not exist: {settings.ui_dist_path}")
 
+    app.state.worker_id = f"{socket.gethostname()}:{os.getpid()}"
     app.state.active_connections = set()
     app.state.propagation = None
+    app.state.spot_buffer = SpotBuffer(settings.spot_buffer_max_spots, settings.spot_buffer_max_age)
 
     app.state.valkey_client = redis.asyncio.Redis(
         host=settings.valkey_effective_host,
@@ -167,11 +216,29 @@ async def lifespan(app: fastapi.FastAPI):
 
     app.state.http_client = httpx.AsyncClient()
 
-    await ensure_cty_available(http_client=app.state.http_client)
+    await ensure_cty_available(http_client=app.state.http_client, prepare=prepare_cty_resolver)
+    configure_local_geo_cache(
+        settings.geo_local_cache_size, settings.geo_local_cache_ttl, settings.geo_negative_cache_ttl
+    )
+    configure_qrz_client(
+        settings.qrz_rate_limit,
+        settings.qrz_rate_limit_burst,
+        settings.qrz_breaker_failure_threshold,
+        settings.qrz_breaker_reset_seconds,
+    )
+    # Take the cursor before seeding, spots added in between are read twice and deduplicated by the buffer.
+    stream_cursor, stream_seq = await get_spots_stream_cursor(app.state.valkey_client)
+    await seed_spot_buffer(app, stream_seq)
 
     tasks = [
         asyncio.create_task(propagation_data_collector(app)),
-        asyncio.create_task(spots_broadcast_task(app)),
+        asyncio.create_task(spots_broadcast_task(app, stream_cursor)),
+        asyncio.create_task(ws_clients_report_task(app)),
+        asyncio.create_task(
+            run_cty_refresh_loop(
+                app.state.valkey_client, "api", http_client=app.state.http_client, prepare=prepare_cty_resolver
+            )
+        ),
     ]
 
     yield
@@ -195,7 +262,14 @@ async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False
 
 app = fastapi.FastAPI(lifespan=lifespan, openapi_url=None, docs_url=None, redoc_url=None)
 
-MAX_HUNTER_RESOLVE_CALLSIGNS = 100
+SPOTS_STREAM_NAME = "stream-api"
+WS_CLIENTS_REPORT_INTERVAL = 10
+WS_CLIENTS_REPORT_TTL = 30
+MAX_HUNTER_RESOLVE_CALLSIGNS = 5000
+HUNTER_RESOLVE_CONCURRENCY = 16
+SPOTS_CATCHUP_LIMIT = 500
+# Clients keep the spots of the last hour, older missed spots are not replayed.
+SPOTS_REPLAY_WINDOW = 3600
 HUNTER_CALLSIGN_PATTERN = re.compile(r"^[A-Z0-9][A-Z0-9/]{0,31}$")
 PROPAGATION_METRICS = ("a_index", "k_index", "sfi")
 MAX_PROPAGATION_HISTORY_RANGE_SECONDS = 86400
@@ -313,6 +387,9 @@ def cleanup_spot(spot):
         sota_points = spot.get("sota_points")
         if sota_points is not None:
             cleaned_spot["sota_points"] = int(sota_points)
+        seq = spot.get("seq")
+        if seq is not None:
+            cleaned_spot["seq"] = int(seq)
         return cleaned_spot
     except (KeyError, ValueError):
         logger.exception(f"Failed to process spot: {spot}")
@@ -458,25 +535,28 @@ async def hunter_resolve(request: HunterResolveRequest):
         logger.warning(f"QRZ session key unavailable for hunter resolve; continuing with CTY fallback: {e}")
         qrz_session_key = ""
 
+    geo_results, geo_errors = await get_geo_details_batch(
+        app.state.valkey_client,
+        qrz_session_key,
+        normalized_callsigns,
+        settings.valkey_geo_expiration,
+        app.state.http_client,
+        "hunter_import",
+        concurrency=HUNTER_RESOLVE_CONCURRENCY,
+    )
+
     results = {}
     for callsign in normalized_callsigns:
-        try:
-            geo_data = await get_geo_details(
-                app.state.valkey_client,
-                qrz_session_key,
-                callsign,
-                settings.valkey_geo_expiration,
-                app.state.http_client,
-                "hunter_import",
-            )
-        except GeoException as e:
-            errors[callsign] = f"{e.data_type} not found"
+        error = geo_errors.get(callsign)
+        if isinstance(error, GeoException):
+            errors[callsign] = f"{error.data_type} not found"
             continue
-        except Exception:
-            logger.exception(f"Failed to resolve hunter callsign: {callsign}")
+        if error is not None:
+            logger.opt(exception=error).error(f"Failed to resolve hunter callsign: {callsign}")
             errors[callsign] = "not found"
             continue
 
+        geo_data = geo_results[callsign]
         results[callsign] = {
             "callsign": callsign,
             "dxcc_code": geo_data.dxcc_code,
@@ -588,45 +668,150 @@ async def submit_spot_one_spot(websocket: fastapi.WebSocket):
             break
 
 
-async def send_spots(websocket: fastapi.WebSocket, message: dict):
+async def query_spots_since(since: float, limit: int) -> list[dict]:
     async with async_session() as session:
-        if "initial" in message:
-            query = (
-                select(HolySpot)
-                .where(HolySpot.timestamp > (time.time() - 3600))
-                .order_by(desc(HolySpot.timestamp))
-                .limit(500)
-            )
-            spots = cleanup_spots((await session.execute(query)).scalars())
-            await websocket.send_json({"type": "initial", "spots": spots})
-        elif "last_time" in message:
-            query = (
-                select(HolySpot)
-                .where(HolySpot.timestamp > message["last_time"])
-                .order_by(desc(HolySpot.timestamp))
-                .limit(500)
+        query = select(HolySpot).where(HolySpot.timestamp > since).order_by(desc(HolySpot.timestamp)).limit(limit)
+        return cleanup_spots((await session.execute(query)).scalars())
+
+
+async def get_spots_since(since: float, limit: int = SPOTS_CATCHUP_LIMIT) -> list[dict]:
+    spots = app.state.spot_buffer.since(since, limit)
+    if spots is None:
+        spots = await query_spots_since(since, limit)
+    return spots
+
+
+async def query_spots_after_seq(last_seq: int, max_seq: int, limit: int) -> tuple[list[dict], bool]:
+    async with async_session() as session:
+        query = (
+            select(HolySpot)
+            .where(HolySpot.seq > last_seq, HolySpot.seq <= max_seq)
+            .order_by(HolySpot.seq)
+            .limit(limit + 1)
+        )
+        spots = cleanup_spots((await session.execute(query)).scalars())
+    return spots[:limit], len(spots) > limit
+
+
+async def get_spots_after_seq(last_seq: int, limit: int = SPOTS_CATCHUP_LIMIT) -> tuple[list[dict], bool] | None:
+    """
+    Return the oldest page of spots after last_seq and whether more follow, or None if the
+    first missed spot is older than the replay window and the client needs an initial load.
+
+    PostgreSQL is only read up to the buffer's latest_seq, a page never moves the client past
+    a seq that may not be written yet. Later seqs reach the client through the stream.
+    """
+    spot_buffer = app.state.spot_buffer
+    page = spot_buffer.after_seq(last_seq, limit)
+    if page is None:
+        if spot_buffer.latest_seq is None:
+            return None
+        page = await query_spots_after_seq(last_seq, spot_buffer.latest_seq, limit)
+    spots, _more = page
+    if spots and spots[0]["time"] < time.time() - SPOTS_REPLAY_WINDOW:
+        return None
+    return page
+
+
+async def seed_spot_buffer(app, stream_seq: int | None):
+    """
+    Seed the buffer with the recent spots of PostgreSQL.
+
+    The time window query can miss spots that are not written yet or have an old spot time, so
+    seq coverage starts at the stream cursor: every later seq is read from the stream.
+    """
+    seed_time = time.time()
+    since = seed_time - settings.spot_buffer_max_age
+    try:
+        spots = await query_spots_since(since, settings.spot_buffer_max_spots)
+    except Exception as e:
+        logger.exception("Failed to seed the spot buffer from PostgreSQL")
+        await push_exception_event(app.state.valkey_client, "api", f"spot buffer seed: {e}")
+        app.state.spot_buffer.seed([], complete_since=seed_time, complete_after_seq=stream_seq)
+        return
+
+    spots.reverse()
+    complete_since = since if len(spots) < settings.spot_buffer_max_spots else spots[0]["time"]
+    app.state.spot_buffer.seed(spots, complete_since=complete_since, complete_after_seq=stream_seq)
+    logger.info(f"Seeded the spot buffer with {len(spots)} spots")
+
+
+async def send_initial_spots(client: SpotsClient):
+    spots = await get_spots_since(time.time() - SPOTS_REPLAY_WINDOW)
+    client.enqueue(encode_spots_message("initial", filter_spots(spots, client.spot_filter), client.frame_format))
+
+
+async def send_spots(client: SpotsClient, message: dict):
+    if "initial" in message:
+        await send_initial_spots(client)
+    elif "last_seq" in message:
+        last_seq = message["last_seq"]
+        if not isinstance(last_seq, int) or isinstance(last_seq, bool) or last_seq < 0:
+            logger.warning(f"Ignoring invalid last_seq: {last_seq!r}")
+            return
+        page = await get_spots_after_seq(last_seq)
+        if page is None:
+            await send_initial_spots(client)
+            return
+        spots, more = page
+        if spots:
+            last_seq = spots[-1]["seq"]
+        client.enqueue(
+            encode_spots_message(
+                "update",
+                filter_spots(spots, client.spot_filter),
+                client.frame_format,
+                last_seq=last_seq,
+                more=more,
             )
-            spots = cleanup_spots((await session.execute(query)).scalars())
-            await websocket.send_json({"type": "update", "spots": spots})
+        )
+    elif "last_time" in message:
+        spots = await get_spots_since(message["last_time"])
+        client.enqueue(encode_spots_message("update", filter_spots(spots, client.spot_filter), client.frame_format))
+
+
+def update_spot_filter(client: SpotsClient, message: dict):
+    """Apply the filter of a client message. A null filter clears it, an invalid one keeps the current filter."""
+    if "filter" not in message:
+        return
+
+    try:
+        client.spot_filter = None if message["filter"] is None else SpotFilter.model_validate(message["filter"])
+    except ValidationError as e:
+        logger.warning(f"Ignoring invalid spots filter: {e}")
+
+
+async def handle_spots_message(client: SpotsClient, text: str):
+    try:
+        message = json.loads(text)
+    except json.JSONDecodeError:
+        logger.warning(f"Ignoring invalid spots websocket message: {text[:100]}")
+        return
+    if not isinstance(message, dict):
+        return
+
+    update_spot_filter(client, message)
+    await send_spots(client, message)
 
 
 @app.websocket("/spots_ws")
 async def spots_ws(websocket: fastapi.WebSocket):
-    await websocket.accept()
+    subprotocol, frame_format = negotiate_frame_format(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
 
-    app.state.active_connections.add(websocket)
+    client = SpotsClient(websocket, settings.ws_client_max_queued, settings.ws_client_send_timeout, frame_format)
+    sender_task = asyncio.create_task(client.run())
+    app.state.active_connections.add(client)
 
     try:
-        message = await websocket.receive_json()
-        await send_spots(websocket, message)
-
         while True:
-            await websocket.receive_text()
+            await handle_spots_message(client, await websocket.receive_text())
 
     except websockets.WebSocketDisconnect:
         pass
     finally:
-        app.state.active_connections.discard(websocket)
+        app.state.active_connections.discard(client)
+        sender_task.cancel()
 
 
 def get_latest_catserver_name():
@@ -16,6 +16,11 @@ class ApiSettings(PostgresSettings, ValkeySettings, QrzSettings, LogSettings, Ba
 
     ui_dist_path: Path = Field(..., description="Path to UI distribution files")
     catserver_msi_dir: Path = Field(..., description="Path to CATServer MSI directory")
+    spot_buffer_max_spots: int = Field(default=10000, description="Maximum number of spots kept in memory")
+    spot_buffer_max_age: int = Field(default=7200, description="Maximum age in seconds of spots kept in memory")
+    spots_stream_read_count: int = Field(default=500, description="Maximum spots read from the stream in one call")
+    ws_client_max_queued: int = Field(default=32, description="Maximum messages queued for one spots websocket")
+    ws_client_send_timeout: float = Field(default=5.0, description="Seconds before a stuck spots websocket is dropped")
 
     @computed_field
     @property
@@ -0,0 +1,99 @@
+import math
+import time
+from collections import deque
+
+
+def spot_identity(spot: dict) -> tuple:
+    return (spot["spotter_callsign"], spot["dx_callsign"], spot["freq"], spot["time"])
+
+
+class SpotBuffer:
+    """
+    Bounded in-memory buffer of cleaned spots, kept in arrival order.
+
+    `complete_since` is the time after which the buffer is known to hold every spot:
+    it starts at the seed boundary and moves forward whenever a spot is evicted, so
+    any spot with a time greater than it is still in the buffer. `complete_after_seq`
+    is the same boundary for the collector's spot sequence numbers. It starts at the
+    stream cursor given to seed, or at the first live spot without one, because seeded
+    spots alone do not prove that no seq is missing. `latest_seq` is the highest seq
+    seen in the stream or in PostgreSQL, the collector publishes spots only after
+    writing them, so every seq up to it is written.
+    """
+
+    def __init__(self, max_spots: int, max_age: float):
+        self.max_spots = max_spots
+        self.max_age = max_age
+        self.complete_since = math.inf
+        self.complete_after_seq: int | None = None
+        self.latest_seq: int | None = None
+        self._spots: deque[dict] = deque()
+        self._identities: set[tuple] = set()
+
+    def __len__(self):
+        return len(self._spots)
+
+    def seed(
+        self,
+        spots: list[dict],
+        complete_since: float,
+        complete_after_seq: int | None = None,
+        now: float | None = None,
+    ):
+        self._spots.clear()
+        self._identities.clear()
+        self.complete_since = complete_since
+        self.complete_after_seq = complete_after_seq
+        self.latest_seq = complete_after_seq
+        self._extend(spots, now=now, track_seq=False)
+
+    def extend(self, spots: list[dict], now: float | None = None):
+        self._extend(spots, now=now, track_seq=True)
+
+    def _extend(self, spots: list[dict], now: float | None, track_seq: bool):
+        for spot in spots:
+            if spot.get("seq") is not None and (self.latest_seq is None or spot["seq"] > self.latest_seq):
+                self.latest_seq = spot["seq"]
+            identity = spot_identity(spot)
+            if identity in self._identities:
+                continue
+            self._identities.add(identity)
+            self._spots.append(spot)
+            if track_seq and self.complete_after_seq is None and spot.get("seq") is not None:
+                # Spots arrive in seq order, so every later seq is in the buffer from here on.
+                self.complete_after_seq = spot["seq"] - 1
+
+        min_time = (now if now is not None else time.time()) - self.max_age
+        while self._spots and (len(self._spots) > self.max_spots or self._spots[0]["time"] < min_time):
+            self._evict()
+
+    def _evict(self):
+        spot = self._spots.popleft()
+        self._identities.discard(spot_identity(spot))
+        self.complete_since = max(self.complete_since, spot["time"])
+        if spot.get("seq") is not None and self.complete_after_seq is not None:
+            self.complete_after_seq = max(self.complete_after_seq, spot["seq"])
+
+    def covers(self, since: float) -> bool:
+        return since >= self.complete_since
+
+    def since(self, since: float, limit: int) -> list[dict] | None:
+        """Return the newest spots with a time greater than since, or None if the buffer cannot answer."""
+        if not self.covers(since):
+            return None
+
+        spots = [spot for spot in self._spots if spot["time"] > since]
+        spots.sort(key=lambda spot: spot["time"], reverse=True)
+        return spots[:limit]
+
+    def after_seq(self, last_seq: int, limit: int) -> tuple[list[dict], bool] | None:
+        """
+        Return the oldest page of spots with a seq greater than last_seq and whether more follow,
+        or None if the buffer cannot answer.
+        """
+        if self.complete_after_seq is None or last_seq < self.complete_after_seq:
+            return None
+
+        spots = [spot for spot in self._spots if spot.get("seq") is not None and spot["seq"] > last_seq]
+        spots.sort(key=lambda spot: spot["seq"])
+        return spots[:limit], len(spots) > limit
@@ -0,0 +1,128 @@
+from collections import defaultdict
+
+from pydantic import BaseModel, ConfigDict, field_validator
+
+# Spots without a type come from the regular DX clusters.
+CLUSTER_SPOT_TYPE = "cluster"
+
+
+def band_key(band) -> float | str:
+    """Normalize a band the same way the UI does, so filters can use the UI's band names."""
+    if isinstance(band, str):
+        try:
+            band = float(band)
+        except ValueError:
+            return band.upper()
+    band = float(band)
+    if band == 2:
+        return "VHF"
+    if band == 0.7:
+        return "UHF"
+    if band < 1:
+        return "SHF"
+    return band
+
+
+def mode_key(mode: str) -> str:
+    mode = mode.upper()
+    return "DIGI" if mode == "DIGITAL" else mode
+
+
+SPOT_DIMENSIONS = {
+    "bands": lambda spot: band_key(spot["band"]),
+    "modes": lambda spot: mode_key(spot["mode"]),
+    "dx_continents": lambda spot: spot["dx_continent"],
+    "spotter_continents": lambda spot: spot["spotter_continent"],
+    "dx_dxcc_codes": lambda spot: spot["dx_dxcc_code"],
+    "types": lambda spot: spot.get("type", CLUSTER_SPOT_TYPE),
+    "is_dxpedition": lambda spot: spot["is_dxpedition"],
+}
+
+
+class SpotFilter(BaseModel):
+    """
+    A subscription filter sent by a spots websocket client.
+
+    Every field left as None matches all spots, and a spot has to match all of the set fields.
+    """
+
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    bands: frozenset[float | str] | None = None
+    modes: frozenset[str] | None = None
+    dx_continents: frozenset[str] | None = None
+    spotter_continents: frozenset[str] | None = None
+    dx_dxcc_codes: frozenset[int] | None = None
+    types: frozenset[str] | None = None
+    is_dxpedition: bool | None = None
+
+    @field_validator("bands")
+    @classmethod
+    def normalize_bands(cls, bands):
+        return None if bands is None else frozenset(band_key(band) for band in bands)
+
+    @field_validator("modes")
+    @classmethod
+    def normalize_modes(cls, modes):
+        return None if modes is None else frozenset(mode_key(mode) for mode in modes)
+
+    @field_validator("dx_continents", "spotter_continents")
+    @classmethod
+    def normalize_continents(cls, continents):
+        return None if continents is None else frozenset(continent.upper() for continent in continents)
+
+    @field_validator("types")
+    @classmethod
+    def normalize_types(cls, types):
+        return None if types is None else frozenset(spot_type.lower() for spot_type in types)
+
+    def constraints(self) -> list[tuple[str, frozenset]]:
+        constraints = []
+        for dimension in SPOT_DIMENSIONS:
+            allowed = getattr(self, dimension)
+            if allowed is None:
+                continue
+            if dimension == "is_dxpedition":
+                allowed = frozenset([allowed])
+            constraints.append((dimension, allowed))
+        return constraints
+
+    def matches(self, spot: dict) -> bool:
+        return all(SPOT_DIMENSIONS[dimension](spot) in allowed for dimension, allowed in self.constraints())
+
+
+def filter_spots(spots: list[dict], spot_filter: SpotFilter | None) -> list[dict]:
+    if spot_filter is None:
+        return spots
+    return [spot for spot in spots if spot_filter.matches(spot)]
+
+
+class SpotIndex:
+    """A batch of cleaned spots indexed by every filter dimension, so each filter is answered with set lookups."""
+
+    def __init__(self, spots: list[dict]):
+        self.spots = spots
+        self._positions: dict[str, defaultdict[object, set[int]]] = {
+            dimension: defaultdict(set) for dimension in SPOT_DIMENSIONS
+        }
+        for position, spot in enumerate(spots):
+            for dimension, key in SPOT_DIMENSIONS.items():
+                self._positions[dimension][key(spot)].add(position)
+
+    def select(self, spot_filter: SpotFilter | None) -> list[dict]:
+        if spot_filter is None:
+            return self.spots
+
+        positions = None
+        for dimension, allowed in spot_filter.constraints():
+            index = self._positions[dimension]
+            matching = set()
+            for value in allowed:
+                matching |= index.get(value, set())
+            positions = matching if positions is None else positions & matching
+            if not positions:
+                return []
+
+        if positions is None:
+            return self.spots
+        return [self.spots[position] for position in sorted(positions)]
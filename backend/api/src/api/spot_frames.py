@@ -0,0 +1,91 @@
+import json
+
+JSON_FRAME_FORMAT = "json"
+COLUMNAR_FRAME_FORMAT = "columnar"
+
+# Clients opt in to a frame format by requesting its websocket subprotocol, anything else gets JSON objects.
+SUBPROTOCOL_FRAME_FORMATS = {
+    "holycluster.columnar.v1": COLUMNAR_FRAME_FORMAT,
+}
+
+STATION_PREFIXES = ("spotter", "dx")
+
+# Keys cleanup_spot only sets when they have a value, so a null in a columnar frame means the key is absent.
+OPTIONAL_SPOT_KEYS = ("seq", "type", "pota_reference", "pota_name", "pota_description", "sota_points")
+
+
+def negotiate_frame_format(subprotocols: list[str]) -> tuple[str | None, str]:
+    """Return the accepted subprotocol and frame format for the subprotocols a client requested."""
+    for subprotocol in subprotocols:
+        if subprotocol in SUBPROTOCOL_FRAME_FORMATS:
+            return subprotocol, SUBPROTOCOL_FRAME_FORMATS[subprotocol]
+    return None, JSON_FRAME_FORMAT
+
+
+def build_columnar_frame(message_type: str, spots: list[dict], **fields) -> dict:
+    """
+    Build a columnar frame, with each field name sent once per frame.
+
+    Callsigns and their locations are sent once in `stations`, and the `spotter` and `dx`
+    columns hold indexes into it.
+    """
+    stations = []
+    station_indexes = {}
+    station_columns = {prefix: [] for prefix in STATION_PREFIXES}
+    keys = {}
+
+    for spot in spots:
+        for prefix in STATION_PREFIXES:
+            lon, lat = spot[f"{prefix}_loc"]
+            station = (spot[f"{prefix}_callsign"], lon, lat)
+            index = station_indexes.get(station)
+            if index is None:
+                index = station_indexes[station] = len(stations)
+                stations.append(list(station))
+            station_columns[prefix].append(index)
+        keys.update(dict.fromkeys(spot))
+
+    for prefix in STATION_PREFIXES:
+        keys.pop(f"{prefix}_callsign", None)
+        keys.pop(f"{prefix}_loc", None)
+
+    columns = {**station_columns, **{key: [spot.get(key) for spot in spots] for key in keys}}
+    return {
+        "type": message_type,
+        "format": COLUMNAR_FRAME_FORMAT,
+        "length": len(spots),
+        "stations": stations,
+        "columns": columns,
+        **fields,
+    }
+
+
+def decode_columnar_frame(frame: dict) -> list[dict]:
+    """Rebuild the spot objects of a columnar frame, the reference for client decoders."""
+    stations = frame["stations"]
+    columns = frame["columns"]
+    spots = []
+    for position in range(frame["length"]):
+        spot = {}
+        for prefix in STATION_PREFIXES:
+            callsign, lon, lat = stations[columns[prefix][position]]
+            spot[f"{prefix}_callsign"] = callsign
+            spot[f"{prefix}_loc"] = [lon, lat]
+        for key, values in columns.items():
+            if key in STATION_PREFIXES:
+                continue
+            value = values[position]
+            if value is None and key in OPTIONAL_SPOT_KEYS:
+                continue
+            spot[key] = value
+        spots.append(spot)
+    return spots
+
+
+def encode_spots_message(message_type: str, spots: list[dict], frame_format: str, **fields) -> str:
+    """Encode a spots message, fields are extra top level keys such as the replay paging state."""
+    if frame_format == COLUMNAR_FRAME_FORMAT:
+        message = build_columnar_frame(message_type, spots, **fields)
+    else:
+        message = {"type": message_type, "spots": spots, **fields}
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
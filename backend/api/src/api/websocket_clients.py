@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections import defaultdict
+
+import fastapi
+from loguru import logger
+
+from .spot_filters import SpotFilter, SpotIndex
+from .spot_frames import JSON_FRAME_FORMAT, encode_spots_message
+
+# Close code 1013 (try again later) tells the client to reconnect and catch up with last_time.
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+
+class SpotsClient:
+    """
+    A spots websocket with its own bounded outbound queue.
+
+    Broadcasts only enqueue the already encoded payload, and a sender task per client
+    writes it to the socket. A client whose queue fills up or whose send times out is
+    closed instead of holding back the broadcast.
+    """
+
+    def __init__(
+        self,
+        websocket: fastapi.WebSocket,
+        max_queued: int,
+        send_timeout: float,
+        frame_format: str = JSON_FRAME_FORMAT,
+    ):
+        self.websocket = websocket
+        self.frame_format = frame_format
+        self.send_timeout = send_timeout
+        self.spot_filter: SpotFilter | None = None
+        self.dropped = False
+        self.send_lag = 0.0
+        self._queue: asyncio.Queue[tuple[str, float] | None] = asyncio.Queue(maxsize=max_queued)
+
+    def enqueue(self, payload: str) -> bool:
+        """Queue a payload for sending, return False if the client was dropped."""
+        if self.dropped:
+            return False
+
+        try:
+            self._queue.put_nowait((payload, time.monotonic()))
+        except asyncio.QueueFull:
+            logger.warning(f"Dropping slow websocket client with {self._queue.qsize()} queued messages")
+            self.drop()
+            return False
+        return True
+
+    def drop(self):
+        if self.dropped:
+            return
+        self.dropped = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                break
+
+            payload, queued_at = item
+            try:
+                await asyncio.wait_for(self.websocket.send_text(payload), self.send_timeout)
+            except TimeoutError:
+                logger.warning(f"Dropping websocket client after a send took more than {self.send_timeout}s")
+                self.dropped = True
+                break
+            except Exception as e:
+                logger.warning(f"Failed to send to websocket: {e}")
+                self.dropped = True
+                return
+            self.send_lag = time.monotonic() - queued_at
+
+        try:
+            await asyncio.wait_for(self.websocket.close(code=SLOW_CLIENT_CLOSE_CODE), self.send_timeout)
+        except Exception:
+            pass
+
+
+def broadcast_spots(clients: set[SpotsClient], spot_index: SpotIndex) -> float:
+    """
+    Queue an update for every client and discard dropped clients.
+
+    The update is encoded once per distinct filter and frame format.
+
+    Filtered clients are skipped when none of the spots match. Returns the max send lag.
+    """
+    clients_by_filter = defaultdict(lambda: defaultdict(list))
+    for client in clients:
+        clients_by_filter[client.spot_filter][client.frame_format].append(client)
+
+    max_send_lag = 0.0
+    for spot_filter, clients_by_format in clients_by_filter.items():
+        spots = spot_index.select(spot_filter)
+        if spot_filter is not None and not spots:
+            continue
+
+        for frame_format, format_clients in clients_by_format.items():
+            payload = encode_spots_message("update", spots, frame_format)
+            for client in format_clients:
+                if not client.enqueue(payload):
+                    clients.discard(client)
+                    continue
+                max_send_lag = max(max_send_lag, client.send_lag)
+    return max_send_lag
@@ -1,3 +1,4 @@
+import json
 import unittest
 from unittest.mock import AsyncMock, patch
 
@@ -5,8 +6,28 @@ from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
 from api.main import app
+from shared import cty, geo
+from shared.cty import CtyCountry, CtyResolver
 from shared.geo import GeoData, GeoException
 
+USA = CtyCountry("United States", "NA", 291, 37.5, -91.7, 5, 8)
+
+
+class FakeValkey:
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.mgets = []
+
+    async def mget(self, keys):
+        self.mgets.append(list(keys))
+        return [self.values.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None, nx=False, get=False):
+        previous = self.values.get(key)
+        if not nx or previous is None:
+            self.values[key] = value
+        return previous if get else True
+
 
 def create_geo_data(callsign, *, cached=False, source="qrz"):
     return GeoData(
@@ -26,7 +47,8 @@ def create_geo_data(callsign, *, cached=False, source="qrz"):
 
 class HunterResolveEndpointTest(unittest.TestCase):
     def setUp(self):
-        app.state.valkey_client = object()
+        geo.configure_local_geo_cache(max_size=10, ttl=300, negative_ttl=300)
+        app.state.valkey_client = FakeValkey()
         app.state.http_client = object()
         self.client = TestClient(app)
 
@@ -39,7 +61,7 @@ class HunterResolveEndpointTest(unittest.TestCase):
 
         with (
             patch("api.main.get_qrz_session_key_from_redis", new=AsyncMock(return_value="session")),
-            patch("api.main.get_geo_details", new=fake_get_geo_details),
+            patch("shared.geo.get_geo_details", new=fake_get_geo_details),
         ):
             response = self.client.post("/hunter/resolve", json={"callsigns": ["k1abc", "VE3XYZ"]})
 
@@ -89,7 +111,7 @@ class HunterResolveEndpointTest(unittest.TestCase):
 
         with (
             patch("api.main.get_qrz_session_key_from_redis", new=AsyncMock(return_value="session")),
-            patch("api.main.get_geo_details", new=fake_get_geo_details),
+            patch("shared.geo.get_geo_details", new=fake_get_geo_details),
         ):
             response = self.client.post(
                 "/hunter/resolve",
@@ -107,14 +129,43 @@ class HunterResolveEndpointTest(unittest.TestCase):
             },
         )
 
-    def test_hunter_resolve_rejects_more_than_100_callsigns(self):
+    def test_hunter_resolve_reads_cached_callsigns_with_one_mget(self):
+        resolved_callsigns = []
+        legacy_value = json.dumps({"locator_source": "qrz", "locator": "FN31", "lat": 41.5, "lon": -72.5, "state": ""})
+        app.state.valkey_client = FakeValkey({"geo:K1ABC": "1|q|FN31|41.5|-72.5||5|8", "K2ABC": legacy_value})
+        resolver = CtyResolver(exact_callsigns={}, prefixes={"K": USA}, entities_by_dxcc_code={291: USA})
+
+        async def fake_get_geo_details(_valkey_client, _qrz_key, callsign, *_args):
+            resolved_callsigns.append(callsign)
+            return create_geo_data(callsign)
+
+        with (
+            patch("api.main.get_qrz_session_key_from_redis", new=AsyncMock(return_value="session")),
+            patch("shared.geo.get_geo_details", new=fake_get_geo_details),
+            patch.object(cty, "_CTY_STATE", (cty.CTY_CACHE_PATH, 0.0, resolver, None)),
+        ):
+            response = self.client.post("/hunter/resolve", json={"callsigns": ["K1ABC", "K2ABC", "VE3XYZ"]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            app.state.valkey_client.mgets,
+            [["geo:K1ABC", "geo:K2ABC", "geo:VE3XYZ"], ["K1ABC", "K2ABC", "VE3XYZ"]],
+        )
+        self.assertEqual(resolved_callsigns, ["VE3XYZ"])
+        self.assertEqual(list(response.json()["results"]), ["K1ABC", "K2ABC", "VE3XYZ"])
+        self.assertEqual(response.json()["results"]["K1ABC"]["locator"], "FN31")
+        self.assertEqual(response.json()["results"]["K1ABC"]["source"], "cache")
+        self.assertEqual(response.json()["results"]["K1ABC"]["cq_zone"], 5)
+        self.assertEqual(app.state.valkey_client.values["geo:K2ABC"], "1|q|FN31|41.5|-72.5|||")
+
+    def test_hunter_resolve_rejects_more_than_5000_callsigns(self):
         response = self.client.post(
             "/hunter/resolve",
-            json={"callsigns": [f"K{index}ABC" for index in range(101)]},
+            json={"callsigns": [f"K{index}ABC" for index in range(5001)]},
         )
 
         self.assertEqual(response.status_code, 400)
-        self.assertEqual(response.json()["detail"], "maximum 100 callsigns per request")
+        self.assertEqual(response.json()["detail"], "maximum 5000 callsigns per request")
 
     def test_hunter_resolve_continues_without_qrz_session_key(self):
         qrz_keys = []
@@ -128,7 +179,7 @@ class HunterResolveEndpointTest(unittest.TestCase):
                 "api.main.get_qrz_session_key_from_redis",
                 new=AsyncMock(side_effect=HTTPException(status_code=503, detail="missing")),
             ),
-            patch("api.main.get_geo_details", new=fake_get_geo_details),
+            patch("shared.geo.get_geo_details", new=fake_get_geo_details),
         ):
             response = self.client.post("/hunter/resolve", json={"callsigns": ["K1ABC"]})
 
@@ -0,0 +1,139 @@
+import unittest
+
+from api.spot_buffer import SpotBuffer
+
+
+def create_spot(dx_callsign, spot_time, seq=None):
+    spot = {
+        "spotter_callsign": "4X5BR",
+        "dx_callsign": dx_callsign,
+        "freq": 14025.0,
+        "time": spot_time,
+    }
+    if seq is not None:
+        spot["seq"] = seq
+    return spot
+
+
+class SpotBufferTest(unittest.TestCase):
+    def test_unseeded_buffer_does_not_answer(self):
+        spot_buffer = SpotBuffer(max_spots=10, max_age=3600)
+        spot_buffer.extend([create_spot("K1ABC", 1000)], now=1000)
+
+        self.assertIsNone(spot_buffer.since(0, 500))
+
+    def test_since_returns_newest_spots_first(self):
+        spot_buffer = SpotBuffer(max_spots=10, max_age=3600)
+        spot_buffer.seed([create_spot("K1ABC", 1000), create_spot("K2ABC", 1010)], complete_since=900, now=1000)
+        spot_buffer.extend([create_spot("K3ABC", 1005)], now=1020)
+
+        spots = spot_buffer.since(1000, 2)
+
+        self.assertEqual([spot["dx_callsign"] for spot in spots], ["K2ABC", "K3ABC"])
+
+    def test_requests_older_than_buffer_fall_back(self):
+        spot_buffer = SpotBuffer(max_spots=10, max_age=3600)
+        spot_buffer.seed([create_spot("K1ABC", 1000)], complete_since=900, now=1000)
+
+        self.assertIsNone(spot_buffer.since(800, 500))
+        self.assertEqual(len(spot_buffer.since(900, 500)), 1)
+
+    def test_eviction_moves_complete_since_forward(self):
+        spot_buffer = SpotBuffer(max_spots=2, max_age=3600)
+        spot_buffer.seed([], complete_since=900, now=1000)
+        spot_buffer.extend(
+            [create_spot("K1ABC", 1000), create_spot("K2ABC", 1010), create_spot("K3ABC", 1020)],
+            now=1020,
+        )
+
+        self.assertEqual(len(spot_buffer), 2)
+        self.assertEqual(spot_buffer.complete_since, 1000)
+        self.assertIsNone(spot_buffer.since(999, 500))
+        self.assertEqual([spot["dx_callsign"] for spot in spot_buffer.since(1000, 500)], ["K3ABC", "K2ABC"])
+
+    def test_old_spots_expire_by_age(self):
+        spot_buffer = SpotBuffer(max_spots=10, max_age=100)
+        spot_buffer.seed([create_spot("K1ABC", 1000)], complete_since=950, now=1000)
+        spot_buffer.extend([create_spot("K2ABC", 1150)], now=1150)
+
+        self.assertEqual(len(spot_buffer), 1)
+        self.assertEqual(spot_buffer.complete_since, 1000)
+
+    def test_duplicate_spots_are_ignored(self):
+        spot_buffer = SpotBuffer(max_spots=10, max_age=3600)
+        spot_buffer.seed([create_spot("K1ABC", 1000)], complete_since=900, now=1000)
+        spot_buffer.extend([create_spot("K1ABC", 1000)], now=1000)
+
+        self.assertEqual(len(spot_buffer), 1)
+
+    def test_after_seq_pages_oldest_first(self):
+        spot_buffer = SpotBuffer(max_spots=10, max_age=3600)
+        spot_buffer.seed(
+            [create_spot("K1ABC", 1000, seq=10), create_spot("K2ABC", 1010, seq=11)],
+            900,
+            complete_after_seq=9,
+            now=1000,
+        )
+        spot_buffer.extend([create_spot("K3ABC", 1005, seq=12)], now=1020)
+
+        spots, more = spot_buffer.after_seq(10, 1)
+        self.assertEqual([spot["seq"] for spot in spots], [11])
+        self.assertTrue(more)
+
+        spots, more = spot_buffer.after_seq(11, 1)
+        self.assertEqual([spot["seq"] for spot in spots], [12])
+        self.assertFalse(more)
+
+    def test_after_seq_falls_back_before_the_buffer(self):
+        spot_buffer = SpotBuffer(max_spots=2, max_age=3600)
+        spot_buffer.seed([create_spot("K1ABC", 1000, seq=10)], complete_since=900, complete_after_seq=9, now=1000)
+
+        self.assertIsNone(spot_buffer.after_seq(8, 500))
+        self.assertEqual(spot_buffer.after_seq(9, 500), ([create_spot("K1ABC", 1000, seq=10)], False))
+
+        spot_buffer.extend([create_spot("K2ABC", 1010, seq=11), create_spot("K3ABC", 1020, seq=12)], now=1020)
+
+        self.assertIsNone(spot_buffer.after_seq(9, 500))
+        self.assertEqual(len(spot_buffer.after_seq(10, 500)[0]), 2)
+
+    def test_seeded_seqs_are_only_covered_from_the_stream_cursor(self):
+        spot_buffer = SpotBuffer(max_spots=10, max_age=3600)
+        spot_buffer.seed(
+            [create_spot("K1ABC", 1000, seq=10), create_spot("K2ABC", 1010, seq=12)],
+            complete_since=900,
+            complete_after_seq=12,
+            now=1000,
+        )
+
+        self.assertIsNone(spot_buffer.after_seq(10, 500))
+        spot_buffer.extend([create_spot("K3ABC", 1020, seq=13)], now=1020)
+        self.assertEqual([spot["seq"] for spot in spot_buffer.after_seq(12, 500)[0]], [13])
+
+    def test_seeded_seqs_without_a_stream_cursor_are_not_covered(self):
+        spot_buffer = SpotBuffer(max_spots=10, max_age=3600)
+        spot_buffer.seed([create_spot("K1ABC", 1000, seq=10)], complete_since=900, now=1000)
+
+        self.assertIsNone(spot_buffer.after_seq(9, 500))
+
+    def test_after_seq_starts_with_the_first_live_spot_without_seeded_seqs(self):
+        spot_buffer = SpotBuffer(max_spots=10, max_age=3600)
+        spot_buffer.seed([create_spot("K1ABC", 1000)], complete_since=900, now=1000)
+
+        self.assertIsNone(spot_buffer.after_seq(0, 500))
+
+        spot_buffer.extend([create_spot("K2ABC", 1010, seq=50)], now=1010)
+
+        self.assertIsNone(spot_buffer.after_seq(48, 500))
+        self.assertEqual(len(spot_buffer.after_seq(49, 500)[0]), 1)
+
+    def test_latest_seq_follows_seeded_and_live_spots(self):
+        spot_buffer = SpotBuffer(max_spots=1, max_age=3600)
+        spot_buffer.seed([create_spot("K1ABC", 1000, seq=12)], complete_since=900, complete_after_seq=10, now=1000)
+        self.assertEqual(spot_buffer.latest_seq, 12)
+
+        spot_buffer.extend([create_spot("K2ABC", 1010, seq=13)], now=1010)
+        self.assertEqual(spot_buffer.latest_seq, 13)
+
+
+if __name__ == "__main__":
+    unittest.main()
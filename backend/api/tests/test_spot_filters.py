@@ -0,0 +1,70 @@
+import unittest
+
+from pydantic import ValidationError
+
+from api.spot_filters import SpotFilter, SpotIndex, filter_spots
+
+
+def create_spot(dx_callsign, band=20.0, mode="CW", dx_continent="NA", spot_type=None, is_dxpedition=False):
+    spot = {
+        "dx_callsign": dx_callsign,
+        "band": band,
+        "mode": mode,
+        "dx_continent": dx_continent,
+        "spotter_continent": "AS",
+        "dx_dxcc_code": 291,
+        "is_dxpedition": is_dxpedition,
+    }
+    if spot_type is not None:
+        spot["type"] = spot_type
+    return spot
+
+
+SPOTS = [
+    create_spot("K1ABC"),
+    create_spot("JA1ABC", band=40.0, mode="FT8", dx_continent="AS"),
+    create_spot("OH0X", band="VHF", mode="SSB", dx_continent="EU", is_dxpedition=True),
+    create_spot("K2ABC", band=2.0, mode="DIGITAL", spot_type="pota"),
+]
+
+
+def dx_callsigns(spots):
+    return [spot["dx_callsign"] for spot in spots]
+
+
+class SpotFilterTest(unittest.TestCase):
+    def test_empty_filter_matches_every_spot(self):
+        self.assertEqual(SpotIndex(SPOTS).select(SpotFilter()), SPOTS)
+        self.assertEqual(SpotIndex(SPOTS).select(None), SPOTS)
+
+    def test_bands_and_modes_are_normalized_like_the_ui(self):
+        spot_filter = SpotFilter(bands=["VHF", "20"], modes=["digi", "CW"])
+
+        self.assertEqual(dx_callsigns(SpotIndex(SPOTS).select(spot_filter)), ["K1ABC", "K2ABC"])
+
+    def test_dimensions_are_combined_with_and(self):
+        spot_filter = SpotFilter(dx_continents=["na", "EU"], is_dxpedition=True)
+
+        self.assertEqual(dx_callsigns(SpotIndex(SPOTS).select(spot_filter)), ["OH0X"])
+
+    def test_types_match_cluster_spots_without_a_type(self):
+        spot_filter = SpotFilter(types=["cluster"], modes=["CW", "FT8"])
+
+        self.assertEqual(dx_callsigns(SpotIndex(SPOTS).select(spot_filter)), ["K1ABC", "JA1ABC"])
+
+    def test_index_and_matches_agree(self):
+        for spot_filter in (
+            SpotFilter(bands=[40]),
+            SpotFilter(types=["pota", "sota"]),
+            SpotFilter(dx_dxcc_codes=[291], dx_continents=["AS"]),
+            SpotFilter(modes=["RTTY"]),
+        ):
+            self.assertEqual(SpotIndex(SPOTS).select(spot_filter), filter_spots(SPOTS, spot_filter))
+
+    def test_unknown_fields_are_rejected(self):
+        with self.assertRaises(ValidationError):
+            SpotFilter.model_validate({"colors": ["red"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import unittest
+
+from api.spot_frames import (
+    COLUMNAR_FRAME_FORMAT,
+    JSON_FRAME_FORMAT,
+    build_columnar_frame,
+    decode_columnar_frame,
+    encode_spots_message,
+    negotiate_frame_format,
+)
+
+
+def create_spot(spotter_callsign, dx_callsign, **extra):
+    return {
+        "spotter_callsign": spotter_callsign,
+        "spotter_loc": [34.8, 32.1],
+        "spotter_state": None,
+        "dx_callsign": dx_callsign,
+        "dx_loc": [-72.5, 41.5],
+        "freq": 14025.0,
+        "band": 20.0,
+        "mode": "CW",
+        "time": 1000.0,
+        "is_dxpedition": False,
+        **extra,
+    }
+
+
+class SpotFramesTest(unittest.TestCase):
+    def test_json_is_the_default_frame_format(self):
+        self.assertEqual(negotiate_frame_format([]), (None, JSON_FRAME_FORMAT))
+        self.assertEqual(negotiate_frame_format(["chat"]), (None, JSON_FRAME_FORMAT))
+        self.assertEqual(
+            negotiate_frame_format(["chat", "holycluster.columnar.v1"]),
+            ("holycluster.columnar.v1", COLUMNAR_FRAME_FORMAT),
+        )
+
+    def test_columnar_frame_sends_each_station_once(self):
+        spots = [
+            create_spot("4X5BR", "K1ABC"),
+            create_spot("4X5BR", "K2ABC"),
+            create_spot("4X5BR", "K1ABC", time=1010.0),
+        ]
+
+        frame = build_columnar_frame("update", spots)
+
+        self.assertEqual(frame["stations"], [["4X5BR", 34.8, 32.1], ["K1ABC", -72.5, 41.5], ["K2ABC", -72.5, 41.5]])
+        self.assertEqual(frame["columns"]["spotter"], [0, 0, 0])
+        self.assertEqual(frame["columns"]["dx"], [1, 2, 1])
+        self.assertNotIn("spotter_callsign", frame["columns"])
+
+    def test_columnar_frame_round_trips_optional_keys(self):
+        spots = [
+            create_spot("4X5BR", "K1ABC"),
+            create_spot("4X5BR", "K2ABC", type="pota", pota_reference="US-0001"),
+        ]
+
+        frame = json.loads(encode_spots_message("initial", spots, COLUMNAR_FRAME_FORMAT))
+
+        self.assertEqual(frame["type"], "initial")
+        self.assertEqual(decode_columnar_frame(frame), spots)
+
+    def test_json_frame_keeps_the_legacy_shape(self):
+        spots = [create_spot("4X5BR", "K1ABC")]
+
+        self.assertEqual(
+            json.loads(encode_spots_message("update", spots, JSON_FRAME_FORMAT)), {"type": "update", "spots": spots}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
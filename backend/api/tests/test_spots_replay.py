@@ -0,0 +1,93 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from api import main
+from api.main import app, send_spots
+from api.spot_buffer import SpotBuffer
+from api.spot_frames import JSON_FRAME_FORMAT
+
+
+class FakeClient:
+    spot_filter = None
+    frame_format = JSON_FRAME_FORMAT
+
+    def __init__(self):
+        self.messages = []
+
+    def enqueue(self, payload):
+        self.messages.append(json.loads(payload))
+
+
+def create_spot(dx_callsign, spot_time, seq):
+    return {"spotter_callsign": "4X5BR", "dx_callsign": dx_callsign, "freq": 14025.0, "time": spot_time, "seq": seq}
+
+
+class SpotsReplayTest(unittest.TestCase):
+    def setUp(self):
+        app.state.spot_buffer = SpotBuffer(max_spots=10, max_age=7200)
+
+    def send(self, message):
+        client = FakeClient()
+        asyncio.run(send_spots(client, message))
+        return client.messages
+
+    def test_invalid_last_seq_is_ignored(self):
+        for last_seq in (None, "abc", 1.5, True, -1):
+            with patch.object(main, "get_spots_after_seq", new=AsyncMock()) as get_spots_after_seq:
+                self.assertEqual(self.send({"last_seq": last_seq}), [])
+            get_spots_after_seq.assert_not_called()
+
+    def test_recent_missed_spots_are_replayed(self):
+        now = main.time.time()
+        app.state.spot_buffer.seed(
+            [create_spot("K1ABC", now - 60, 11)], complete_since=now - 7200, complete_after_seq=10
+        )
+
+        messages = self.send({"last_seq": 10})
+
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]["type"], "update")
+        self.assertEqual((messages[0]["last_seq"], messages[0]["more"]), (11, False))
+
+    def test_missed_spots_beyond_the_replay_window_get_an_initial_load(self):
+        now = main.time.time()
+        app.state.spot_buffer.seed(
+            [create_spot("K1ABC", now - 5000, 11), create_spot("K2ABC", now - 60, 12)],
+            complete_since=now - 7200,
+            complete_after_seq=10,
+        )
+
+        messages = self.send({"last_seq": 10})
+
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]["type"], "initial")
+        self.assertEqual([spot["dx_callsign"] for spot in messages[0]["spots"]], ["K2ABC"])
+
+    def test_postgres_is_read_up_to_the_latest_written_seq(self):
+        now = main.time.time()
+        app.state.spot_buffer.seed([create_spot("K1ABC", now - 60, 30)], complete_since=now - 60, complete_after_seq=29)
+        query = AsyncMock(return_value=([create_spot("K2ABC", now - 120, 21)], False))
+
+        with patch.object(main, "query_spots_after_seq", new=query):
+            messages = self.send({"last_seq": 20})
+
+        query.assert_awaited_once_with(20, 30, main.SPOTS_CATCHUP_LIMIT)
+        self.assertEqual(messages[0]["last_seq"], 21)
+
+    def test_unknown_written_seq_gets_an_initial_load(self):
+        app.state.spot_buffer.seed([], complete_since=main.time.time())
+
+        with (
+            patch.object(main, "query_spots_after_seq", new=AsyncMock()) as query,
+            patch.object(main, "query_spots_since", new=AsyncMock(return_value=[])),
+        ):
+            messages = self.send({"last_seq": 20})
+
+        query.assert_not_called()
+        self.assertEqual(messages[0]["type"], "initial")
+
+
+if __name__ == "__main__":
+    unittest.main()
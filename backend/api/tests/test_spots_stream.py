@@ -0,0 +1,123 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from api.main import SPOTS_STREAM_NAME, get_spots_stream_cursor, report_broadcast
+from shared import metrics
+from shared.metrics import report_worker_value
+
+
+class FakePipeline:
+    def __init__(self, valkey_client):
+        self.valkey_client = valkey_client
+        self.commands = []
+        self.executed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key, value):
+        self.commands.append(("set", key))
+        self.valkey_client.values[key] = value
+
+    def mset(self, values):
+        self.commands.append(("mset", sorted(values)))
+
+    async def execute(self):
+        self.executed = True
+
+
+class FakeScript:
+    """Runs REPORT_WORKER_VALUE_SCRIPT in Python."""
+
+    def __init__(self, valkey_client):
+        self.valkey_client = valkey_client
+
+    async def __call__(self, keys, args):
+        values_key, expiry_key, total_key = keys
+        worker_id, value, now, ttl = args
+        values = self.valkey_client.hashes.setdefault(values_key, {})
+        expiry = self.valkey_client.zsets.setdefault(expiry_key, {})
+        values[worker_id] = str(value)
+        expiry[worker_id] = now + ttl
+        for member in [member for member, score in expiry.items() if score <= now]:
+            del expiry[member]
+            values.pop(member, None)
+        total = sum(int(worker_value) for worker_value in values.values())
+        self.valkey_client.ttls[values_key] = ttl
+        self.valkey_client.ttls[expiry_key] = ttl
+        self.valkey_client.values[total_key] = str(total)
+        return total
+
+
+class FakeValkey:
+    def __init__(self, stream=()):
+        self.pipelines = []
+        self.stream = list(stream)
+        self.values = {}
+        self.hashes = {}
+        self.zsets = {}
+        self.ttls = {}
+
+    def register_script(self, script):
+        return FakeScript(self)
+
+    def pipeline(self, transaction=True):
+        pipeline = FakePipeline(self)
+        self.pipelines.append(pipeline)
+        return pipeline
+
+    async def xrevrange(self, name, count=None):
+        self.stream_name = name
+        return list(reversed(self.stream))[:count]
+
+
+class SpotsStreamTest(unittest.TestCase):
+    def test_stream_cursor_starts_at_the_newest_spot(self):
+        valkey_client = FakeValkey(stream=[("1-0", {"seq": "41"}), ("2-0", {"seq": "42"})])
+
+        self.assertEqual(asyncio.run(get_spots_stream_cursor(valkey_client)), ("2-0", 42))
+        self.assertEqual(valkey_client.stream_name, SPOTS_STREAM_NAME)
+
+    def test_stream_cursor_of_an_empty_stream_reads_from_the_start(self):
+        self.assertEqual(asyncio.run(get_spots_stream_cursor(FakeValkey())), ("0-0", None))
+
+    def test_report_broadcast_uses_one_pipeline(self):
+        valkey_client = FakeValkey()
+
+        asyncio.run(report_broadcast(valkey_client, {"api:broadcast_fanout_ms": 1.5}))
+
+        self.assertEqual(len(valkey_client.pipelines), 1)
+        self.assertTrue(valkey_client.pipelines[0].executed)
+        self.assertEqual(
+            valkey_client.pipelines[0].commands,
+            [("set", "monitor:api:last_broadcast_time"), ("mset", ["monitor:api:broadcast_fanout_ms"])],
+        )
+
+    def test_worker_client_counts_are_summed(self):
+        valkey_client = FakeValkey()
+
+        asyncio.run(report_worker_value(valkey_client, "api:ws_clients", "host-a:1", 3, 30))
+        total = asyncio.run(report_worker_value(valkey_client, "api:ws_clients", "host-b:2", 4, 30))
+
+        self.assertEqual(total, 7)
+        self.assertEqual(valkey_client.values["monitor:api:ws_clients"], "7")
+        self.assertEqual(valkey_client.ttls["monitor:api:ws_clients:workers"], 30)
+
+    def test_workers_that_stop_reporting_are_pruned(self):
+        valkey_client = FakeValkey()
+
+        with patch.object(metrics.time, "time", return_value=1000):
+            asyncio.run(report_worker_value(valkey_client, "api:ws_clients", "host-a:1", 3, 30))
+        with patch.object(metrics.time, "time", return_value=1031):
+            total = asyncio.run(report_worker_value(valkey_client, "api:ws_clients", "host-b:2", 4, 30))
+
+        self.assertEqual(total, 4)
+        self.assertEqual(valkey_client.hashes["monitor:api:ws_clients:workers"], {"host-b:2": "4"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import unittest
+
+from api.spot_filters import SpotFilter, SpotIndex
+from api.websocket_clients import SLOW_CLIENT_CLOSE_CODE, SpotsClient, broadcast_spots
+
+
+def create_spot(dx_callsign, band=20.0, mode="CW"):
+    return {
+        "dx_callsign": dx_callsign,
+        "band": band,
+        "mode": mode,
+        "dx_continent": "NA",
+        "spotter_continent": "AS",
+        "dx_dxcc_code": 291,
+        "is_dxpedition": False,
+    }
+
+
+class FakeWebSocket:
+    def __init__(self, send_delay=0):
+        self.send_delay = send_delay
+        self.sent = []
+        self.close_code = None
+
+    async def send_text(self, payload):
+        await asyncio.sleep(self.send_delay)
+        self.sent.append(payload)
+
+    async def close(self, code):
+        self.close_code = code
+
+
+class SpotsClientTest(unittest.IsolatedAsyncioTestCase):
+    async def test_broadcast_sends_the_same_payload_to_every_client(self):
+        clients = {SpotsClient(FakeWebSocket(), max_queued=4, send_timeout=1) for _ in range(3)}
+        tasks = [asyncio.create_task(client.run()) for client in clients]
+
+        broadcast_spots(clients, SpotIndex([create_spot("K1ABC")]))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        payloads = [client.websocket.sent for client in clients]
+        self.assertEqual(payloads[0], payloads[1])
+        self.assertEqual(json.loads(payloads[0][0]), {"type": "update", "spots": [create_spot("K1ABC")]})
+        for task in tasks:
+            task.cancel()
+
+    async def test_broadcast_sends_filtered_clients_only_matching_spots(self):
+        cw_client = SpotsClient(FakeWebSocket(), max_queued=4, send_timeout=1)
+        cw_client.spot_filter = SpotFilter(modes=["CW"])
+        vhf_client = SpotsClient(FakeWebSocket(), max_queued=4, send_timeout=1)
+        vhf_client.spot_filter = SpotFilter(bands=["VHF"])
+        clients = {cw_client, vhf_client}
+        task = asyncio.create_task(cw_client.run())
+
+        broadcast_spots(clients, SpotIndex([create_spot("K1ABC", mode="CW"), create_spot("K2ABC", mode="FT8")]))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        self.assertEqual(json.loads(cw_client.websocket.sent[0])["spots"], [create_spot("K1ABC", mode="CW")])
+        self.assertEqual(vhf_client._queue.qsize(), 0)
+        task.cancel()
+
+    async def test_full_queue_drops_the_client(self):
+        client = SpotsClient(FakeWebSocket(), max_queued=2, send_timeout=1)
+        clients = {client}
+
+        for _ in range(3):
+            broadcast_spots(clients, SpotIndex([]))
+        await client.run()
+
+        self.assertTrue(client.dropped)
+        self.assertEqual(clients, set())
+        self.assertEqual(client.websocket.sent, [])
+        self.assertEqual(client.websocket.close_code, SLOW_CLIENT_CLOSE_CODE)
+
+    async def test_send_timeout_drops_the_client(self):
+        client = SpotsClient(FakeWebSocket(send_delay=1), max_queued=2, send_timeout=0.01)
+
+        client.enqueue("{}")
+        await client.run()
+
+        self.assertTrue(client.dropped)
+        self.assertEqual(client.websocket.close_code, SLOW_CLIENT_CLOSE_CODE)
+        self.assertFalse(client.enqueue("{}"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,17 +1,64 @@
 import asyncio
 import os
-from datetime import UTC, datetime, timedelta
+from datetime import UTC, date, datetime, timedelta
 
 from loguru import logger
 from shared.db import GeoCache, HolySpot
-from sqlalchemy import delete, func, select
-from sqlalchemy.exc import OperationalError, ProgrammingError
+from shared.partitions import (
+    HOLY_SPOTS_TABLE,
+    IS_PARTITIONED_QUERY,
+    LIST_PARTITIONS_QUERY,
+    PARTITION_PRECREATE_DAYS,
+    create_holy_spots_partition_sql,
+    default_partition_has_rows_sql,
+    expired_holy_spots_partitions,
+    holy_spots_partition_days,
+    holy_spots_partition_name,
+    split_default_partition_sql,
+)
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.exc import DBAPIError, OperationalError, ProgrammingError
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from collectors.logging_setup import open_log_file
 from collectors.settings import settings
 
 
+async def is_partitioned(session, table_name: str) -> bool:
+    result = await session.execute(text(IS_PARTITIONED_QUERY), {"table_name": table_name})
+    return result.first() is not None
+
+
+async def maintain_holy_spots_partitions(session, today: date, cutoff_day: date):
+    """
+    Create the upcoming daily partitions and drop the ones older than the retention period.
+
+    A day that cannot be partitioned is logged and skipped, so retention still runs.
+    """
+    result = await session.execute(text(LIST_PARTITIONS_QUERY), {"table_name": HOLY_SPOTS_TABLE})
+    partition_names = set(result.scalars().all())
+
+    for day in holy_spots_partition_days(today, today + timedelta(days=PARTITION_PRECREATE_DAYS)):
+        partition_name = holy_spots_partition_name(day)
+        if partition_name in partition_names:
+            continue
+        try:
+            async with session.begin_nested():
+                if (await session.execute(text(default_partition_has_rows_sql(day)))).first() is None:
+                    statements = [create_holy_spots_partition_sql(day)]
+                else:
+                    logger.info(f"Moving the rows of {day} from the default partition to {partition_name}")
+                    statements = split_default_partition_sql(day)
+                for statement in statements:
+                    await session.execute(text(statement))
+        except DBAPIError as e:
+            logger.error(f"Failed to create partition {partition_name}: {e}")
+
+    for partition_name in expired_holy_spots_partitions(partition_names, cutoff_day):
+        logger.info(f"Dropping expired partition {partition_name}")
+        await session.execute(text(f"DROP TABLE {partition_name}"))
+
+
 async def cleanup(debug: bool = False):
     open_log_file(os.path.join(settings.log_dir, "collectors", "db", "cleanup_database"))
     engine = create_async_engine(settings.db_url, echo=False)
@@ -24,21 +71,25 @@ async def cleanup(debug: bool = False):
     logger.info(f"now (UTC)             = {now_utc.replace(tzinfo=None)}")
     logger.info(f"cutoff_datetime (UTC) = {cutoff_datetime}")
 
-    tables = [["holy_spots2", HolySpot], ["geo_cache", GeoCache]]
+    cutoff_timestamp = int((now_utc - timedelta(hours=hours)).timestamp())
+    tables = [
+        ["holy_spots2", HolySpot, HolySpot.timestamp < cutoff_timestamp],
+        ["geo_cache", GeoCache, GeoCache.date_time < cutoff_datetime],
+    ]
 
     try:
         async with AsyncSession() as session:
-            for item in tables:
-                table_name = item[0]
-                model = item[1]
-
+            for table_name, model, expired_condition in tables:
                 async with session.begin():
                     result = await session.execute(select(func.count()).select_from(model))
                     record_count = result.scalar_one()
                     logger.info(f"Before cleanup: Table: {table_name:12}   records: {record_count}")
 
-                    delete_stmt = delete(model).where(model.date_time < cutoff_datetime)
-                    delete_result = await session.execute(delete_stmt)
+                    if table_name == HOLY_SPOTS_TABLE and await is_partitioned(session, table_name):
+                        await maintain_holy_spots_partitions(session, now_utc.date(), cutoff_datetime.date())
+
+                    # With partitions, this only removes the remaining expired rows of the boundary day.
+                    delete_result = await session.execute(delete(model).where(expired_condition))
                     deleted_count = delete_result.rowcount
 
                     if debug:
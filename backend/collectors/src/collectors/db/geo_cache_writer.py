@@ -0,0 +1,201 @@
+import asyncio
+import time
+from collections import Counter
+from datetime import UTC, datetime, timedelta
+
+from loguru import logger
+from shared.db import GeoCache
+from shared.geo import (
+    GeoData,
+    GeoException,
+    decode_geo_cache_value,
+    encode_geo_cache_value,
+    geo_cache_key,
+    seed_local_geo_cache,
+)
+from shared.metrics import push_exception_event, set_values
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+UPSERTED_COLUMNS = (
+    "locator",
+    "lat",
+    "lon",
+    "dxcc_code",
+    "continent",
+    "date",
+    "time",
+    "date_time",
+    "locator_source",
+    "state",
+    "cq_zone",
+    "itu_zone",
+)
+
+
+def build_geo_cache_row(callsign: str, geo_data: GeoData, now: datetime | None = None) -> dict:
+    now = now or datetime.now(UTC).replace(tzinfo=None)
+    return {
+        "callsign": callsign,
+        "locator": geo_data.locator,
+        "lat": str(geo_data.lat),
+        "lon": str(geo_data.lon),
+        "dxcc_code": geo_data.dxcc_code,
+        "continent": geo_data.continent,
+        "date": now.date(),
+        "time": now.time(),
+        "date_time": now,
+        "locator_source": geo_data.locator_source,
+        "state": geo_data.state,
+        "cq_zone": geo_data.cq_zone,
+        "itu_zone": geo_data.itu_zone,
+        "hit_count": 0,
+    }
+
+
+def build_geo_cache_upsert(rows: list[dict]):
+    """Insert or refresh rows, adding their hits to the stored hit_count."""
+    statement = pg_insert(GeoCache.__table__).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=["callsign"],
+        set_={
+            **{column: statement.excluded[column] for column in UPSERTED_COLUMNS},
+            "hit_count": GeoCache.__table__.c.hit_count + statement.excluded.hit_count,
+        },
+    )
+
+
+def build_geo_cache_hits_update():
+    table = GeoCache.__table__
+    return (
+        update(table)
+        .where(table.c.callsign == bindparam("b_callsign"))
+        .values(hit_count=table.c.hit_count + bindparam("b_hits"))
+    )
+
+
+def geo_cache_row_to_geo_data(row: GeoCache) -> GeoData:
+    return decode_geo_cache_value(
+        row.callsign,
+        "geo_cache",
+        {
+            "locator_source": row.locator_source,
+            "locator": row.locator,
+            "lat": float(row.lat),
+            "lon": float(row.lon),
+            "state": row.state or "",
+            "cq_zone": row.cq_zone,
+            "itu_zone": row.itu_zone,
+        },
+    )
+
+
+async def warm_geo_caches(engine, valkey_client, limit: int, max_age: timedelta, geo_expiration: int) -> int:
+    """
+    Load the most used recent geo_cache rows into Valkey and the local geo cache.
+
+    Valkey keys that already exist are kept, they are at least as fresh as the stored rows.
+    """
+    cutoff = datetime.now(UTC).replace(tzinfo=None) - max_age
+    query = (
+        select(GeoCache)
+        .where(GeoCache.date_time >= cutoff, GeoCache.locator_source.is_not(None))
+        .order_by(GeoCache.hit_count.desc())
+        .limit(limit)
+    )
+    async with AsyncSession(engine) as session:
+        rows = (await session.execute(query)).scalars().all()
+
+    warmed = 0
+    async with valkey_client.pipeline(transaction=False) as pipeline:
+        for row in rows:
+            try:
+                geo_data = geo_cache_row_to_geo_data(row)
+            except GeoException:
+                continue
+            pipeline.set(geo_cache_key(row.callsign), encode_geo_cache_value(geo_data), ex=geo_expiration, nx=True)
+            seed_local_geo_cache(row.callsign, geo_data, ttl=geo_expiration)
+            warmed += 1
+        await pipeline.execute()
+
+    logger.info(f"Loaded {warmed} geo_cache callsigns into Valkey and the local geo cache")
+    return warmed
+
+
+class GeoCacheWriter:
+    """
+    Write-behind durable tier of the geo cache, persisting lookups to geo_cache.
+
+    Fresh lookups and cache hits are buffered in memory and written every flush with
+    one upsert for the new data and one batched update for the hit counts. The buffer
+    of a failed flush is merged back for the next attempt.
+    """
+
+    def __init__(self, engine, valkey_client, max_rows: int):
+        self.engine = engine
+        self.valkey_client = valkey_client
+        self.max_rows = max_rows
+        self._rows: dict[str, dict] = {}
+        self._hits: Counter[str] = Counter()
+        self._lock = asyncio.Lock()
+
+    @property
+    def buffered_rows(self) -> int:
+        return len(self._rows)
+
+    def record_lookup(self, callsign: str, geo_data: GeoData):
+        self._rows[callsign] = build_geo_cache_row(callsign, geo_data)
+        self._hits[callsign] += 1
+
+    def record_hit(self, callsign: str):
+        self._hits[callsign] += 1
+
+    async def flush(self):
+        async with self._lock:
+            if not self._rows and not self._hits:
+                return
+
+            rows, hits = self._rows, self._hits
+            self._rows, self._hits = {}, Counter()
+            for callsign, row in rows.items():
+                row["hit_count"] = hits.pop(callsign, 0)
+            hit_params = [{"b_callsign": callsign, "b_hits": count} for callsign, count in hits.items()]
+            upsert_rows = list(rows.values())
+
+            started = time.monotonic()
+            try:
+                async with AsyncSession(self.engine) as session:
+                    for start in range(0, len(upsert_rows), self.max_rows):
+                        await session.execute(build_geo_cache_upsert(upsert_rows[start : start + self.max_rows]))
+                    if hit_params:
+                        await session.execute(build_geo_cache_hits_update(), hit_params)
+                    await session.commit()
+            except Exception as e:
+                logger.exception(f"Failed to flush {len(upsert_rows)} geo_cache rows to PostgreSQL")
+                for callsign, row in rows.items():
+                    self._rows.setdefault(callsign, row)
+                    self._hits[callsign] += row["hit_count"]
+                self._hits.update(hits)
+                await push_exception_event(self.valkey_client, "collector", f"geo_cache flush: {e}")
+                return
+
+            duration = time.monotonic() - started
+            logger.debug(
+                f"Flushed {len(upsert_rows)} geo_cache rows and {len(hit_params)} hit counts in {duration * 1000:.1f} ms"
+            )
+            try:
+                await set_values(
+                    self.valkey_client,
+                    {
+                        "collector:geo_cache_flush_rows": len(upsert_rows),
+                        "collector:geo_cache_flush_latency_ms": round(duration * 1000, 1),
+                    },
+                )
+            except Exception:
+                logger.warning("Failed to report geo_cache flush metrics", exc_info=True)
+
+    async def run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+
+from loguru import logger
+from shared.db import HolySpot
+from shared.metrics import push_drop_event, push_exception_event, set_values
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+RATE_WINDOW_SECONDS = 60
+# Errors that say PostgreSQL is unreachable rather than that it rejected the rows, the rows are kept for a retry.
+UNAVAILABLE_ERRORS = (OperationalError, InterfaceError, OSError, TimeoutError)
+
+
+def build_holy_spot_row(spot: dict) -> dict:
+    dt = datetime.fromtimestamp(float(spot["timestamp"]))
+    return {
+        "seq": spot.get("seq"),
+        "cluster": spot["cluster"],
+        "time": dt.time(),
+        "timestamp": int(float(spot["timestamp"])),
+        "frequency": str(spot["frequency"]),
+        "band": spot["band"],
+        "mode": spot["mode"],
+        "mode_selection": spot["mode_selection"],
+        "spotter_callsign": spot["spotter_callsign"],
+        "spotter_locator": spot["spotter_locator"],
+        "spotter_locator_source": spot["spotter_locator_source"],
+        "spotter_lat": str(spot["spotter_lat"]),
+        "spotter_lon": str(spot["spotter_lon"]),
+        "spotter_dxcc_code": spot["spotter_dxcc_code"],
+        "spotter_continent": spot["spotter_continent"],
+        "spotter_state": spot["spotter_state"],
+        "spotter_cq_zone": spot.get("spotter_cq_zone"),
+        "spotter_itu_zone": spot.get("spotter_itu_zone"),
+        "dx_callsign": spot["dx_callsign"],
+        "dx_locator": spot["dx_locator"],
+        "dx_locator_source": spot["dx_locator_source"],
+        "dx_lat": str(spot["dx_lat"]),
+        "dx_lon": str(spot["dx_lon"]),
+        "dx_dxcc_code": spot["dx_dxcc_code"],
+        "dx_continent": spot["dx_continent"],
+        "dx_state": spot["dx_state"],
+        "dx_cq_zone": spot.get("dx_cq_zone"),
+        "dx_itu_zone": spot.get("dx_itu_zone"),
+        "pota_reference": spot.get("pota_reference"),
+        "pota_name": spot.get("pota_name"),
+        "pota_description": spot.get("pota_description"),
+        "sota_points": spot.get("sota_points"),
+        "comment": spot["comment"],
+        "is_dxpedition": spot["is_dxpedition"],
+    }
+
+
+def build_holy_spots_insert(rows: list[dict]):
+    statement = pg_insert(HolySpot.__table__).values(rows)
+    return statement.on_conflict_do_nothing(constraint="uc_holy_spots2")
+
+
+async def sync_spot_seq(engine, valkey_client, key: str):
+    """Move the spot sequence counter past the highest stored seq, in case Valkey lost or rolled back its value."""
+    async with AsyncSession(engine) as session:
+        max_seq = (await session.execute(select(func.max(HolySpot.seq)))).scalar() or 0
+
+    current_seq = int(await valkey_client.get(key) or 0)
+    if current_seq < max_seq:
+        logger.warning(f"Moving {key} from {current_seq} to the stored maximum {max_seq}")
+        await valkey_client.set(key, max_seq)
+
+
+class HolySpotWriter:
+    """
+    Buffers enriched spots and writes them to holy_spots2 with one multi-row insert.
+
+    The buffer is flushed when it reaches max_rows or when its oldest row is older
+    than max_age seconds. While PostgreSQL is unavailable, unwritten rows are kept for
+    the next attempt, up to max_buffered_rows. A batch PostgreSQL rejects is split until
+    the rejected rows are isolated, they are dropped so they cannot block later flushes.
+
+    publish is called with the spots of each flush once they are committed, so readers
+    that see a published spot also find it in PostgreSQL.
+    """
+
+    def __init__(
+        self,
+        engine,
+        valkey_client,
+        max_rows: int,
+        max_age: float,
+        max_buffered_rows: int | None = None,
+        publish: Callable[[list[dict]], Awaitable[None]] | None = None,
+    ):
+        self.engine = engine
+        self.valkey_client = valkey_client
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.max_buffered_rows = max_buffered_rows or max_rows * 10
+        self.publish = publish
+        # (row, spot) pairs, the spot is published after its row is committed.
+        self._rows: list[tuple[dict, dict]] = []
+        self._oldest_row_time: float | None = None
+        self._lock = asyncio.Lock()
+        self._window_started = time.monotonic()
+        self._window_rows = 0
+
+    @property
+    def buffered_rows(self) -> int:
+        return len(self._rows)
+
+    async def add(self, spots: list[dict]):
+        if not spots:
+            return
+
+        if self._oldest_row_time is None:
+            self._oldest_row_time = time.monotonic()
+        self._rows.extend((build_holy_spot_row(spot), spot) for spot in spots)
+
+        if len(self._rows) >= self.max_rows:
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._rows:
+                return
+
+            rows = self._rows
+            self._rows = []
+            self._oldest_row_time = None
+
+            started = time.monotonic()
+            written: list[tuple[dict, dict]] = []
+            rejected: list[tuple[dict, dict]] = []
+            try:
+                for start in range(0, len(rows), self.max_rows):
+                    await self._insert_rows(rows[start : start + self.max_rows], written, rejected)
+            except UNAVAILABLE_ERRORS as e:
+                unwritten = rows[len(written) + len(rejected) :]
+                logger.exception(f"Failed to flush {len(unwritten)} spots to PostgreSQL")
+                await self._keep_for_retry(unwritten, started)
+                await push_exception_event(self.valkey_client, "collector", f"postgres flush: {e}")
+            else:
+                await self._report_flush(len(written), time.monotonic() - started)
+            await self._publish([spot for _row, spot in written])
+
+    async def _insert_rows(
+        self, rows: list[tuple[dict, dict]], written: list[tuple[dict, dict]], rejected: list[tuple[dict, dict]]
+    ):
+        """Insert rows in order, appending each row to written or, if PostgreSQL rejects it alone, to rejected."""
+        try:
+            async with AsyncSession(self.engine) as session:
+                await session.execute(build_holy_spots_insert([row for row, _spot in rows]))
+                await session.commit()
+        except UNAVAILABLE_ERRORS:
+            raise
+        except Exception as e:
+            if len(rows) > 1:
+                middle = len(rows) // 2
+                await self._insert_rows(rows[:middle], written, rejected)
+                await self._insert_rows(rows[middle:], written, rejected)
+                return
+            logger.error(f"Dropping spot rejected by PostgreSQL: {e}")
+            rejected.append(rows[0])
+            await push_drop_event(self.valkey_client, "postgres_rejected", json.dumps(rows[0][0], default=str))
+            return
+        written.extend(rows)
+
+    async def _publish(self, spots: list[dict]):
+        if self.publish is None or not spots:
+            return
+        try:
+            await self.publish(spots)
+        except Exception as e:
+            logger.exception(f"Failed to publish {len(spots)} written spots")
+            await push_exception_event(self.valkey_client, "collector", f"spot publish: {e}")
+
+    async def _keep_for_retry(self, rows: list[tuple[dict, dict]], started: float):
+        self._rows = rows + self._rows
+        self._oldest_row_time = started
+        overflow = len(self._rows) - self.max_buffered_rows
+        if overflow > 0:
+            logger.warning(f"Dropping the {overflow} oldest unwritten spots, the PostgreSQL buffer is full")
+            self._rows = self._rows[overflow:]
+            await push_drop_event(self.valkey_client, "postgres_buffer_full", f"{overflow} spots")
+
+    async def _report_flush(self, row_count: int, duration: float):
+        self._window_rows += row_count
+        metrics = {"collector:db_flush_latency_ms": round(duration * 1000, 1)}
+
+        elapsed = time.monotonic() - self._window_started
+        if elapsed >= RATE_WINDOW_SECONDS:
+            metrics["collector:db_rows_per_sec"] = round(self._window_rows / elapsed, 2)
+            self._window_started = time.monotonic()
+            self._window_rows = 0
+
+        logger.debug(f"Flushed {row_count} spots to PostgreSQL in {duration * 1000:.1f} ms")
+        try:
+            await set_values(self.valkey_client, metrics)
+        except Exception:
+            logger.warning("Failed to report PostgreSQL flush metrics", exc_info=True)
+
+    async def run(self):
+        """Flush the buffer whenever its oldest row exceeds max_age."""
+        while True:
+            await asyncio.sleep(self.max_age / 2)
+            if self._oldest_row_time is not None and time.monotonic() - self._oldest_row_time >= self.max_age:
+                await self.flush()
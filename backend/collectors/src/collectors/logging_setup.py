@@ -1,7 +1,15 @@
+import asyncio
+import gzip
+import threading
+import traceback
+from collections.abc import Callable
 from datetime import datetime
 
 from loguru import logger
 
+RAW_FEED_FLUSH_INTERVAL = 1.0
+RAW_FEED_MAX_BUFFERED = 100000
+
 
 def open_log_file(log_filename_prefix: str):
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -11,12 +19,95 @@ def open_log_file(log_filename_prefix: str):
     return log_filename
 
 
-def open_task_log_file(log_filename_prefix: str):
+class RawFeedLog:
+    """
+    Per-host archive of a telnet feed, written off the event loop.
+
+    Records are only appended to a buffer by the event loop. A background task formats
+    them and appends them to the file in a worker thread every flush interval. Records
+    beyond max_buffered are dropped and counted until the writer catches up.
+    """
+
+    def __init__(self, path: str, name: str, compress: bool = False, max_buffered: int = RAW_FEED_MAX_BUFFERED):
+        self.path = path
+        self.name = name.encode()
+        self.max_buffered = max_buffered
+        self.dropped = 0
+        self._file = gzip.open(path, "ab") if compress else open(path, "ab")
+        self._buffer: list[tuple[float, bytes, bytes]] = []
+        self._write_lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    def write_line(self, line: bytes, level: bytes = b"INFO"):
+        if len(self._buffer) >= self.max_buffered:
+            self.dropped += 1
+            return
+        self._buffer.append((datetime.now().timestamp(), level, line))
+
+    def debug(self, message: str | Callable[[], str]):
+        """message may be a callable, it is only called when the record fits in the buffer."""
+        if len(self._buffer) >= self.max_buffered:
+            self.dropped += 1
+            return
+        if callable(message):
+            message = message()
+        self.write_line(message.encode("utf-8"), b"DEBUG")
+
+    def info(self, message: str):
+        self.write_line(message.encode("utf-8"), b"INFO")
+
+    def error(self, message: str):
+        self.write_line(message.encode("utf-8"), b"ERROR")
+
+    def exception(self, message: str):
+        self.write_line(f"{message}\n{traceback.format_exc().rstrip()}".encode("utf-8"), b"ERROR")
+
+    def _write(self, records: list[tuple[float, bytes, bytes]]):
+        chunks = []
+        for timestamp, level, line in records:
+            chunks.append(datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3].encode())
+            chunks.append(b" - %s - %s - %s\n" % (self.name, level, line))
+        with self._write_lock:
+            if not self._file.closed:
+                self._file.write(b"".join(chunks))
+                self._file.flush()
+
+    async def flush(self):
+        if self.dropped:
+            logger.warning(f"Dropped {self.dropped} records of {self.path}, the writer is behind")
+            self.dropped = 0
+        if not self._buffer:
+            return
+        records, self._buffer = self._buffer, []
+        try:
+            await asyncio.to_thread(self._write, records)
+        except OSError:
+            logger.exception(f"Failed to write {len(records)} records to {self.path}")
+
+    async def run(self, interval: float = RAW_FEED_FLUSH_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def start(self, interval: float = RAW_FEED_FLUSH_INTERVAL):
+        self._task = asyncio.create_task(self.run(interval), name=f"raw_feed_log:{self.name.decode()}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        with self._write_lock:
+            self._file.close()
+
+
+def open_raw_feed_log(log_filename_prefix: str, name: str, compress: bool = False) -> RawFeedLog:
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     log_file_path = f"{log_filename_prefix}.{timestamp}.log"
-    logger.add(
-        log_file_path,
-        filter=lambda record, tid=log_filename_prefix: record["extra"].get("task") == tid,
-        format="{time:YYYY-MM-DD HH:mm:ss.SSS} - {thread.name} - {level} - {message}",
-    )
-    return logger.bind(task=log_filename_prefix)
+    if compress:
+        log_file_path += ".gz"
+    return RawFeedLog(log_file_path, name, compress=compress)
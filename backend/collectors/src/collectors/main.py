@@ -3,16 +3,25 @@ import asyncio
 import sys
 import re
 import time
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from functools import partial
 
 from loguru import logger
-from shared.cty import ensure_cty_available
-from shared.db import HolySpot
-from shared.geo import GeoException, get_geo_details
-from shared.metrics import push_drop_event, push_exception_event, set_timestamp
-from shared.qrz import QrzSessionManager
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from shared.cty import ensure_cty_available, run_cty_refresh_loop
+from shared.geo import (
+    GeoException,
+    configure_durable_geo_cache,
+    configure_local_geo_cache,
+    get_geo_details,
+    prepare_cty_resolver,
+    report_geo_cache_metrics,
+)
+from shared.metrics import push_drop_event, push_exception_event, queue_timestamp, set_timestamp
+from shared.qrz import QrzSessionManager, configure_qrz_client, report_qrz_metrics
+from sqlalchemy.ext.asyncio import create_async_engine
 
+from collectors.db.geo_cache_writer import GeoCacheWriter, warm_geo_caches
+from collectors.db.spot_writer import HolySpotWriter, sync_spot_seq
 from collectors.db.valkey_config import get_valkey_client
 from collectors.enrichers.dxpeditions import is_active_dxpedition
 from collectors.enrichers.frequencies import InvalidBandError, find_band, find_band_and_mode
@@ -22,12 +31,14 @@ from collectors.sota import run_sota_collector
 from collectors.telnet.runner import (
     run_concurrent_telnet_connections,
 )
-from collectors.utils import STREAM_ARRIVALS
+from collectors.utils import STREAM_ARRIVALS, NearDuplicateIndex, configure_spot_deduplicator
 from collectors.wwff import run_wwff_collector
 
 import aiomonitor
 
 STREAM_API = "stream-api"
+# Counter of the last sequence number given to a spot, the API uses it to replay missed spots.
+SPOT_SEQ_KEY = "spots:seq"
 
 
 class InvalidCallsignError(Exception):
@@ -113,48 +124,114 @@ async def enrich_spot(qrz_session_key: str, spot: dict, http_client, valkey_clie
     return spot
 
 
-async def add_spot_to_postgres(engine, spot: dict):
-    """Add an enriched spot to PostgreSQL."""
-    dt = datetime.fromtimestamp(float(spot["timestamp"]))
-    record = HolySpot(
-        cluster=spot["cluster"],
-        time=dt.time(),
-        timestamp=int(float(spot["timestamp"])),
-        frequency=str(spot["frequency"]),
-        band=spot["band"],
-        mode=spot["mode"],
-        mode_selection=spot["mode_selection"],
-        spotter_callsign=spot["spotter_callsign"],
-        spotter_locator=spot["spotter_locator"],
-        spotter_locator_source=spot["spotter_locator_source"],
-        spotter_lat=str(spot["spotter_lat"]),
-        spotter_lon=str(spot["spotter_lon"]),
-        spotter_dxcc_code=spot["spotter_dxcc_code"],
-        spotter_continent=spot["spotter_continent"],
-        spotter_state=spot["spotter_state"],
-        spotter_cq_zone=spot.get("spotter_cq_zone"),
-        spotter_itu_zone=spot.get("spotter_itu_zone"),
-        dx_callsign=spot["dx_callsign"],
-        dx_locator=spot["dx_locator"],
-        dx_locator_source=spot["dx_locator_source"],
-        dx_lat=str(spot["dx_lat"]),
-        dx_lon=str(spot["dx_lon"]),
-        dx_dxcc_code=spot["dx_dxcc_code"],
-        dx_continent=spot["dx_continent"],
-        dx_state=spot["dx_state"],
-        dx_cq_zone=spot.get("dx_cq_zone"),
-        dx_itu_zone=spot.get("dx_itu_zone"),
-        pota_reference=spot.get("pota_reference"),
-        pota_name=spot.get("pota_name"),
-        pota_description=spot.get("pota_description"),
-        sota_points=spot.get("sota_points"),
-        comment=spot["comment"],
-        is_dxpedition=spot["is_dxpedition"],
+async def drain_spot_batch(input_queue: asyncio.Queue, max_size: int, timeout: float) -> list[dict]:
+    """Wait for one spot, then collect more until the batch is full or the timeout expires."""
+    spots = [await input_queue.get()]
+    deadline = asyncio.get_running_loop().time() + timeout
+    while len(spots) < max_size:
+        try:
+            spots.append(input_queue.get_nowait())
+            continue
+        except asyncio.QueueEmpty:
+            pass
+
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            break
+        try:
+            spots.append(await asyncio.wait_for(input_queue.get(), timeout=remaining))
+        except TimeoutError:
+            break
+    return spots
+
+
+def drop_near_duplicates(spots: list[dict], near_duplicates: NearDuplicateIndex) -> list[dict]:
+    """Drop spots already accepted from another cluster with a different minute or rounded frequency."""
+    unique_spots = []
+    for spot in spots:
+        if near_duplicates.is_duplicate(spot):
+            logger.debug(
+                f"Dropping near duplicate spot: {spot['dx_callsign']} by {spot['spotter_callsign']} on {spot['frequency']}"
+            )
+        else:
+            unique_spots.append(spot)
+    return unique_spots
+
+
+async def enrich_and_filter_spot(
+    spot: dict,
+    qrz_manager: QrzSessionManager,
+    valkey_client,
+    semaphore: asyncio.Semaphore,
+) -> dict | None:
+    """Enrich a single spot, returning None if the spot should be dropped."""
+    try:
+        async with semaphore:
+            enriched_spot = await enrich_spot(
+                qrz_session_key=qrz_manager.get_key(),
+                spot=spot,
+                http_client=qrz_manager.http_client,
+                valkey_client=valkey_client,
+            )
+    except InvalidBandError:
+        logger.debug(f"Dropping spot due to invalid band: {spot}")
+        return None
+    except InvalidCallsignError as e:
+        logger.info(f"Dropping spot due to {e}: {spot}")
+        return None
+    except GeoException as e:
+        if e.notify_monitor:
+            logger.exception("Dropping spot due to geo exception")
+            await push_drop_event(valkey_client, f"geo_exception ({e.callsign_type}, {e.data_type})", e.callsign)
+        else:
+            logger.info(
+                f"Dropping spot due to non-notifiable geo exception ({e.callsign_type}, {e.data_type}): {e.callsign}"
+            )
+        return None
+    except Exception as e:
+        logger.exception("Unexpected error enriching spot")
+        await push_exception_event(valkey_client, "collector", str(e))
+        return None
+
+    logger.debug(f"Enriched: {enriched_spot.get('dx_callsign')} on {enriched_spot.get('frequency')}")
+
+    if enriched_spot["spotter_locator"].startswith("AA00") or enriched_spot["dx_locator"].startswith("AA00"):
+        logger.info(f"Dropping spot with South Pole locator: {enriched_spot.get('dx_callsign')}")
+        return None
+
+    return enriched_spot
+
+
+async def process_spot_batch(
+    spots: list[dict],
+    qrz_manager: QrzSessionManager,
+    valkey_client,
+    spot_writer: HolySpotWriter,
+    semaphore: asyncio.Semaphore,
+):
+    enriched_spots = await asyncio.gather(
+        *(enrich_and_filter_spot(spot, qrz_manager, valkey_client, semaphore) for spot in spots)
     )
+    enriched_spots = [spot for spot in enriched_spots if spot is not None]
+
+    if enriched_spots:
+        last_seq = await valkey_client.incrby(SPOT_SEQ_KEY, len(enriched_spots))
+        for seq, enriched_spot in enumerate(enriched_spots, start=last_seq - len(enriched_spots) + 1):
+            enriched_spot["seq"] = seq
+
+    # The writer publishes the spots to stream-api once they are in PostgreSQL.
+    await spot_writer.add(enriched_spots)
+    await set_timestamp(valkey_client, "collector:heartbeat")
 
-    async with AsyncSession(engine) as session:
-        session.add(record)
-        await session.commit()
+
+async def publish_spots(valkey_client, spots: list[dict]):
+    """Add written spots with complete location and band data to stream-api for the API broadcast."""
+    async with valkey_client.pipeline(transaction=False) as pipeline:
+        queue_timestamp(pipeline, "collector:last_spot_time")
+        for spot in spots:
+            if all(spot.get(k) for k in ("spotter_locator", "dx_locator", "band", "mode")):
+                pipeline.xadd(STREAM_API, spot, "*", maxlen=10000)
+        await pipeline.execute()
 
 
 async def process_spots(input_queue: asyncio.Queue, qrz_manager: QrzSessionManager):
@@ -162,61 +239,61 @@ async def process_spots(input_queue: asyncio.Queue, qrz_manager: QrzSessionManag
 
     valkey_client = get_valkey_client()
     engine = create_async_engine(settings.db_url, pool_recycle=3600)
+    spot_writer = HolySpotWriter(
+        engine,
+        valkey_client,
+        max_rows=settings.postgres_flush_max_rows,
+        max_age=settings.postgres_flush_interval_ms / 1000,
+        publish=partial(publish_spots, valkey_client),
+    )
+    await sync_spot_seq(engine, valkey_client, SPOT_SEQ_KEY)
+    try:
+        await warm_geo_caches(
+            engine,
+            valkey_client,
+            limit=settings.geo_cache_warmup_size,
+            max_age=timedelta(hours=settings.geo_cache_warmup_max_age_hours),
+            geo_expiration=settings.valkey_geo_expiration,
+        )
+    except Exception as e:
+        logger.exception("Failed to warm the geo caches from geo_cache")
+        await push_exception_event(valkey_client, "collector", f"geo_cache warmup: {e}")
+    geo_cache_writer = GeoCacheWriter(engine, valkey_client, max_rows=settings.geo_cache_flush_max_rows)
+    configure_durable_geo_cache(geo_cache_writer)
+    flush_task = asyncio.create_task(spot_writer.run(), name="spot_writer_flush_task")
+    geo_flush_task = asyncio.create_task(
+        geo_cache_writer.run(settings.geo_cache_flush_interval), name="geo_cache_writer_flush_task"
+    )
+    semaphore = asyncio.Semaphore(settings.spot_enrich_concurrency)
+    batch_timeout = settings.spot_batch_timeout_ms / 1000
+    near_duplicates = NearDuplicateIndex(
+        settings.spot_near_duplicate_window, settings.spot_near_duplicate_frequency_tolerance
+    )
 
     try:
         while True:
-            spot = await input_queue.get()
-            await set_timestamp(valkey_client, "collector:heartbeat")
+            batch = await drain_spot_batch(input_queue, settings.spot_batch_size, batch_timeout)
             try:
-                try:
-                    enriched_spot = await enrich_spot(
-                        qrz_session_key=qrz_manager.get_key(),
-                        spot=spot,
-                        http_client=qrz_manager.http_client,
-                        valkey_client=valkey_client,
-                    )
-                except InvalidBandError:
-                    logger.debug(f"Dropping spot due to invalid band: {spot}")
-                    continue
-                except InvalidCallsignError as e:
-                    logger.info(f"Dropping spot due to {e}: {spot}")
-                    continue
-                except GeoException as e:
-                    if e.notify_monitor:
-                        logger.exception("Dropping spot due to geo exception")
-                        await push_drop_event(
-                            valkey_client, f"geo_exception ({e.callsign_type}, {e.data_type})", e.callsign
-                        )
-                    else:
-                        logger.info(
-                            f"Dropping spot due to non-notifiable geo exception "
-                            f"({e.callsign_type}, {e.data_type}): {e.callsign}"
-                        )
-                    continue
-                except Exception as e:
-                    logger.exception("Unexpected error enriching spot")
-                    await push_exception_event(valkey_client, "collector", str(e))
-                    continue
-
-                logger.debug(f"Enriched: {enriched_spot.get('dx_callsign')} on {enriched_spot.get('frequency')}")
-
-                if enriched_spot["spotter_locator"].startswith("AA00") or enriched_spot["dx_locator"].startswith(
-                    "AA00"
-                ):
-                    logger.info(f"Dropping spot with South Pole locator: {enriched_spot.get('dx_callsign')}")
-                    continue
-
-                await add_spot_to_postgres(engine, enriched_spot)
-                await set_timestamp(valkey_client, "collector:last_spot_time")
-
-                if all(enriched_spot.get(k) for k in ("spotter_locator", "dx_locator", "band", "mode")):
-                    await valkey_client.xadd(STREAM_API, enriched_spot, "*", maxlen=10000)
+                spots = drop_near_duplicates(batch, near_duplicates)
+                await process_spot_batch(spots, qrz_manager, valkey_client, spot_writer, semaphore)
+            except Exception as e:
+                logger.exception(f"Failed to process batch of {len(batch)} spots")
+                await push_exception_event(valkey_client, "collector", f"spot batch: {e}")
             finally:
-                input_queue.task_done()
+                # Every drained spot was taken with get(), including the near duplicates dropped above.
+                for _ in batch:
+                    input_queue.task_done()
 
     except asyncio.CancelledError:
         logger.info("Spot processor cancelled")
     finally:
+        flush_task.cancel()
+        geo_flush_task.cancel()
+        await asyncio.gather(flush_task, geo_flush_task, return_exceptions=True)
+        logger.info(f"Flushing {spot_writer.buffered_rows} buffered spots to PostgreSQL")
+        await spot_writer.flush()
+        configure_durable_geo_cache(None)
+        await geo_cache_writer.flush()
         await engine.dispose()
 
 
@@ -249,10 +326,32 @@ async def trim_arrivals_stream(valkey_client):
         await asyncio.sleep(3600)
 
 
+GEO_CACHE_METRICS_INTERVAL = 60
+
+
+async def report_geo_cache_metrics_loop(valkey_client):
+    while True:
+        await asyncio.sleep(GEO_CACHE_METRICS_INTERVAL)
+        try:
+            await report_geo_cache_metrics(valkey_client, "collector")
+            await report_qrz_metrics(valkey_client, "collector")
+        except Exception:
+            logger.warning("Failed to report geo cache metrics", exc_info=True)
+
+
 async def run_collector():
     logger.info("Starting collector...")
 
-    await ensure_cty_available()
+    await ensure_cty_available(prepare=prepare_cty_resolver)
+    configure_local_geo_cache(
+        settings.geo_local_cache_size, settings.geo_local_cache_ttl, settings.geo_negative_cache_ttl
+    )
+    configure_qrz_client(
+        settings.qrz_rate_limit,
+        settings.qrz_rate_limit_burst,
+        settings.qrz_breaker_failure_threshold,
+        settings.qrz_breaker_reset_seconds,
+    )
 
     spots_queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
 
@@ -272,13 +371,31 @@ async def run_collector():
         refresh_dxpedition_data(valkey_client), name="dxpedition_refresh_task"
     )
     trim_task = asyncio.create_task(trim_arrivals_stream(valkey_client), name="trim_arrivals_stream")
+    geo_metrics_task = asyncio.create_task(report_geo_cache_metrics_loop(valkey_client), name="geo_cache_metrics_task")
+    cty_refresh_task = asyncio.create_task(
+        run_cty_refresh_loop(valkey_client, "collector", prepare=prepare_cty_resolver), name="cty_refresh_task"
+    )
+    spot_deduplicator = configure_spot_deduplicator(
+        valkey_client, settings.spot_dedup_local_size, settings.valkey_spot_expiration
+    )
+    spot_dedup_flush_task = asyncio.create_task(
+        spot_deduplicator.run(settings.spot_arrivals_flush_interval_ms / 1000), name="spot_dedup_flush_task"
+    )
     processor_task = asyncio.create_task(process_spots(spots_queue, qrz_manager), name="processor_task")
     collector_tasks = run_concurrent_telnet_connections(spots_queue)
     collector_tasks.append(asyncio.create_task(run_pota_collector(spots_queue), name="pota.app"))
     collector_tasks.append(asyncio.create_task(run_sota_collector(spots_queue), name="sota"))
     collector_tasks.append(asyncio.create_task(run_wwff_collector(spots_queue), name="spots.wwff.co"))
 
-    tasks = [qrz_refresh_task, dxpedition_refresh_task, processor_task, trim_task]
+    tasks = [
+        qrz_refresh_task,
+        dxpedition_refresh_task,
+        processor_task,
+        trim_task,
+        geo_metrics_task,
+        cty_refresh_task,
+        spot_dedup_flush_task,
+    ]
     tasks.extend(collector_tasks)
 
     try:
@@ -14,7 +14,33 @@ class CollectorsSettings(PostgresSettings, ValkeySettings, QrzSettings, LogSetti
     debug: bool = Field(default=False, description="Enable debug mode")
     postgres_db_retention_days: int = Field(default=14, description="PostgreSQL database retention period in days")
     valkey_spot_expiration: int = Field(default=60, description="Valkey spot expiration time in seconds")
+    spot_dedup_local_size: int = Field(
+        default=50000, description="Accepted spot keys remembered locally to reject duplicates without Valkey"
+    )
+    spot_arrivals_flush_interval_ms: int = Field(
+        default=1000, description="Maximum time in milliseconds duplicate arrivals wait before stream-arrivals"
+    )
+    spot_near_duplicate_window: int = Field(
+        default=120, description="Seconds a spot suppresses copies of the same dx and spotter callsigns"
+    )
+    spot_near_duplicate_frequency_tolerance: float = Field(
+        default=0.1, description="Maximum frequency difference in kHz between near duplicate spots"
+    )
+    telnet_log_compress: bool = Field(default=False, description="Gzip the per-host telnet feed logs")
     username_for_telnet_clusters: str = Field(..., description="Username for telnet cluster connections")
+    spot_batch_size: int = Field(default=100, description="Maximum number of spots processed in one batch")
+    spot_batch_timeout_ms: int = Field(default=200, description="Maximum time in milliseconds to wait for a full batch")
+    postgres_flush_max_rows: int = Field(default=500, description="Flush buffered spots to PostgreSQL at this size")
+    postgres_flush_interval_ms: int = Field(
+        default=1000, description="Flush buffered spots to PostgreSQL when the oldest is this old"
+    )
+    spot_enrich_concurrency: int = Field(default=16, description="Maximum number of spots enriched concurrently")
+    geo_cache_flush_interval: int = Field(default=30, description="Seconds between geo_cache write-behind flushes")
+    geo_cache_flush_max_rows: int = Field(default=1000, description="Maximum geo_cache rows upserted in one statement")
+    geo_cache_warmup_size: int = Field(default=5000, description="Hottest geo_cache callsigns loaded on startup")
+    geo_cache_warmup_max_age_hours: int = Field(
+        default=24, description="Only geo_cache rows refreshed within this many hours are loaded on startup"
+    )
 
 
 settings = CollectorsSettings()
@@ -2,61 +2,56 @@ import asyncio
 import json
 import os
 import re
+from functools import partial
 
 from loguru import logger
 from shared.metrics import push_drop_event, push_exception_event, set_value
 
 from collectors.db.valkey_config import get_valkey_client
-from collectors.logging_setup import open_task_log_file
+from collectors.logging_setup import open_raw_feed_log
 from collectors.settings import settings
-from collectors.utils import build_spot_key
-
-DX_CC_RE = re.compile(r"^DX de (\S+):\s*(\d+\.\d+)\s+(\S+)\s+(.*?)\s+?(\w+) (\d+Z)\s+(\w+)")
-DX_AR_RE = re.compile(r"^DX de (\S+):\s*(\d+\.\d+)\s+(\S+)\s+(.*?)\s+?(\d+Z)")
-
-
-def parse_cc_dx_cluster_line(line: str) -> dict | None:
-    match = DX_CC_RE.match(line.strip())
-    if match:
-        return {
-            "spotter_callsign": match.group(1),
-            "frequency": float(match.group(2)),
-            "dx_callsign": match.group(3),
-            "comment": match.group(4).strip(),
-            "dx_locator": match.group(5),
-            "time": match.group(6),
-            "spotter_locator": match.group(7),
-        }
-    return None
-
-
-def parse_ar_cluster_line(line: str) -> dict | None:
-    # DX de K5TR-#:    14056.0  VE2PID/W8    CW 17 dB 22 WPM CQ             2010Z
-    # DX de KB8OTK:    18100.9  OD5ZZ                                       2053Z
-    match = DX_AR_RE.match(line.strip())
-    if match:
-        return {
-            "spotter_callsign": match.group(1),
-            "frequency": float(match.group(2)),
-            "dx_callsign": match.group(3),
-            "comment": match.group(4).strip(),
-            "time": match.group(5),
-            "dx_locator": "",
-            "spotter_locator": "",
-        }
-    return None
-
-
-def parse_dx_line(line: str):
-    spot = parse_cc_dx_cluster_line(line)
-    if spot is None:
-        spot = parse_ar_cluster_line(line)
-
-    if spot is None:
-        return None
+from collectors.utils import SpotArrival, build_spot_key, dedup_spots
+
+DX_LINE_PREFIX = b"DX de"
+# Both cluster formats in one pass, the CC Cluster branch is tried first:
+# DX de 4X5BR-#:   14025.0  K1ABC        CW 12 dB 25 WPM CQ      KM72 1200Z FN42
+# DX de K5TR-#:    14056.0  VE2PID/W8    CW 17 dB 22 WPM CQ             2010Z
+DX_LINE_RE = re.compile(
+    rb"DX de (?P<spotter>\S+):\s*(?P<frequency>\d+\.\d+)\s+(?P<dx>\S+)\s"
+    rb"(?:(?P<cc_comment>.*?)\s+?(?P<dx_locator>\w+) (?P<cc_time>\d+Z)\s+(?P<spotter_locator>\w+)"
+    rb"|(?P<ar_comment>.*?)\s+?(?P<ar_time>\d+Z))"
+)
+SPOTTER_SSID_RE = re.compile(rb"-\d+$")
+
+
+def _decode(value: bytes) -> str:
+    return value.decode("utf-8", errors="ignore")
 
-    spot["spotter_callsign"] = re.sub(r"-\d+$", "", spot["spotter_callsign"])
 
+def parse_dx_line(line: bytes | str) -> dict | None:
+    if isinstance(line, str):
+        line = line.encode("utf-8")
+    match = DX_LINE_RE.match(line.strip())
+    if match is None:
+        return None
+
+    spotter, frequency, dx, cc_comment, dx_locator, cc_time, spotter_locator, ar_comment, ar_time = match.groups()
+    if b"-" in spotter:
+        spotter = SPOTTER_SSID_RE.sub(b"", spotter)
+    spot = {
+        "spotter_callsign": _decode(spotter),
+        "frequency": float(frequency),
+        "dx_callsign": _decode(dx),
+    }
+    if cc_time is not None:
+        spot.update(
+            comment=_decode(cc_comment.strip()),
+            dx_locator=_decode(dx_locator),
+            time=_decode(cc_time),
+            spotter_locator=_decode(spotter_locator),
+        )
+    else:
+        spot.update(comment=_decode(ar_comment.strip()), time=_decode(ar_time), dx_locator="", spotter_locator="")
     return spot
 
 
@@ -77,115 +72,117 @@ async def telnet_and_collect(
     MAX_BACKOFF = 86400  # 1 day
 
     log_filename_prefix = os.path.join(telnet_log_dir, host)
-    task_logger = open_task_log_file(log_filename_prefix=log_filename_prefix)
+    feed_log = open_raw_feed_log(log_filename_prefix, host, compress=settings.telnet_log_compress)
+    feed_log.start()
 
-    task_logger.info(f"Start of telnet_and_collect for {host}")
+    feed_log.info(f"Start of telnet_and_collect for {host}")
     valkey_client = get_valkey_client()
 
-    while True:
-        reader, writer = None, None
-        line_buffer = b""
-        try:
-            logger.debug(f"Attempting to connect to {host}:{port} ...")
-            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout=10)
-
-            logger.info(f"{host}:{port}  Successfully connected")
-            reconnect_attempts = 0
-            await set_value(valkey_client, f"collector:telnet:{host}:connected", 1)
-
-            if username:
-                await asyncio.sleep(2)
-                writer.write(f"{username}\n".encode("utf-8"))
-                await writer.drain()
-
-            while True:
-                try:
-                    data = await asyncio.wait_for(reader.read(4096), timeout=60)
-                except asyncio.TimeoutError:
-                    # This is just universal command that is used as kind of "ping"
-                    writer.write(b"help\n")
-                    data = await asyncio.wait_for(reader.read(4096), timeout=5)
-
-                if not data:
-                    task_logger.error("Connection closed by remote host.")
-                    await set_value(valkey_client, f"collector:telnet:{host}:connected", 0)
-                    break
-
-                lines = (line_buffer + data).split(b"\n")
-                line_buffer = lines.pop()
-
-                for line_bytes in lines:
-                    line = line_bytes.decode("utf-8", errors="ignore").replace("\r", "")
-                    task_logger.info(line)
-
-                    if not line.startswith("DX de"):
-                        continue
-
-                    spot = parse_dx_line(line)
-                    if spot is None:
-                        task_logger.error(f"Could not parse spot line: {line}")
-                        logger.error(f"Could not parse spot line: {line}")
-                        await push_drop_event(valkey_client, "parse_error", line)
-                        continue
-
-                    # W3LPL is a spammer and J9AQ is a pirate
-                    if spot["spotter_callsign"].upper() in ["W3LPL", "J9AQ"]:
-                        logger.debug(f"Skipping banned spot: {spot}")
-                        continue
+    try:
+        while True:
+            reader, writer = None, None
+            line_buffer = b""
+            try:
+                logger.debug(f"Attempting to connect to {host}:{port} ...")
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout=10)
 
-                    cluster = f"{host}:{port}"
-                    spot["cluster"] = cluster
-                    spot_data = json.dumps(spot)
-                    task_logger.debug(json.dumps(spot, indent=2))
-                    logger.debug(json.dumps(spot, indent=2))
+                logger.info(f"{host}:{port}  Successfully connected")
+                reconnect_attempts = 0
+                await set_value(valkey_client, f"collector:telnet:{host}:connected", 1)
 
-                    spot_key = build_spot_key(spot)
-                    added = await valkey_client.set(spot_key, 1, ex=settings.valkey_spot_expiration, nx=True)
+                if username:
+                    await asyncio.sleep(2)
+                    writer.write(f"{username}\n".encode("utf-8"))
+                    await writer.drain()
+
+                while True:
                     try:
-                        await valkey_client.xadd(
-                            "stream-arrivals",
-                            {"cluster": cluster, "spot_key": spot_key, "accepted": "1" if added else "0"},
-                        )
-                    except Exception:
-                        logger.warning("Failed to write to stream-arrivals", exc_info=True)
-                    if added:
-                        await output_queue.put(spot)
-                        task_logger.debug(f"Spot added to queue: {spot_data}")
-                        logger.debug(f"Spot added to queue: {host}:{port}  {spot_data}")
-                    else:
-                        task_logger.debug(f"Duplicate spot not queued: {spot_data}")
-                        logger.debug(f"Duplicate spot not queued: {host}:{port}  {spot_data}")
-
-        except (asyncio.TimeoutError, ConnectionRefusedError, OSError) as e:
-            task_logger.exception(f"Connection failed: {host}:{port}  {e}")
-            logger.exception(f"Connection failed: {host}:{port}  {e}")
-            await set_value(valkey_client, f"collector:telnet:{host}:connected", 0)
-            await push_exception_event(valkey_client, "collector", f"telnet {host}:{port}: {e}")
-
-        except asyncio.CancelledError:
-            logger.info(f"{host}:{port} Task cancelled, shutting down.")
-            break
-
-        finally:
-            if writer:
-                writer.close()
-                try:
-                    await asyncio.wait_for(writer.wait_closed(), timeout=5.0)
-                except asyncio.TimeoutError:
-                    logger.warning(f"{host}:{port} Timeout waiting for writer to close")
-
-        delay = min(INITIAL_BACKOFF * (2**reconnect_attempts), MAX_BACKOFF)
-
-        task_logger.info(
-            f"{host}:{port} Reconnection attempt {reconnect_attempts + 1}. Waiting for {delay // 60} minutes before retrying."
-        )
-        logger.info(
-            f"{host}:{port} Reconnection attempt {reconnect_attempts + 1}. Waiting for {delay // 60} minutes before retrying."
-        )
+                        data = await asyncio.wait_for(reader.read(4096), timeout=60)
+                    except asyncio.TimeoutError:
+                        # This is just universal command that is used as kind of "ping"
+                        writer.write(b"help\n")
+                        data = await asyncio.wait_for(reader.read(4096), timeout=5)
+
+                    if not data:
+                        feed_log.error("Connection closed by remote host.")
+                        await set_value(valkey_client, f"collector:telnet:{host}:connected", 0)
+                        break
 
-        try:
-            await asyncio.sleep(delay)
-            reconnect_attempts += 1
-        except asyncio.CancelledError:
-            logger.info(f"{host}:{port} Task cancelled during backoff.")
-            break
+                    lines = (line_buffer + data).split(b"\n")
+                    line_buffer = lines.pop()
+
+                    cluster = f"{host}:{port}"
+                    spots = []
+                    for line_bytes in lines:
+                        line_bytes = line_bytes.replace(b"\r", b"")
+                        feed_log.write_line(line_bytes)
+
+                        if not line_bytes.startswith(DX_LINE_PREFIX):
+                            continue
+
+                        spot = parse_dx_line(line_bytes)
+                        if spot is None:
+                            line = _decode(line_bytes)
+                            feed_log.error(f"Could not parse spot line: {line}")
+                            logger.error(f"Could not parse spot line: {line}")
+                            await push_drop_event(valkey_client, "parse_error", line)
+                            continue
+
+                        # W3LPL is a spammer and J9AQ is a pirate
+                        if spot["spotter_callsign"].upper() in ["W3LPL", "J9AQ"]:
+                            logger.debug(f"Skipping banned spot: {spot}")
+                            continue
+
+                        spot["cluster"] = cluster
+                        logger.opt(lazy=True).debug("{}", lambda spot=spot: json.dumps(spot, indent=2))
+                        spots.append(spot)
+
+                    # One round trip deduplicates and records every spot of the chunk.
+                    arrivals = [SpotArrival(build_spot_key(spot), settings.valkey_spot_expiration) for spot in spots]
+                    added = await dedup_spots(valkey_client, cluster, arrivals)
+                    for spot, spot_added in zip(spots, added):
+                        # The spot is only serialized for records that are actually written.
+                        spot_data = partial(json.dumps, spot)
+                        if spot_added:
+                            await output_queue.put(spot)
+                            feed_log.debug(lambda: f"Spot added to queue: {spot_data()}")
+                            logger.opt(lazy=True).debug(f"Spot added to queue: {host}:{port}  {{}}", spot_data)
+                        else:
+                            feed_log.debug(lambda: f"Duplicate spot not queued: {spot_data()}")
+                            logger.opt(lazy=True).debug(f"Duplicate spot not queued: {host}:{port}  {{}}", spot_data)
+
+            except (asyncio.TimeoutError, ConnectionRefusedError, OSError) as e:
+                feed_log.exception(f"Connection failed: {host}:{port}  {e}")
+                logger.exception(f"Connection failed: {host}:{port}  {e}")
+                await set_value(valkey_client, f"collector:telnet:{host}:connected", 0)
+                await push_exception_event(valkey_client, "collector", f"telnet {host}:{port}: {e}")
+
+            except asyncio.CancelledError:
+                logger.info(f"{host}:{port} Task cancelled, shutting down.")
+                break
+
+            finally:
+                if writer:
+                    writer.close()
+                    try:
+                        await asyncio.wait_for(writer.wait_closed(), timeout=5.0)
+                    except asyncio.TimeoutError:
+                        logger.warning(f"{host}:{port} Timeout waiting for writer to close")
+
+            delay = min(INITIAL_BACKOFF * (2**reconnect_attempts), MAX_BACKOFF)
+
+            feed_log.info(
+                f"{host}:{port} Reconnection attempt {reconnect_attempts + 1}. Waiting for {delay // 60} minutes before retrying."
+            )
+            logger.info(
+                f"{host}:{port} Reconnection attempt {reconnect_attempts + 1}. Waiting for {delay // 60} minutes before retrying."
+            )
+
+            try:
+                await asyncio.sleep(delay)
+                reconnect_attempts += 1
+            except asyncio.CancelledError:
+                logger.info(f"{host}:{port} Task cancelled during backoff.")
+                break
+    finally:
+        await feed_log.close()
@@ -1,15 +1,44 @@
 import asyncio
+import hashlib
 import json
+import time
 from collections.abc import Callable
+from dataclasses import dataclass
 from typing import Any
 
 import aiohttp
 from loguru import logger
+from redis.exceptions import NoScriptError
+from shared.geo_cache import MISSING, TTLCache
 from shared.metrics import push_drop_event, push_exception_event, set_value
 
 STREAM_ARRIVALS = "stream-arrivals"
 USER_AGENT = "HolyCluster collector (https://holycluster.iarc.org/)"
 
+# Deduplicates a spot and records its arrival in one call.
+# KEYS: arrivals stream, spot key and an optional source key that must be new before the spot key is tried.
+# ARGV: cluster, spot key expiration and the source key expiration.
+DEDUP_AND_RECORD_SCRIPT = """
+local accepted = 0
+if KEYS[3] == nil or redis.call("SET", KEYS[3], 1, "EX", ARGV[3], "NX") then
+    if redis.call("SET", KEYS[2], 1, "EX", ARGV[2], "NX") then
+        accepted = 1
+    end
+end
+redis.call("XADD", KEYS[1], "*", "cluster", ARGV[1], "spot_key", KEYS[2], "accepted", tostring(accepted))
+return accepted
+"""
+# Valkey caches scripts by the SHA1 of their text, the script is only sent after a NOSCRIPT reply.
+DEDUP_AND_RECORD_SHA = hashlib.sha1(DEDUP_AND_RECORD_SCRIPT.encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class SpotArrival:
+    spot_key: str
+    expiration: int
+    source_key: str | None = None
+    source_expiration: int | None = None
+
 
 def as_text(value: Any) -> str:
     if value is None:
@@ -31,14 +60,176 @@ async def fetch_json_list(session: aiohttp.ClientSession, url: str, source_label
     return data
 
 
-async def record_arrival(valkey_client, cluster: str, source_label: str, spot_key: str, added: bool):
-    try:
-        await valkey_client.xadd(
-            STREAM_ARRIVALS,
-            {"cluster": cluster, "spot_key": spot_key, "accepted": "1" if added else "0"},
+def _queue_dedup_and_record(pipeline, cluster: str, arrivals: list[SpotArrival]):
+    for arrival in arrivals:
+        keys = [STREAM_ARRIVALS, arrival.spot_key]
+        args = [cluster, arrival.expiration]
+        if arrival.source_key is not None:
+            keys.append(arrival.source_key)
+            args.append(arrival.source_expiration)
+        pipeline.evalsha(DEDUP_AND_RECORD_SHA, len(keys), *keys, *args)
+
+
+async def dedup_and_record_spots(
+    valkey_client, cluster: str, arrivals: list[SpotArrival], rejected: list[tuple[str, str]] = ()
+) -> list[bool]:
+    """
+    Deduplicate spots and record them in stream-arrivals in one pipelined round trip, True for new spots.
+
+    rejected holds (cluster, spot_key) arrivals already known to be duplicates, they are only recorded.
+    """
+    if not arrivals and not rejected:
+        return []
+
+    async with valkey_client.pipeline(transaction=False) as pipeline:
+        _queue_dedup_and_record(pipeline, cluster, arrivals)
+        for rejected_cluster, spot_key in rejected:
+            pipeline.xadd(STREAM_ARRIVALS, {"cluster": rejected_cluster, "spot_key": spot_key, "accepted": "0"})
+        results = await pipeline.execute(raise_on_error=False)
+
+    missing = [index for index, result in enumerate(results[: len(arrivals)]) if isinstance(result, NoScriptError)]
+    if missing:
+        # Only the calls that got NOSCRIPT are sent again, the others already ran.
+        await valkey_client.script_load(DEDUP_AND_RECORD_SCRIPT)
+        async with valkey_client.pipeline(transaction=False) as pipeline:
+            _queue_dedup_and_record(pipeline, cluster, [arrivals[index] for index in missing])
+            for index, result in zip(missing, await pipeline.execute()):
+                results[index] = result
+
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return [bool(result) for result in results[: len(arrivals)]]
+
+
+class SpotDeduplicator:
+    """
+    Local pre-filter in front of the Valkey spot dedup.
+
+    The same spot arrives from many clusters within seconds. Spot keys accepted by Valkey are
+    remembered for the spot expiration, so later copies are rejected without a round trip and
+    their arrivals are recorded with the next round trip or flush. Arrivals with a source key
+    always go to Valkey, the source key has its own expiration.
+    """
+
+    def __init__(self, valkey_client, max_size: int, ttl: float, max_pending: int = 1000):
+        self.valkey_client = valkey_client
+        self.max_pending = max_pending
+        self._accepted = TTLCache(max_size, ttl)
+        self._pending: list[tuple[str, str]] = []
+
+    @property
+    def pending_arrivals(self) -> int:
+        return len(self._pending)
+
+    async def dedup(self, cluster: str, arrivals: list[SpotArrival]) -> list[bool]:
+        added = [False] * len(arrivals)
+        remote_indexes = []
+        for index, arrival in enumerate(arrivals):
+            if arrival.source_key is None and self._accepted.get(arrival.spot_key) is not MISSING:
+                self._pending.append((cluster, arrival.spot_key))
+            else:
+                remote_indexes.append(index)
+
+        if not remote_indexes:
+            if len(self._pending) >= self.max_pending:
+                await self.flush()
+            return added
+
+        pending, self._pending = self._pending, []
+        try:
+            results = await dedup_and_record_spots(
+                self.valkey_client, cluster, [arrivals[index] for index in remote_indexes], pending
+            )
+        except Exception:
+            self._pending[:0] = pending
+            raise
+
+        for index, result in zip(remote_indexes, results):
+            added[index] = result
+            if result:
+                self._accepted.set(arrivals[index].spot_key, True)
+        return added
+
+    async def flush(self):
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, []
+        try:
+            await dedup_and_record_spots(self.valkey_client, "", [], pending)
+        except Exception:
+            logger.warning(f"Failed to write {len(pending)} duplicate arrivals to stream-arrivals", exc_info=True)
+            self._pending[:0] = pending
+
+    async def run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+
+_spot_deduplicator: SpotDeduplicator | None = None
+
+
+def configure_spot_deduplicator(valkey_client, max_size: int, ttl: float) -> SpotDeduplicator:
+    global _spot_deduplicator
+    _spot_deduplicator = SpotDeduplicator(valkey_client, max_size, ttl)
+    return _spot_deduplicator
+
+
+async def dedup_spots(valkey_client, cluster: str, arrivals: list[SpotArrival]) -> list[bool]:
+    """Deduplicate spots through the local pre-filter when it is configured."""
+    if _spot_deduplicator is None:
+        return await dedup_and_record_spots(valkey_client, cluster, arrivals)
+    return await _spot_deduplicator.dedup(cluster, arrivals)
+
+
+# Slack for comparing float frequencies against the tolerance.
+FREQUENCY_EPSILON = 1e-6
+
+
+class NearDuplicateIndex:
+    """
+    Recent spots by (dx_callsign, spotter_callsign), for copies that build_spot_key misses.
+
+    Clusters relay the same spot with a different minute or a frequency rounded differently.
+    A spot is a near duplicate when the same pair was accepted within the window on a frequency
+    within the tolerance. The window starts at the accepted spot, so a later re-spot is kept.
+    """
+
+    def __init__(self, window: float, frequency_tolerance: float, clock=time.monotonic):
+        self.window = window
+        self.frequency_tolerance = frequency_tolerance
+        self.clock = clock
+        self._recent: dict[tuple[str, str], list[tuple[float, float]]] = {}
+        self._next_prune = clock() + window
+
+    def __len__(self):
+        return len(self._recent)
+
+    def is_duplicate(self, spot: dict) -> bool:
+        """Check a spot against the index and remember it when it is not a near duplicate."""
+        now = self.clock()
+        cutoff = now - self.window
+        key = (spot["dx_callsign"].upper(), spot["spotter_callsign"].upper())
+        frequency = float(spot["frequency"])
+        recent = [entry for entry in self._recent.get(key, ()) if entry[0] > cutoff]
+
+        duplicate = any(
+            abs(recent_frequency - frequency) <= self.frequency_tolerance + FREQUENCY_EPSILON
+            for _, recent_frequency in recent
         )
-    except Exception:
-        logger.warning(f"Failed to write {source_label} arrival to stream-arrivals", exc_info=True)
+        if not duplicate:
+            recent.append((now, frequency))
+        self._recent[key] = recent
+
+        if now >= self._next_prune:
+            self._prune(cutoff)
+            self._next_prune = now + self.window
+        return duplicate
+
+    def _prune(self, cutoff: float):
+        self._recent = {key: recent for key, recent in self._recent.items() if recent and recent[-1][0] > cutoff}
 
 
 async def run_json_spot_collector(
@@ -70,7 +261,8 @@ async def run_json_spot_collector(
                 raw_spots = await fetch_json_list(session, url, source_label)
                 await set_value(valkey_client, connected_key, 1)
 
-                queued_count = 0
+                spots = []
+                arrivals = []
                 for raw_spot in sorted(raw_spots, key=sort_key):
                     try:
                         source_spot_key = get_spot_key(raw_spot)
@@ -85,16 +277,20 @@ async def run_json_spot_collector(
                         )
                         continue
 
-                    source_added = await valkey_client.set(source_spot_key, 1, ex=spot_expiration, nx=True)
-                    if not source_added:
-                        await record_arrival(valkey_client, cluster, source_label, content_spot_key, False)
-                        continue
-
-                    content_added = await valkey_client.set(
-                        content_spot_key, 1, ex=settings.valkey_spot_expiration, nx=True
+                    spots.append(spot)
+                    arrivals.append(
+                        SpotArrival(
+                            content_spot_key,
+                            settings.valkey_spot_expiration,
+                            source_key=source_spot_key,
+                            source_expiration=spot_expiration,
+                        )
                     )
-                    await record_arrival(valkey_client, cluster, source_label, content_spot_key, bool(content_added))
-                    if content_added:
+
+                queued_count = 0
+                added = await dedup_spots(valkey_client, cluster, arrivals)
+                for spot, spot_added in zip(spots, added):
+                    if spot_added:
                         await output_queue.put(spot)
                         queued_count += 1
 
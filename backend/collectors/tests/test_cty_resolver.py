@@ -0,0 +1,183 @@
+import asyncio
+import csv
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+from shared import cty, geo
+from shared.cty import CtyCountry, CtyResolver, ParsedCallsign, build_cty_resolver, parse_callsign
+
+SPAIN = CtyCountry("Spain", "EU", 281, 40.4, -3.7, 14, 37)
+BALEARIC = CtyCountry("Balearic Islands", "EU", 21, 39.6, 2.9, 14, 37)
+CEUTA = CtyCountry("Ceuta and Melilla", "AF", 32, 35.9, -5.3, 33, 37)
+CANARY = CtyCountry("Canary Islands", "AF", 29, 28.3, -15.8, 33, 36)
+
+CTY_ROWS = [
+    ["EA", "Spain", "281", "EU", "14", "37", "40.40", "3.70", "1.0", "EA EB =EA9ZZ;"],
+    ["EA6", "Balearic Islands", "21", "EU", "14", "37", "39.60", "-2.90", "1.0", "EA6 EB6;"],
+    ["EA9", "Ceuta and Melilla", "32", "AF", "33", "37", "35.90", "5.30", "1.0", "EA9;"],
+    ["EA8", "Canary Islands", "29", "AF", "33", "36", "28.30", "15.80", "1.0", "EA8 EC8;"],
+]
+
+
+def test_longest_prefix_wins():
+    resolver = build_cty_resolver(CTY_ROWS)
+
+    assert resolver.resolve_entity("EA6AB") == BALEARIC
+    assert resolver.resolve_entity("eb6ab ") == BALEARIC
+    assert resolver.resolve_entity("EA1AB") == SPAIN
+    assert resolver.resolve_entity("EA9ZZ") == SPAIN
+    assert resolver.resolve_entity("K1ABC") is None
+    assert resolver.resolve_entity("") is None
+
+
+def test_override_prefix_shadows_longer_prefixes_and_exact_calls():
+    resolver = build_cty_resolver(CTY_ROWS).with_overrides({"EA6XX": None}, {"EA": SPAIN, "EB6": None})
+
+    assert resolver.resolve_entity("EA6AB") == SPAIN
+    assert resolver.resolve_entity("EA9ZZ") == SPAIN
+    assert resolver.resolve_entity("EB6AB") is None
+    assert resolver.resolve_entity("EB1AB") == SPAIN
+    assert resolver.resolve_entity("EA6XX") is None
+
+
+def test_geo_overrides_are_compiled_once_per_cty_resolver():
+    resolver = build_cty_resolver(CTY_ROWS)
+
+    with patch.object(cty, "_CTY_STATE", (cty.CTY_CACHE_PATH, 0.0, resolver, None)):
+        override_resolver = geo._get_override_resolver()
+        ceuta = geo._resolve_cty_entity("EA9AB")
+
+        assert geo._get_override_resolver() is override_resolver
+        assert cty._CTY_STATE[2:] == (resolver, override_resolver)
+    assert ceuta == CEUTA
+    assert resolver.get_any_entity_by_dxcc_code(32) == CEUTA
+
+
+def test_parse_callsign_splits_portable_forms():
+    assert parse_callsign("EA1AB") == ParsedCallsign("EA1AB")
+    assert parse_callsign("EA1AB/P") == ParsedCallsign("EA1AB", suffix="P")
+    assert parse_callsign("EA1AB/4") == ParsedCallsign("EA1AB", suffix="4")
+    assert parse_callsign("EA8/EA1AB") == ParsedCallsign("EA1AB", prefix="EA8")
+    assert parse_callsign("EA1AB/EA8") == ParsedCallsign("EA1AB", prefix="EA8")
+    assert parse_callsign("EC/EA1AB/M") == ParsedCallsign("EA1AB", prefix="EC", suffix="M")
+
+
+def test_portable_calls_resolve_by_location():
+    resolver = build_cty_resolver(CTY_ROWS)
+
+    assert resolver.resolve_callsign("EA6AB/P") == BALEARIC
+    assert resolver.resolve_callsign("EA1AB/EA8") == CANARY
+    assert resolver.resolve_callsign("EA8/EA1AB/QRP") == CANARY
+    assert resolver.resolve_callsign("EC/EA6AB") == CANARY
+    assert resolver.resolve_callsign("XX/EA6AB") == BALEARIC
+    assert resolver.resolve_callsign("E/EA6AB") == BALEARIC
+
+
+def test_resolve_callsign_is_memoized_per_resolver():
+    resolver = build_cty_resolver(CTY_ROWS)
+    resolver.resolve_callsign("EA1AB/EA8")
+
+    with patch.object(CtyResolver, "_resolve_portable_callsign") as resolve:
+        assert resolver.resolve_callsign("ea1ab/ea8") == CANARY
+    resolve.assert_not_called()
+    assert build_cty_resolver(CTY_ROWS)._resolved_callsigns == {}
+
+
+def write_cty_file(tmp_path: Path, etag: str) -> Path:
+    path = tmp_path / "cty.csv"
+    with path.open("w", newline="") as file:
+        csv.writer(file).writerows(CTY_ROWS)
+    (tmp_path / "cty_metadata.json").write_text(json.dumps({"etag": etag}))
+    return path
+
+
+def test_snapshot_is_loaded_until_the_etag_changes(tmp_path):
+    path = write_cty_file(tmp_path, '"v1"')
+    parsed = cty.load_cty_resolver(path)
+
+    with patch.object(cty, "build_cty_resolver", side_effect=AssertionError("parsed the CSV")):
+        from_snapshot = cty.load_cty_resolver(path)
+    (tmp_path / "cty_metadata.json").write_text(json.dumps({"etag": '"v2"'}))
+    with patch.object(cty, "build_cty_resolver", wraps=build_cty_resolver) as build:
+        cty.load_cty_resolver(path)
+
+    assert path.with_suffix(".snapshot").exists()
+    assert from_snapshot == parsed
+    assert from_snapshot.resolve_callsign("EA1AB/EA8") == CANARY
+    build.assert_called_once()
+
+
+def test_files_are_replaced_through_temporary_files_of_their_own(tmp_path):
+    path = tmp_path / "cty.csv"
+    names = []
+
+    def fake_replace(source, destination):
+        names.append(Path(source).name)
+        raise OSError("rename failed")
+
+    with patch.object(cty.os, "replace", side_effect=fake_replace):
+        for _ in range(2):
+            with pytest.raises(OSError):
+                cty._replace_file(path, b"data")
+
+    assert len(set(names)) == 2
+    assert all(name.startswith("cty.csv.") for name in names)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_get_cty_resolver_does_not_stat_after_loading(tmp_path, monkeypatch):
+    monkeypatch.setattr(cty, "_CTY_STATE", None)
+    path = write_cty_file(tmp_path, '"v1"')
+    resolver = cty.get_cty_resolver(path)
+    path.unlink()
+
+    assert cty.get_cty_resolver(path) is resolver
+    assert cty.reload_cty_resolver(path) is resolver
+
+    write_cty_file(tmp_path, '"v2"')
+    reloaded = cty.reload_cty_resolver(path)
+
+    assert reloaded is not resolver
+    assert cty.get_cty_resolver(path) is reloaded
+
+
+class FakeValkey:
+    def __init__(self):
+        self.values = {}
+
+    async def mset(self, mapping):
+        self.values.update(mapping)
+
+
+def test_refresh_loop_swaps_in_a_prepared_resolver(tmp_path, monkeypatch):
+    monkeypatch.setattr(cty, "_CTY_STATE", None)
+    path = write_cty_file(tmp_path, '"v1"')
+    resolver = cty.get_cty_resolver(path)
+    prepared = []
+    sleeps = []
+
+    async def fake_refresh_cty_cache(http_client=None):
+        write_cty_file(tmp_path, '"v2"')
+        return cty.CtyCacheResult(path=path, available=True, downloaded=True, message="downloaded")
+
+    async def fake_sleep(interval):
+        if sleeps:
+            raise asyncio.CancelledError
+        sleeps.append(interval)
+
+    valkey_client = FakeValkey()
+    monkeypatch.setattr(cty, "refresh_cty_cache", fake_refresh_cty_cache)
+    monkeypatch.setattr(cty.asyncio, "sleep", fake_sleep)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(cty.run_cty_refresh_loop(valkey_client, "collector", prepare=prepared.append))
+
+    reloaded = cty.get_cty_resolver(path)
+    assert reloaded is not resolver
+    assert prepared == [reloaded]
+    assert "monitor:collector:cty_swap_ms" in valkey_client.values
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+from shared import cty, geo
+from shared.cty import CtyCountry, CtyResolver
+from shared.geo_cache import MISSING, TTLCache
+
+ISRAEL = CtyCountry("Israel", "AS", 336, 31.5, 34.8, 20, 39)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeValkey:
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.gets = []
+
+    async def get(self, key):
+        self.gets.append(key)
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None, nx=False, get=False):
+        previous = self.values.get(key)
+        if not nx or previous is None:
+            self.values[key] = value
+        return previous if get else True
+
+
+@pytest.fixture
+def cty_resolver():
+    resolver = CtyResolver(exact_callsigns={}, prefixes={"4X": ISRAEL}, entities_by_dxcc_code={336: ISRAEL})
+    geo.configure_local_geo_cache(max_size=10, ttl=300, negative_ttl=300)
+    geo.geo_cache_stats.reset()
+    with patch.object(cty, "_CTY_STATE", (cty.CTY_CACHE_PATH, 0.0, resolver, None)):
+        yield resolver
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is MISSING
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries():
+    clock = FakeClock()
+    cache = TTLCache(max_size=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+    clock.now = 10
+
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+def test_local_tier_answers_repeated_lookups(cty_resolver):
+    valkey_client = FakeValkey({"geo:4X5BR": "1|q|KM72|32.1|34.8||20|39"})
+
+    async def run():
+        first = await geo.get_geo_details(valkey_client, "", "4X5BR", 3600, None, "spotter")
+        second = await geo.get_geo_details(valkey_client, "", "4X5BR", 3600, None, "spotter")
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first is second
+    assert first.dxcc_code == 336
+    assert first.cq_zone == 20
+    assert valkey_client.gets == ["geo:4X5BR"]
+    assert geo.geo_cache_stats.valkey_hits == 1
+    assert geo.geo_cache_stats.local_hits == 1
+
+
+def test_compact_encoding_round_trips(cty_resolver):
+    geo_data = geo.GeoData(
+        cached=True,
+        locator_source="cty",
+        locator="KM72",
+        lat=32.0625,
+        lon=34.875,
+        dxcc_code=336,
+        country="Israel",
+        continent="AS",
+        state="",
+        cq_zone=20,
+        itu_zone=None,
+    )
+
+    encoded = geo.encode_geo_cache_value(geo_data)
+
+    assert encoded == "1|c|KM72|32.0625|34.875||20|"
+    assert geo.decode_geo_cache_value("4X5BR", "spotter", encoded) == geo_data
+
+
+def test_legacy_keys_are_migrated_on_read(cty_resolver):
+    legacy_value = json.dumps({"locator_source": "qrz", "locator": "KM72", "lat": 32.1, "lon": 34.8, "state": ""})
+    valkey_client = FakeValkey({"4X5BR": legacy_value})
+
+    geo_data = asyncio.run(geo.get_geo_details(valkey_client, "", "4X5BR", 3600, None, "spotter"))
+
+    assert geo_data.cached
+    assert valkey_client.gets == ["geo:4X5BR", "4X5BR"]
+    assert valkey_client.values["geo:4X5BR"] == "1|q|KM72|32.1|34.8|||"
+
+
+def test_legacy_keys_are_not_read_after_they_expired(cty_resolver):
+    valkey_client = FakeValkey({geo.LEGACY_GEO_KEYS_UNTIL_KEY: str(geo.time.time() - 1)})
+
+    async def fake_get_locator_from_qrz(qrz_session_key, callsign, http_client):
+        return {"locator": "KM72"}
+
+    with (
+        patch.object(geo, "_legacy_geo_keys_until", None),
+        patch.object(geo, "get_locator_from_qrz", new=fake_get_locator_from_qrz),
+    ):
+        asyncio.run(geo.get_geo_details(valkey_client, "", "4X5BR", 3600, None, "spotter"))
+
+    assert valkey_client.gets == ["geo:4X5BR"]
+
+
+def test_legacy_key_window_is_stored_once_in_valkey(cty_resolver):
+    valkey_client = FakeValkey()
+
+    with patch.object(geo, "_legacy_geo_keys_until", None):
+        assert asyncio.run(geo._reading_legacy_geo_keys(valkey_client, 3600))
+        until = valkey_client.values[geo.LEGACY_GEO_KEYS_UNTIL_KEY]
+    with patch.object(geo, "_legacy_geo_keys_until", None):
+        assert asyncio.run(geo._reading_legacy_geo_keys(valkey_client, 7200))
+
+    assert valkey_client.values[geo.LEGACY_GEO_KEYS_UNTIL_KEY] == until
+
+
+def test_legacy_key_of_another_type_is_a_miss(cty_resolver):
+    class WrongTypeValkey(FakeValkey):
+        async def get(self, key):
+            if key == "4X5BR":
+                raise geo.ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value")
+            return await super().get(key)
+
+    async def fake_get_locator_from_qrz(qrz_session_key, callsign, http_client):
+        return {"locator": "KM72"}
+
+    with (
+        patch.object(geo, "_legacy_geo_keys_until", None),
+        patch.object(geo, "get_locator_from_qrz", new=fake_get_locator_from_qrz),
+    ):
+        geo_data = asyncio.run(geo.get_geo_details(WrongTypeValkey(), "", "4X5BR", 3600, None, "spotter"))
+
+    assert geo_data.locator == "KM72"
+
+
+def test_failed_lookups_are_cached_negatively(cty_resolver):
+    valkey_client = FakeValkey()
+    qrz_calls = []
+
+    async def fake_get_locator_from_qrz(qrz_session_key, callsign, http_client):
+        qrz_calls.append(callsign)
+        return {}
+
+    async def run():
+        for callsign_type in ("spotter", "dx_callsign"):
+            with pytest.raises(geo.GeoException) as exc_info:
+                await geo.get_geo_details(valkey_client, "", "ZZ9ZZ", 3600, None, callsign_type)
+            assert exc_info.value.callsign_type == callsign_type
+
+    with patch.object(geo, "get_locator_from_qrz", new=fake_get_locator_from_qrz):
+        asyncio.run(run())
+
+    assert qrz_calls == ["ZZ9ZZ"]
+    assert geo.geo_cache_stats.local_negative_hits == 1
+
+
+def test_local_tier_is_cleared_when_cty_is_reloaded(cty_resolver):
+    valkey_client = FakeValkey()
+
+    async def fake_get_locator_from_qrz(qrz_session_key, callsign, http_client):
+        return {"locator": "KM72"}
+
+    async def run():
+        await geo.get_geo_details(valkey_client, "", "4X5BR", 3600, None, "spotter")
+        reloaded = CtyResolver(exact_callsigns={}, prefixes={"4X": ISRAEL}, entities_by_dxcc_code={336: ISRAEL})
+        with patch.object(cty, "_CTY_STATE", (cty.CTY_CACHE_PATH, 0.0, reloaded, None)):
+            return await geo.get_geo_details(valkey_client, "", "4X5BR", 3600, None, "spotter")
+
+    with patch.object(geo, "get_locator_from_qrz", new=fake_get_locator_from_qrz):
+        geo_data = asyncio.run(run())
+
+    assert geo_data.cached
+    assert geo.geo_cache_stats.local_hits == 0
+    assert geo.geo_cache_stats.valkey_hits == 1
+
+
+def test_concurrent_misses_share_one_qrz_lookup(cty_resolver):
+    valkey_client = FakeValkey()
+    qrz_calls = []
+
+    async def fake_get_locator_from_qrz(qrz_session_key, callsign, http_client):
+        qrz_calls.append(callsign)
+        await asyncio.sleep(0.01)
+        return {"locator": "KM72"}
+
+    async def run():
+        return await asyncio.gather(
+            *(geo.get_geo_details(valkey_client, "", "4X5BR", 3600, None, "dx_callsign") for _ in range(5))
+        )
+
+    with patch.object(geo, "get_locator_from_qrz", new=fake_get_locator_from_qrz):
+        results = asyncio.run(run())
+
+    assert qrz_calls == ["4X5BR"]
+    assert all(geo_data.locator == "KM72" for geo_data in results)
+    assert geo.geo_cache_stats.coalesced_lookups == 4
+    assert geo.geo_cache_stats.misses == 1
+
+
+def test_coalesced_failures_keep_the_callers_callsign_type(cty_resolver):
+    async def fake_get_locator_from_qrz(qrz_session_key, callsign, http_client):
+        await asyncio.sleep(0.01)
+        return {}
+
+    async def run():
+        return await asyncio.gather(
+            geo.get_geo_details(FakeValkey(), "", "ZZ9ZZ", 3600, None, "spotter"),
+            geo.get_geo_details(FakeValkey(), "", "ZZ9ZZ", 3600, None, "dx_callsign"),
+            return_exceptions=True,
+        )
+
+    with patch.object(geo, "get_locator_from_qrz", new=fake_get_locator_from_qrz):
+        errors = asyncio.run(run())
+
+    assert [error.callsign_type for error in errors] == ["spotter", "dx_callsign"]
@@ -0,0 +1,219 @@
+import asyncio
+import sys
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+from sqlalchemy.dialects import postgresql
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+from collectors.db import geo_cache_writer
+from collectors.db.geo_cache_writer import GeoCacheWriter, warm_geo_caches
+from shared import cty, geo
+from shared.cty import CtyCountry, CtyResolver
+from shared.db import GeoCache
+
+ISRAEL = CtyCountry("Israel", "AS", 336, 31.5, 34.8, 20, 39)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    executions = []
+    rows = []
+    fail = False
+
+    def __init__(self, engine):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def execute(self, statement, params=None):
+        if FakeSession.fail:
+            raise ConnectionError("database is down")
+        FakeSession.executions.append((statement, params))
+        return FakeResult(FakeSession.rows)
+
+    async def commit(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, valkey_client):
+        self.valkey_client = valkey_client
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key, value, ex=None, nx=False):
+        if not (nx and key in self.valkey_client.values):
+            self.valkey_client.values[key] = value
+
+    async def execute(self):
+        pass
+
+
+class FakeValkey:
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.lists = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None, nx=False, get=False):
+        previous = self.values.get(key)
+        if not nx or previous is None:
+            self.values[key] = value
+        return previous if get else True
+
+    async def mset(self, mapping):
+        self.values.update(mapping)
+
+    async def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    async def ltrim(self, key, start, end):
+        pass
+
+
+def create_geo_data(**extra):
+    return geo.GeoData(
+        cached=False,
+        locator_source="qrz",
+        locator="KM72",
+        lat=32.1,
+        lon=34.8,
+        dxcc_code=336,
+        country="Israel",
+        continent="AS",
+        state="",
+        **extra,
+    )
+
+
+def use_cty_resolver():
+    resolver = CtyResolver(exact_callsigns={}, prefixes={"4X": ISRAEL}, entities_by_dxcc_code={336: ISRAEL})
+    geo.configure_local_geo_cache(max_size=10, ttl=300, negative_ttl=300)
+    return patch.object(cty, "_CTY_STATE", (cty.CTY_CACHE_PATH, 0.0, resolver, None))
+
+
+def flush(writer):
+    FakeSession.executions = []
+    with patch.object(geo_cache_writer, "AsyncSession", FakeSession):
+        asyncio.run(writer.flush())
+    return FakeSession.executions
+
+
+def test_flush_upserts_lookups_and_updates_hit_counts():
+    writer = GeoCacheWriter(engine=None, valkey_client=FakeValkey(), max_rows=100)
+    writer.record_lookup("4X5BR", create_geo_data())
+    writer.record_hit("4X5BR")
+    writer.record_hit("K1ABC")
+    writer.record_hit("K1ABC")
+
+    (upsert, _), (hits_update, hit_params) = flush(writer)
+
+    sql = str(upsert.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (callsign) DO UPDATE" in sql
+    assert "geo_cache.hit_count + excluded.hit_count" in sql
+    assert upsert.compile(dialect=postgresql.dialect()).params["hit_count_m0"] == 2
+    assert hit_params == [{"b_callsign": "K1ABC", "b_hits": 2}]
+    assert writer.buffered_rows == 0
+    assert flush(writer) == []
+
+
+def test_failed_flush_keeps_the_buffer():
+    writer = GeoCacheWriter(engine=None, valkey_client=FakeValkey(), max_rows=100)
+    writer.record_lookup("4X5BR", create_geo_data())
+    writer.record_hit("K1ABC")
+
+    FakeSession.fail = True
+    try:
+        flush(writer)
+    finally:
+        FakeSession.fail = False
+    writer.record_hit("4X5BR")
+
+    (upsert, _), (_, hit_params) = flush(writer)
+
+    assert upsert.compile(dialect=postgresql.dialect()).params["hit_count_m0"] == 2
+    assert hit_params == [{"b_callsign": "K1ABC", "b_hits": 1}]
+
+
+def test_get_geo_details_reports_lookups_and_hits_to_the_durable_tier():
+    writer = GeoCacheWriter(engine=None, valkey_client=FakeValkey(), max_rows=100)
+    valkey_client = FakeValkey()
+
+    async def fake_get_locator_from_qrz(qrz_session_key, callsign, http_client):
+        return {"locator": "KM72"}
+
+    async def run():
+        for _ in range(3):
+            await geo.get_geo_details(valkey_client, "", "4X5BR", 3600, None, "spotter")
+
+    geo.configure_durable_geo_cache(writer)
+    try:
+        with use_cty_resolver(), patch.object(geo, "get_locator_from_qrz", new=fake_get_locator_from_qrz):
+            asyncio.run(run())
+    finally:
+        geo.configure_durable_geo_cache(None)
+
+    assert writer.buffered_rows == 1
+    assert writer._hits["4X5BR"] == 3
+
+
+def test_warmup_loads_valkey_and_the_local_cache():
+    FakeSession.rows = [
+        GeoCache(
+            callsign="4X5BR",
+            locator="KM72",
+            lat="32.1",
+            lon="34.8",
+            dxcc_code=336,
+            continent="AS",
+            locator_source="qrz",
+            state="",
+            hit_count=10,
+        ),
+        GeoCache(callsign="ZZ9ZZ", locator="AA00", lat="0", lon="0", dxcc_code=0, continent="", locator_source="qrz"),
+    ]
+    valkey_client = FakeValkey({"4X1AA": "existing"})
+
+    async def run():
+        warmed = await warm_geo_caches(None, valkey_client, 100, timedelta(hours=24), 3600)
+        geo_data = await geo.get_geo_details(None, "", "4X5BR", 3600, None, "spotter")
+        return warmed, geo_data
+
+    try:
+        with use_cty_resolver(), patch.object(geo_cache_writer, "AsyncSession", FakeSession):
+            geo.geo_cache_stats.reset()
+            warmed, geo_data = asyncio.run(run())
+    finally:
+        FakeSession.rows = []
+
+    assert warmed == 1
+    assert valkey_client.values["geo:4X5BR"] == "1|q|KM72|32.1|34.8|||"
+    assert "geo:ZZ9ZZ" not in valkey_client.values
+    assert geo_data.dxcc_code == 336
+    assert geo.geo_cache_stats.local_hits == 1
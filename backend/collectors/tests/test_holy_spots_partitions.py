@@ -0,0 +1,116 @@
+import asyncio
+import sys
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+from collectors.db.cleanup_postgres_tables import maintain_holy_spots_partitions
+from shared.partitions import (
+    create_holy_spots_partition_sql,
+    expired_holy_spots_partitions,
+    holy_spots_partition_days,
+    holy_spots_partition_name,
+    split_default_partition_sql,
+)
+from sqlalchemy.exc import ProgrammingError
+
+
+def test_create_holy_spots_partition_sql_covers_one_utc_day():
+    assert create_holy_spots_partition_sql(date(2026, 10, 17)) == (
+        "CREATE TABLE IF NOT EXISTS holy_spots2_p20261017 "
+        "PARTITION OF holy_spots2 FOR VALUES FROM (1792195200) TO (1792281600)"
+    )
+
+
+def test_holy_spots_partition_days_is_inclusive():
+    assert holy_spots_partition_days(date(2026, 12, 30), date(2027, 1, 1)) == [
+        date(2026, 12, 30),
+        date(2026, 12, 31),
+        date(2027, 1, 1),
+    ]
+
+
+def test_expired_holy_spots_partitions_keeps_cutoff_day_and_default_partition():
+    partitions = [
+        holy_spots_partition_name(date(2026, 10, 3)),
+        holy_spots_partition_name(date(2026, 10, 1)),
+        holy_spots_partition_name(date(2026, 10, 2)),
+        "holy_spots2_default",
+    ]
+
+    assert expired_holy_spots_partitions(partitions, date(2026, 10, 3)) == [
+        "holy_spots2_p20261001",
+        "holy_spots2_p20261002",
+    ]
+
+
+def test_split_default_partition_sql_moves_the_day_out_of_the_default_partition():
+    assert split_default_partition_sql(date(2026, 10, 17)) == [
+        "ALTER TABLE holy_spots2 DETACH PARTITION holy_spots2_default",
+        create_holy_spots_partition_sql(date(2026, 10, 17)),
+        "INSERT INTO holy_spots2 SELECT * FROM holy_spots2_default "
+        "WHERE timestamp >= 1792195200 AND timestamp < 1792281600",
+        "DELETE FROM holy_spots2_default WHERE timestamp >= 1792195200 AND timestamp < 1792281600",
+        "ALTER TABLE holy_spots2 ATTACH PARTITION holy_spots2_default DEFAULT",
+    ]
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeNestedTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class FakeSession:
+    def __init__(self, partitions, default_days, failing_day):
+        self.partitions = partitions
+        self.default_days = default_days
+        self.failing_day = failing_day
+        self.statements = []
+
+    def begin_nested(self):
+        return FakeNestedTransaction()
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        if sql.startswith("SELECT child.relname"):
+            return FakeResult(self.partitions)
+        if sql.startswith("SELECT 1 FROM holy_spots2_default"):
+            return FakeResult([1] if any(f">= {day}" in sql for day in self.default_days) else [])
+        if self.failing_day in sql:
+            raise ProgrammingError(sql, {}, Exception("partition would overlap"))
+        self.statements.append(sql)
+        return FakeResult([])
+
+
+def test_maintenance_moves_default_rows_and_still_drops_expired_partitions():
+    today = date(2026, 10, 17)
+    session = FakeSession(
+        partitions=[holy_spots_partition_name(date(2026, 9, 1)), holy_spots_partition_name(today)],
+        default_days=["1792281600"],
+        failing_day="holy_spots2_p20261020",
+    )
+
+    asyncio.run(maintain_holy_spots_partitions(session, today, date(2026, 9, 2)))
+
+    assert session.statements[:5] == split_default_partition_sql(date(2026, 10, 18))
+    created = [statement.split()[5] for statement in session.statements if statement.startswith("CREATE TABLE")]
+    assert created == [holy_spots_partition_name(date(2026, 10, day)) for day in (18, 19, 21, 22, 23, 24)]
+    assert session.statements[-1] == "DROP TABLE holy_spots2_p20260901"
@@ -0,0 +1,152 @@
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+from collectors import main
+from collectors.enrichers.frequencies import InvalidBandError
+from shared.geo import GeoException
+
+
+class FakePipeline:
+    def __init__(self):
+        self.commands = []
+        self.executed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key, value):
+        self.commands.append(("set", key))
+
+    def xadd(self, stream, fields, *args, **kwargs):
+        self.commands.append(("xadd", stream, fields["dx_callsign"]))
+
+    async def execute(self):
+        self.executed = True
+
+
+class FakeValkey:
+    def __init__(self):
+        self.pipelines = []
+        self.values = {}
+
+    async def set(self, key, value):
+        self.values[key] = value
+
+    async def incrby(self, key, amount):
+        self.values[key] = self.values.get(key, 0) + amount
+        return self.values[key]
+
+    def pipeline(self, transaction=True):
+        pipeline = FakePipeline()
+        self.pipelines.append(pipeline)
+        return pipeline
+
+
+class FakeSpotWriter:
+    def __init__(self):
+        self.batches = []
+
+    async def add(self, spots):
+        self.batches.append(spots)
+
+
+class FakeQrzManager:
+    http_client = None
+
+    def get_key(self):
+        return "session"
+
+
+def create_enriched_spot(dx_callsign):
+    return {
+        "dx_callsign": dx_callsign,
+        "spotter_locator": "KM72",
+        "dx_locator": "FN31",
+        "band": "20",
+        "mode": "CW",
+        "frequency": 14025.0,
+    }
+
+
+def test_drain_spot_batch_stops_at_max_size():
+    async def run():
+        queue = asyncio.Queue()
+        for index in range(5):
+            queue.put_nowait({"index": index})
+        return await main.drain_spot_batch(queue, 3, 1), queue.qsize()
+
+    spots, remaining = asyncio.run(run())
+
+    assert [spot["index"] for spot in spots] == [0, 1, 2]
+    assert remaining == 2
+
+
+def test_drain_spot_batch_returns_partial_batch_after_timeout():
+    async def run():
+        queue = asyncio.Queue()
+        queue.put_nowait({"index": 0})
+        return await main.drain_spot_batch(queue, 10, 0.01)
+
+    spots = asyncio.run(run())
+
+    assert spots == [{"index": 0}]
+
+
+def test_process_spot_batch_drops_invalid_spots_and_writes_once():
+    async def fake_enrich_spot(qrz_session_key, spot, http_client, valkey_client):
+        if spot["dx_callsign"] == "BADBAND":
+            raise InvalidBandError("no band")
+        if spot["dx_callsign"] == "NOGEO":
+            raise GeoException(spot["dx_callsign"], "dx_callsign", "locator", notify_monitor=False)
+        return create_enriched_spot(spot["dx_callsign"])
+
+    valkey_client = FakeValkey()
+    valkey_client.values[main.SPOT_SEQ_KEY] = 41
+    spot_writer = FakeSpotWriter()
+    spots = [{"dx_callsign": callsign} for callsign in ("K1ABC", "BADBAND", "NOGEO", "4X5BR")]
+
+    async def run():
+        with patch.object(main, "enrich_spot", new=fake_enrich_spot):
+            await main.process_spot_batch(spots, FakeQrzManager(), valkey_client, spot_writer, asyncio.Semaphore(2))
+
+    asyncio.run(run())
+
+    assert len(spot_writer.batches) == 1
+    assert [spot["dx_callsign"] for spot in spot_writer.batches[0]] == ["K1ABC", "4X5BR"]
+    assert [spot["seq"] for spot in spot_writer.batches[0]] == [42, 43]
+    assert valkey_client.values[main.SPOT_SEQ_KEY] == 43
+
+    assert "monitor:collector:heartbeat" in valkey_client.values
+    assert valkey_client.pipelines == []
+
+
+def test_publish_spots_adds_only_complete_spots_to_the_stream():
+    valkey_client = FakeValkey()
+    incomplete_spot = create_enriched_spot("NOLOC")
+    incomplete_spot["dx_locator"] = ""
+
+    asyncio.run(main.publish_spots(valkey_client, [create_enriched_spot("K1ABC"), incomplete_spot]))
+
+    pipeline = valkey_client.pipelines[0]
+    assert pipeline.executed
+    assert pipeline.commands == [("set", "monitor:collector:last_spot_time"), ("xadd", main.STREAM_API, "K1ABC")]
+
+
+def test_near_duplicates_are_dropped_before_enrichment():
+    near_duplicates = main.NearDuplicateIndex(window=120, frequency_tolerance=0.1)
+    spots = [
+        {"dx_callsign": "4X5BR", "spotter_callsign": "K1ABC", "frequency": 14025.0, "time": "1200Z"},
+        {"dx_callsign": "4X5BR", "spotter_callsign": "K1ABC", "frequency": 14025.1, "time": "1201Z"},
+        {"dx_callsign": "4X5BR", "spotter_callsign": "DL1AA", "frequency": 14025.0, "time": "1200Z"},
+    ]
+
+    unique_spots = main.drop_near_duplicates(spots, near_duplicates)
+
+    assert [spot["spotter_callsign"] for spot in unique_spots] == ["K1ABC", "DL1AA"]
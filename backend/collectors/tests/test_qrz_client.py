@@ -0,0 +1,157 @@
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+from shared import cty, geo, qrz
+from shared.cty import CtyCountry, CtyResolver
+from shared.metrics import LatencyHistogram
+
+ISRAEL = CtyCountry("Israel", "AS", 336, 31.5, 34.8, 20, 39)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FailingHttpClient:
+    def __init__(self):
+        self.calls = 0
+
+    async def get(self, url, timeout=None):
+        self.calls += 1
+        raise httpx.ConnectTimeout("timed out")
+
+
+class FakeValkey:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None, nx=False, get=False):
+        previous = self.values.get(key)
+        if not nx or previous is None:
+            self.values[key] = value
+        return previous if get else True
+
+
+@pytest.fixture
+def qrz_client():
+    qrz.configure_qrz_client(rate=100, burst=100, failure_threshold=2, reset_timeout=30)
+    with patch.object(qrz, "qrz_backoff_delay", return_value=0):
+        yield
+
+
+def test_token_bucket_rejects_waits_above_max_wait():
+    clock = FakeClock()
+    bucket = qrz.TokenBucket(rate=2, burst=1, clock=clock)
+
+    assert bucket.reserve(max_wait=0) == 0
+    assert bucket.reserve(max_wait=0.1) is None
+    assert bucket.reserve(max_wait=1) == 0.5
+
+    clock.now = 1.0
+    assert bucket.reserve(max_wait=0) == 0
+
+
+def test_circuit_breaker_lets_one_probe_through_after_the_timeout():
+    clock = FakeClock()
+    breaker = qrz.CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert not breaker.allow_request()
+
+    clock.now = 10
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.allow_request()
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for seconds in (0.005, 0.02, 0.02, 0.3, 9):
+        histogram.observe(seconds)
+
+    metrics = histogram.metrics("collector:qrz_latency_ms")
+
+    assert metrics["collector:qrz_latency_ms:count"] == 5
+    assert metrics["collector:qrz_latency_ms:bucket_25ms"] == 2
+    assert metrics["collector:qrz_latency_ms:p50"] == 25
+    assert metrics["collector:qrz_latency_ms:p99"] == float("inf")
+
+
+def test_open_breaker_fails_fast_without_requests(qrz_client):
+    http_client = FailingHttpClient()
+
+    async def run():
+        with pytest.raises(qrz.QrzUnavailableError):
+            await qrz.get_locator_from_qrz("session", "4X5BR", http_client)
+        with pytest.raises(qrz.QrzUnavailableError):
+            await qrz.get_locator_from_qrz("session", "4X5BR", http_client)
+
+    asyncio.run(run())
+
+    assert http_client.calls == 2
+    assert qrz.qrz_circuit_breaker.state == qrz.CircuitBreaker.OPEN
+
+
+def test_open_breaker_does_not_take_rate_limit_tokens(qrz_client):
+    qrz.qrz_circuit_breaker.state = qrz.CircuitBreaker.OPEN
+    qrz.qrz_circuit_breaker._opened_at = qrz.qrz_circuit_breaker.clock()
+
+    async def run():
+        with pytest.raises(qrz.QrzUnavailableError, match="circuit breaker"):
+            await qrz.get_locator_from_qrz("session", "4X5BR", FailingHttpClient())
+
+    with patch.object(qrz.qrz_rate_limiter, "acquire") as acquire:
+        asyncio.run(run())
+    acquire.assert_not_called()
+
+
+def test_unexpected_probe_error_reopens_the_breaker(qrz_client):
+    class DecodingErrorClient:
+        async def get(self, url, timeout=None):
+            raise httpx.DecodingError("bad gzip")
+
+    breaker = qrz.qrz_circuit_breaker
+    breaker.state = qrz.CircuitBreaker.OPEN
+    breaker._opened_at = breaker.clock() - breaker.reset_timeout
+
+    async def run():
+        with pytest.raises(httpx.DecodingError):
+            await qrz.get_locator_from_qrz("session", "4X5BR", DecodingErrorClient())
+
+    asyncio.run(run())
+
+    assert breaker.state == qrz.CircuitBreaker.OPEN
+    breaker._opened_at -= breaker.reset_timeout
+    assert breaker.allow_request()
+
+
+def test_unavailable_qrz_falls_back_to_cty_without_caching(qrz_client):
+    resolver = CtyResolver(exact_callsigns={}, prefixes={"4X": ISRAEL}, entities_by_dxcc_code={336: ISRAEL})
+    geo.configure_local_geo_cache(max_size=10, ttl=300, negative_ttl=300)
+    valkey_client = FakeValkey()
+
+    async def run():
+        return await geo.get_geo_details(valkey_client, "session", "4X5BR", 3600, FailingHttpClient(), "spotter")
+
+    with patch.object(cty, "_CTY_STATE", (cty.CTY_CACHE_PATH, 0.0, resolver, None)):
+        geo_data = asyncio.run(run())
+
+    assert geo_data.locator_source == "cty"
+    assert geo_data.dxcc_code == 336
+    assert valkey_client.values == {}
@@ -0,0 +1,68 @@
+import asyncio
+import gzip
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+from collectors.logging_setup import RawFeedLog, open_raw_feed_log
+
+
+def write_feed(feed_log):
+    async def run():
+        feed_log.start(interval=0.01)
+        feed_log.write_line(b"DX de K1ABC:  14025.0  4X5BR  CQ  1200Z")
+        await asyncio.sleep(0.05)
+        feed_log.error("Connection closed by remote host.")
+        await feed_log.close()
+
+    asyncio.run(run())
+
+
+def test_records_are_written_in_the_task_log_format(tmp_path):
+    feed_log = open_raw_feed_log(str(tmp_path / "dx.example.org"), "dx.example.org")
+
+    write_feed(feed_log)
+
+    records = Path(feed_log.path).read_bytes().splitlines()
+    assert [record.split(b" - ", 3)[1:] for record in records] == [
+        [b"dx.example.org", b"INFO", b"DX de K1ABC:  14025.0  4X5BR  CQ  1200Z"],
+        [b"dx.example.org", b"ERROR", b"Connection closed by remote host."],
+    ]
+
+
+def test_compressed_feed_log(tmp_path):
+    feed_log = open_raw_feed_log(str(tmp_path / "dx.example.org"), "dx.example.org", compress=True)
+
+    write_feed(feed_log)
+
+    assert feed_log.path.endswith(".log.gz")
+    assert gzip.decompress(Path(feed_log.path).read_bytes()).count(b"\n") == 2
+
+
+def test_records_beyond_the_buffer_are_dropped(tmp_path):
+    feed_log = RawFeedLog(str(tmp_path / "feed.log"), "feed", max_buffered=2)
+    for index in range(5):
+        feed_log.write_line(b"line %d" % index)
+
+    assert feed_log.dropped == 3
+    asyncio.run(feed_log.close())
+
+    assert feed_log.dropped == 0
+    assert Path(feed_log.path).read_bytes().count(b"\n") == 2
+
+
+def test_lazy_debug_messages_are_not_formatted_when_dropped(tmp_path):
+    feed_log = RawFeedLog(str(tmp_path / "feed.log"), "feed", max_buffered=1)
+    formatted = []
+
+    def format_message():
+        formatted.append(len(formatted))
+        return "spot"
+
+    feed_log.debug(format_message)
+    feed_log.debug(format_message)
+    asyncio.run(feed_log.close())
+
+    assert formatted == [0]
+    assert Path(feed_log.path).read_bytes().endswith(b" - feed - DEBUG - spot\n")
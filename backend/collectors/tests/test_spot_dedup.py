@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+from collectors.utils import (
+    DEDUP_AND_RECORD_SHA,
+    STREAM_ARRIVALS,
+    NearDuplicateIndex,
+    SpotArrival,
+    SpotDeduplicator,
+    dedup_and_record_spots,
+)
+from redis.exceptions import NoScriptError
+
+
+def run_dedup_script(valkey_client, keys, args):
+    """Runs DEDUP_AND_RECORD_SCRIPT in Python."""
+    stream, spot_key, *source_key = keys
+    accepted = 0
+    if not source_key or source_key[0] not in valkey_client.values:
+        if source_key:
+            valkey_client.values[source_key[0]] = (1, args[2])
+        if spot_key not in valkey_client.values:
+            valkey_client.values[spot_key] = (1, args[1])
+            accepted = 1
+    valkey_client.streams.setdefault(stream, []).append(
+        {"cluster": args[0], "spot_key": spot_key, "accepted": str(accepted)}
+    )
+    return accepted
+
+
+class FakePipeline:
+    def __init__(self, valkey_client):
+        self.valkey_client = valkey_client
+        self.queued = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    def evalsha(self, sha, numkeys, *keys_and_args):
+        self.queued.append((sha, list(keys_and_args[:numkeys]), list(keys_and_args[numkeys:])))
+
+    def xadd(self, stream, fields):
+        self.queued.append((None, stream, fields))
+
+    async def execute(self, raise_on_error=True):
+        self.valkey_client.round_trips += 1
+        results = []
+        for sha, keys, args in self.queued:
+            if sha is None:
+                self.valkey_client.streams.setdefault(keys, []).append(args)
+                results.append("0-1")
+            elif sha not in self.valkey_client.scripts:
+                results.append(NoScriptError("No matching script"))
+            else:
+                results.append(run_dedup_script(self.valkey_client, keys, args))
+        return results
+
+
+class FakeValkey:
+    def __init__(self):
+        self.values = {}
+        self.streams = {}
+        self.scripts = {DEDUP_AND_RECORD_SHA}
+        self.round_trips = 0
+
+    async def script_load(self, script):
+        self.round_trips += 1
+        sha = hashlib.sha1(script.encode()).hexdigest()
+        self.scripts.add(sha)
+        return sha
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+def test_chunk_is_deduplicated_in_one_round_trip():
+    valkey_client = FakeValkey()
+    arrivals = [SpotArrival("spot:a", 300), SpotArrival("spot:b", 300), SpotArrival("spot:a", 300)]
+
+    added = asyncio.run(dedup_and_record_spots(valkey_client, "dx.example.org:7300", arrivals))
+
+    assert added == [True, True, False]
+    assert valkey_client.round_trips == 1
+    assert [arrival["accepted"] for arrival in valkey_client.streams[STREAM_ARRIVALS]] == ["1", "1", "0"]
+    assert valkey_client.values["spot:a"] == (1, 300)
+
+
+def test_source_key_is_checked_before_the_spot_key():
+    valkey_client = FakeValkey()
+    valkey_client.values["pota:seen"] = (1, 600)
+    arrivals = [
+        SpotArrival("spot:a", 300, source_key="pota:seen", source_expiration=600),
+        SpotArrival("spot:b", 300, source_key="pota:new", source_expiration=600),
+        SpotArrival("spot:b", 300, source_key="pota:other", source_expiration=600),
+    ]
+
+    added = asyncio.run(dedup_and_record_spots(valkey_client, "pota", arrivals))
+
+    assert added == [False, True, False]
+    assert "spot:a" not in valkey_client.values
+    assert valkey_client.values["pota:other"] == (1, 600)
+    assert len(valkey_client.streams[STREAM_ARRIVALS]) == 3
+
+
+def test_script_is_loaded_after_noscript_and_only_failed_calls_are_sent_again():
+    valkey_client = FakeValkey()
+    valkey_client.scripts.clear()
+    arrivals = [SpotArrival("spot:a", 300), SpotArrival("spot:b", 300)]
+
+    added = asyncio.run(dedup_and_record_spots(valkey_client, "dx.example.org:7300", arrivals, [("b:23", "spot:c")]))
+
+    assert added == [True, True]
+    assert valkey_client.round_trips == 3
+    assert DEDUP_AND_RECORD_SHA in valkey_client.scripts
+    assert [arrival["spot_key"] for arrival in valkey_client.streams[STREAM_ARRIVALS]] == ["spot:c", "spot:a", "spot:b"]
+
+
+def test_empty_chunk_skips_valkey():
+    valkey_client = FakeValkey()
+
+    assert asyncio.run(dedup_and_record_spots(valkey_client, "pota", [])) == []
+    assert valkey_client.round_trips == 0
+
+
+def test_local_filter_rejects_copies_from_other_clusters_without_valkey():
+    valkey_client = FakeValkey()
+    deduplicator = SpotDeduplicator(valkey_client, max_size=100, ttl=60)
+
+    async def run():
+        first = await deduplicator.dedup("a:7300", [SpotArrival("spot:a", 60)])
+        copies = [await deduplicator.dedup(cluster, [SpotArrival("spot:a", 60)]) for cluster in ("b:23", "c:23")]
+        round_trips = valkey_client.round_trips
+        await deduplicator.dedup("a:7300", [SpotArrival("spot:b", 60)])
+        return first, copies, round_trips
+
+    first, copies, round_trips = asyncio.run(run())
+
+    assert first == [True]
+    assert copies == [[False], [False]]
+    assert round_trips == 1
+    assert valkey_client.round_trips == 2
+    assert [(arrival["cluster"], arrival["accepted"]) for arrival in valkey_client.streams[STREAM_ARRIVALS]] == [
+        ("a:7300", "1"),
+        ("a:7300", "1"),
+        ("b:23", "0"),
+        ("c:23", "0"),
+    ]
+    assert deduplicator.pending_arrivals == 0
+
+
+def test_flush_records_pending_duplicates():
+    valkey_client = FakeValkey()
+    deduplicator = SpotDeduplicator(valkey_client, max_size=100, ttl=60)
+
+    async def run():
+        await deduplicator.dedup("a:7300", [SpotArrival("spot:a", 60)])
+        await deduplicator.dedup("b:23", [SpotArrival("spot:a", 60)])
+        pending = deduplicator.pending_arrivals
+        await deduplicator.flush()
+        await deduplicator.flush()
+        return pending
+
+    assert asyncio.run(run()) == 1
+    assert valkey_client.round_trips == 2
+    assert valkey_client.streams[STREAM_ARRIVALS][-1] == {"cluster": "b:23", "spot_key": "spot:a", "accepted": "0"}
+
+
+def test_source_keyed_arrivals_always_reach_valkey():
+    valkey_client = FakeValkey()
+    deduplicator = SpotDeduplicator(valkey_client, max_size=100, ttl=60)
+
+    async def run():
+        await deduplicator.dedup("a:7300", [SpotArrival("spot:a", 60)])
+        return await deduplicator.dedup("pota", [SpotArrival("spot:a", 60, source_key="pota:1", source_expiration=600)])
+
+    assert asyncio.run(run()) == [False]
+    assert valkey_client.values["pota:1"] == (1, 600)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def create_spot(frequency, dx_callsign="4X5BR", spotter_callsign="K1ABC"):
+    return {"dx_callsign": dx_callsign, "spotter_callsign": spotter_callsign, "frequency": frequency}
+
+
+def test_near_duplicates_within_the_tolerance_are_rejected():
+    index = NearDuplicateIndex(window=120, frequency_tolerance=0.1, clock=FakeClock())
+
+    assert not index.is_duplicate(create_spot(14025.0))
+    assert index.is_duplicate(create_spot(14025.1))
+    assert index.is_duplicate(create_spot(14024.9, dx_callsign="4x5br"))
+    assert not index.is_duplicate(create_spot(14025.3))
+    assert not index.is_duplicate(create_spot(14025.0, spotter_callsign="DL1AA"))
+    assert not index.is_duplicate(create_spot(7025.0))
+
+
+def test_near_duplicate_window_starts_at_the_accepted_spot():
+    clock = FakeClock()
+    index = NearDuplicateIndex(window=120, frequency_tolerance=0.1, clock=clock)
+
+    index.is_duplicate(create_spot(14025.0))
+    clock.now += 100
+    assert index.is_duplicate(create_spot(14025.0))
+    clock.now += 30
+    assert not index.is_duplicate(create_spot(14025.0))
+
+
+def test_near_duplicate_index_prunes_expired_pairs():
+    clock = FakeClock()
+    index = NearDuplicateIndex(window=120, frequency_tolerance=0.1, clock=clock)
+
+    index.is_duplicate(create_spot(14025.0))
+    clock.now += 200
+    index.is_duplicate(create_spot(14025.0, dx_callsign="EA8AB"))
+
+    assert len(index) == 1
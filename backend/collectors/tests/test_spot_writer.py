@@ -0,0 +1,210 @@
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DataError
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+from collectors.db import spot_writer
+from collectors.db.spot_writer import HolySpotWriter
+
+
+class FakeSession:
+    statements = []
+    fail = False
+    rejected_callsign = None
+
+    def __init__(self, engine):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def execute(self, statement):
+        if FakeSession.fail:
+            raise ConnectionError("database is down")
+        rejected_callsign = FakeSession.rejected_callsign
+        if (
+            rejected_callsign is not None
+            and rejected_callsign in statement.compile(dialect=postgresql.dialect()).params.values()
+        ):
+            raise DataError("INSERT INTO holy_spots2", {}, ValueError("value too long"))
+        FakeSession.statements.append(statement)
+
+    async def commit(self):
+        pass
+
+
+class FakeValkey:
+    def __init__(self):
+        self.values = {}
+        self.lists = {}
+
+    async def mset(self, mapping):
+        self.values.update(mapping)
+
+    async def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    async def ltrim(self, key, start, end):
+        pass
+
+
+def create_spot(dx_callsign="K1ABC"):
+    return {
+        "cluster": "ve7cc.net:23",
+        "timestamp": 1780000000,
+        "frequency": 14025.0,
+        "band": "20",
+        "mode": "CW",
+        "mode_selection": "range",
+        "spotter_callsign": "4X5BR",
+        "spotter_locator": "KM72",
+        "spotter_locator_source": "qrz",
+        "spotter_lat": 32.0,
+        "spotter_lon": 34.0,
+        "spotter_dxcc_code": 336,
+        "spotter_continent": "AS",
+        "spotter_state": "",
+        "dx_callsign": dx_callsign,
+        "dx_locator": "FN31",
+        "dx_locator_source": "qrz",
+        "dx_lat": 41.0,
+        "dx_lon": -73.0,
+        "dx_dxcc_code": 291,
+        "dx_continent": "NA",
+        "dx_state": "CT",
+        "comment": "",
+        "is_dxpedition": 0,
+    }
+
+
+def run_writer(coroutine_factory):
+    FakeSession.statements = []
+    valkey_client = FakeValkey()
+
+    async def run():
+        writer = HolySpotWriter(None, valkey_client, max_rows=2, max_age=60)
+        await coroutine_factory(writer)
+        return writer
+
+    with patch.object(spot_writer, "AsyncSession", new=FakeSession):
+        writer = asyncio.run(run())
+    return writer, valkey_client
+
+
+def test_writer_buffers_until_max_rows():
+    async def scenario(writer):
+        await writer.add([create_spot("K1ABC")])
+        assert FakeSession.statements == []
+        await writer.add([create_spot("K2ABC")])
+
+    writer, valkey_client = run_writer(scenario)
+
+    assert writer.buffered_rows == 0
+    assert len(FakeSession.statements) == 1
+    compiled = str(FakeSession.statements[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT ON CONSTRAINT uc_holy_spots2 DO NOTHING" in compiled
+    assert "monitor:collector:db_flush_latency_ms" in valkey_client.values
+
+
+def test_writer_flush_writes_partial_buffer():
+    async def scenario(writer):
+        await writer.add([create_spot()])
+        await writer.flush()
+
+    writer, _valkey_client = run_writer(scenario)
+
+    assert writer.buffered_rows == 0
+    assert len(FakeSession.statements) == 1
+
+
+def test_writer_keeps_rows_after_failed_flush():
+    async def scenario(writer):
+        FakeSession.fail = True
+        try:
+            await writer.add([create_spot("K1ABC"), create_spot("K2ABC")])
+        finally:
+            FakeSession.fail = False
+
+    writer, valkey_client = run_writer(scenario)
+
+    assert writer.buffered_rows == 2
+    assert len(valkey_client.lists["monitor:exception_events"]) == 1
+
+
+def test_writer_drops_only_the_rows_postgres_rejects():
+    async def scenario(writer):
+        FakeSession.rejected_callsign = "BAD"
+        try:
+            await writer.add([create_spot("K1ABC"), create_spot("BAD")])
+            await writer.add([create_spot("K2ABC")])
+            await writer.flush()
+        finally:
+            FakeSession.rejected_callsign = None
+
+    writer, valkey_client = run_writer(scenario)
+
+    assert writer.buffered_rows == 0
+    written = [
+        value
+        for statement in FakeSession.statements
+        for value in statement.compile(dialect=postgresql.dialect()).params.values()
+        if value in ("K1ABC", "K2ABC", "BAD")
+    ]
+    assert written == ["K1ABC", "K2ABC"]
+    assert len(valkey_client.lists["monitor:collector:drop_events"]) == 1
+
+
+def test_writer_drops_the_oldest_rows_beyond_max_buffered_rows():
+    FakeSession.statements = []
+    valkey_client = FakeValkey()
+
+    async def run():
+        writer = HolySpotWriter(None, valkey_client, max_rows=10, max_age=60, max_buffered_rows=3)
+        FakeSession.fail = True
+        try:
+            await writer.add([create_spot("K1ABC"), create_spot("K2ABC")])
+            await writer.flush()
+            await writer.add([create_spot("K3ABC"), create_spot("K4ABC")])
+            await writer.flush()
+        finally:
+            FakeSession.fail = False
+        return writer
+
+    with patch.object(spot_writer, "AsyncSession", new=FakeSession):
+        writer = asyncio.run(run())
+
+    assert [spot["dx_callsign"] for _row, spot in writer._rows] == ["K2ABC", "K3ABC", "K4ABC"]
+    assert len(valkey_client.lists["monitor:collector:drop_events"]) == 1
+
+
+def test_writer_publishes_spots_only_after_they_are_written():
+    FakeSession.statements = []
+    valkey_client = FakeValkey()
+    published = []
+
+    async def publish(spots):
+        published.append((len(FakeSession.statements), [spot["dx_callsign"] for spot in spots]))
+
+    async def run():
+        writer = HolySpotWriter(None, valkey_client, max_rows=10, max_age=60, publish=publish)
+        FakeSession.fail = True
+        try:
+            await writer.add([create_spot("K1ABC")])
+            await writer.flush()
+        finally:
+            FakeSession.fail = False
+        await writer.add([create_spot("K2ABC")])
+        await writer.flush()
+
+    with patch.object(spot_writer, "AsyncSession", new=FakeSession):
+        asyncio.run(run())
+
+    assert published == [(1, ["K1ABC", "K2ABC"])]
@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+from collectors.telnet.client import parse_dx_line
+
+
+def test_parse_cc_cluster_line():
+    line = b"DX de 4X5BR-2:   14025.0  K1ABC        CW 12 dB 25 WPM CQ      KM72 1200Z FN42\r"
+
+    assert parse_dx_line(line) == {
+        "spotter_callsign": "4X5BR",
+        "frequency": 14025.0,
+        "dx_callsign": "K1ABC",
+        "comment": "CW 12 dB 25 WPM CQ",
+        "dx_locator": "KM72",
+        "time": "1200Z",
+        "spotter_locator": "FN42",
+    }
+
+
+def test_parse_ar_cluster_line():
+    line = b"DX de K5TR-#:    14056.0  VE2PID/W8    CW 17 dB 22 WPM CQ             2010Z"
+
+    assert parse_dx_line(line) == {
+        "spotter_callsign": "K5TR-#",
+        "frequency": 14056.0,
+        "dx_callsign": "VE2PID/W8",
+        "comment": "CW 17 dB 22 WPM CQ",
+        "time": "2010Z",
+        "dx_locator": "",
+        "spotter_locator": "",
+    }
+
+
+def test_parse_line_without_comment():
+    assert parse_dx_line("DX de KB8OTK:    18100.9  OD5ZZ                                       2053Z")["comment"] == ""
+    assert parse_dx_line(b"DX de EA8AB:  7025.0  4X5BR  IL18 1200Z KM72")["dx_locator"] == "IL18"
+
+
+def test_unparsable_lines():
+    assert parse_dx_line(b"DX de K1ABC: not a spot") is None
+    assert parse_dx_line(b"WWV de VE7CC <18>:   SFI=150, A=5, K=1") is None
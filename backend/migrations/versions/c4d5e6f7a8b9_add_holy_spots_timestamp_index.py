@@ -0,0 +1,136 @@
+"""add holy spots timestamp index and optional daily partitioning
+
+Revision ID: c4d5e6f7a8b9
+Revises: a9b8c7d6e5f4
+Create Date: 2026-10-17 00:00:00.000000
+
+Partitioning is enabled with POSTGRES_PARTITION_HOLY_SPOTS=true. A partitioned
+table must include the partition key in its primary key and unique constraints,
+so the primary key becomes (id, timestamp).
+
+uc_holy_spots2 gains timestamp on every install, so partitioned and plain tables
+reject the same rows. The collector derives time from timestamp, so equal times
+on the same day already mean equal timestamps. The cost of the wider constraint
+is that the same (time, spotter_callsign, dx_callsign) on two different days is
+no longer a conflict, those rows are kept until retention removes them.
+"""
+
+from datetime import UTC, datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from shared.partitions import (
+    HOLY_SPOTS_DEFAULT_PARTITION,
+    IS_PARTITIONED_QUERY,
+    PARTITION_PRECREATE_DAYS,
+    create_holy_spots_partition_sql,
+    holy_spots_partition_days,
+)
+from shared.settings import PostgresSettings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4d5e6f7a8b9"
+down_revision: Union[str, Sequence[str], None] = "a9b8c7d6e5f4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _is_partitioned(connection) -> bool:
+    return connection.execute(sa.text(IS_PARTITIONED_QUERY), {"table_name": "holy_spots2"}).first() is not None
+
+
+def _partition_holy_spots(connection) -> None:
+    op.execute("ALTER TABLE holy_spots2 RENAME TO holy_spots2_unpartitioned")
+    op.execute(
+        "ALTER TABLE holy_spots2_unpartitioned RENAME CONSTRAINT holy_spots2_pkey TO holy_spots2_unpartitioned_pkey"
+    )
+    op.execute("ALTER TABLE holy_spots2_unpartitioned RENAME CONSTRAINT uc_holy_spots2 TO uc_holy_spots2_unpartitioned")
+
+    # INCLUDING DEFAULTS keeps the id column on holy_spots2_id_seq, so ids stay monotonic.
+    op.execute(
+        "CREATE TABLE holy_spots2 (LIKE holy_spots2_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)"
+    )
+    op.execute("ALTER SEQUENCE holy_spots2_id_seq OWNED BY holy_spots2.id")
+    op.execute("ALTER TABLE holy_spots2 ADD CONSTRAINT holy_spots2_pkey PRIMARY KEY (id, timestamp)")
+    op.execute(
+        "ALTER TABLE holy_spots2 ADD CONSTRAINT uc_holy_spots2 UNIQUE (time, spotter_callsign, dx_callsign, timestamp)"
+    )
+    op.create_index("ix_holy_spots2_timestamp", "holy_spots2", ["timestamp"])
+
+    today = datetime.now(UTC).date()
+    oldest_timestamp = connection.execute(sa.text("SELECT min(timestamp) FROM holy_spots2_unpartitioned")).scalar()
+    first_day = datetime.fromtimestamp(oldest_timestamp, UTC).date() if oldest_timestamp is not None else today
+    for day in holy_spots_partition_days(min(first_day, today), today + timedelta(days=PARTITION_PRECREATE_DAYS)):
+        op.execute(create_holy_spots_partition_sql(day))
+    op.execute(f"CREATE TABLE {HOLY_SPOTS_DEFAULT_PARTITION} PARTITION OF holy_spots2 DEFAULT")
+
+    op.execute("INSERT INTO holy_spots2 SELECT * FROM holy_spots2_unpartitioned")
+    op.execute("DROP TABLE holy_spots2_unpartitioned")
+
+
+def _unpartition_holy_spots() -> None:
+    op.execute("ALTER TABLE holy_spots2 RENAME TO holy_spots2_partitioned")
+    op.execute("ALTER TABLE holy_spots2_partitioned RENAME CONSTRAINT holy_spots2_pkey TO holy_spots2_partitioned_pkey")
+    op.execute("ALTER TABLE holy_spots2_partitioned RENAME CONSTRAINT uc_holy_spots2 TO uc_holy_spots2_partitioned")
+
+    op.execute("CREATE TABLE holy_spots2 (LIKE holy_spots2_partitioned INCLUDING DEFAULTS)")
+    op.execute("ALTER SEQUENCE holy_spots2_id_seq OWNED BY holy_spots2.id")
+    op.execute("ALTER TABLE holy_spots2 ADD CONSTRAINT holy_spots2_pkey PRIMARY KEY (id)")
+    op.execute("ALTER TABLE holy_spots2 ADD CONSTRAINT uc_holy_spots2 UNIQUE (time, spotter_callsign, dx_callsign)")
+
+    op.execute(
+        "INSERT INTO holy_spots2 SELECT * FROM holy_spots2_partitioned "
+        "ON CONFLICT ON CONSTRAINT uc_holy_spots2 DO NOTHING"
+    )
+    op.execute("DROP TABLE holy_spots2_partitioned")
+
+
+def _widen_unique_constraint() -> None:
+    # Build the new unique index without blocking the collector's inserts, then swap the constraints.
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uc_holy_spots2_timestamp "
+            "ON holy_spots2 (time, spotter_callsign, dx_callsign, timestamp)"
+        )
+    op.execute("ALTER TABLE holy_spots2 DROP CONSTRAINT uc_holy_spots2")
+    op.execute("ALTER TABLE holy_spots2 ADD CONSTRAINT uc_holy_spots2 UNIQUE USING INDEX uc_holy_spots2_timestamp")
+
+
+def _narrow_unique_constraint() -> None:
+    # Rows the wider constraint accepted on different days would violate the old one, the first is kept.
+    op.execute(
+        "DELETE FROM holy_spots2 a USING holy_spots2 b WHERE a.id > b.id AND a.time = b.time "
+        "AND a.spotter_callsign = b.spotter_callsign AND a.dx_callsign = b.dx_callsign"
+    )
+    op.execute("ALTER TABLE holy_spots2 DROP CONSTRAINT uc_holy_spots2")
+    op.execute("ALTER TABLE holy_spots2 ADD CONSTRAINT uc_holy_spots2 UNIQUE (time, spotter_callsign, dx_callsign)")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+
+    if PostgresSettings().postgres_partition_holy_spots:
+        _partition_holy_spots(connection)
+        return
+
+    # Build the index without blocking the collector's inserts.
+    with op.get_context().autocommit_block():
+        op.create_index("ix_holy_spots2_timestamp", "holy_spots2", ["timestamp"], postgresql_concurrently=True)
+    _widen_unique_constraint()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    connection = op.get_bind()
+
+    if _is_partitioned(connection):
+        # The partitioned table and its index are dropped, the plain table is created without the index.
+        _unpartition_holy_spots()
+        return
+
+    _narrow_unique_constraint()
+    op.drop_index("ix_holy_spots2_timestamp", table_name="holy_spots2")
@@ -0,0 +1,41 @@
+"""add holy spots seq
+
+Revision ID: e5f6a7b8c9d0
+Revises: c4d5e6f7a8b9
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from shared.partitions import HOLY_SPOTS_TABLE, IS_PARTITIONED_QUERY
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5f6a7b8c9d0"
+down_revision: Union[str, Sequence[str], None] = "c4d5e6f7a8b9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    op.add_column("holy_spots2", sa.Column("seq", sa.BigInteger(), nullable=True))
+
+    if connection.execute(sa.text(IS_PARTITIONED_QUERY), {"table_name": HOLY_SPOTS_TABLE}).first() is not None:
+        # Indexes on a partitioned table cannot be built concurrently.
+        op.create_index("ix_holy_spots2_seq", "holy_spots2", ["seq"])
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index("ix_holy_spots2_seq", "holy_spots2", ["seq"], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_holy_spots2_seq", table_name="holy_spots2")
+    op.drop_column("holy_spots2", "seq")
@@ -0,0 +1,39 @@
+"""add geo cache tier columns
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f6a7b8c9d0e1"
+down_revision: Union[str, Sequence[str], None] = "e5f6a7b8c9d0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("geo_cache", sa.Column("locator_source", sa.String(), nullable=True))
+    op.add_column("geo_cache", sa.Column("state", sa.String(), nullable=True))
+    op.add_column("geo_cache", sa.Column("cq_zone", sa.Integer(), nullable=True))
+    op.add_column("geo_cache", sa.Column("itu_zone", sa.Integer(), nullable=True))
+    op.add_column("geo_cache", sa.Column("hit_count", sa.Integer(), server_default="0", nullable=False))
+    op.create_index("ix_geo_cache_hit_count", "geo_cache", ["hit_count"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_geo_cache_hit_count", table_name="geo_cache")
+    op.drop_column("geo_cache", "hit_count")
+    op.drop_column("geo_cache", "itu_zone")
+    op.drop_column("geo_cache", "cq_zone")
+    op.drop_column("geo_cache", "state")
+    op.drop_column("geo_cache", "locator_source")
@@ -1,20 +1,32 @@
+import asyncio
 import csv
 import json
+import marshal
+import mmap
+import os
 import re
+import tempfile
+import threading
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
 import httpx
 from loguru import logger
 
+from shared.metrics import push_exception_event, set_values
+
 
 CTY_URL = "https://www.country-files.com/cty/cty.csv"
 CTY_CACHE_DIR = Path.home() / ".cache" / "holycluster" / "country-files"
 CTY_CACHE_PATH = CTY_CACHE_DIR / "cty.csv"
 CTY_METADATA_PATH = CTY_CACHE_DIR / "cty_metadata.json"
+CTY_SNAPSHOT_SUFFIX = ".snapshot"
+# Bump when the snapshot layout changes, older snapshots are then rebuilt from the CSV.
+CTY_SNAPSHOT_FORMAT = 1
 CTY_REFRESH_TIMEOUT = 30.0
+CTY_REFRESH_INTERVAL = 6 * 3600
 CTY_COUNTRY_FIELD_INDEX = 1
 CTY_DXCC_FIELD_INDEX = 2
 CTY_CONTINENT_FIELD_INDEX = 3
@@ -25,9 +37,15 @@ CTY_LONGITUDE_FIELD_INDEX = 7
 CTY_ALIAS_FIELD_INDEX = 9
 
 _CTY_TOKEN_MODIFIER_RE = re.compile(r"\(\d+\)|\[\d+\]|<[^>]+>|\{[^}]+}|~[^~]+~")
-_CTY_RESOLVER: "CtyResolver | None" = None
-_CTY_RESOLVER_PATH: Path | None = None
-_CTY_RESOLVER_MTIME: float | None = None
+# Key of the entity in a prefix trie node, it can never clash with a callsign character.
+_TRIE_ENTITY = ""
+_MISSING = object()
+# Portable suffixes that say how a station operates, not where, so the home call decides its DXCC.
+OPERATING_SUFFIXES = frozenset({"A", "AM", "B", "J", "LH", "M", "MM", "P", "QRP", "QRPP", "R"})
+RESOLVED_CALLSIGNS_MAX_SIZE = 50000
+# Path, mtime, resolver and what prepare built from the resolver, swapped with one assignment.
+_CTY_STATE: "tuple[Path, float, CtyResolver, Any] | None" = None
+_CTY_STATE_LOCK = threading.Lock()
 
 
 @dataclass(frozen=True)
@@ -49,39 +67,168 @@ class CtyCountry:
     itu_zone: int | None
 
 
+@dataclass(frozen=True)
+class ParsedCallsign:
+    home_call: str
+    prefix: str | None = None
+    suffix: str | None = None
+
+
+def parse_callsign(callsign: str) -> ParsedCallsign:
+    """
+    Split a normalized callsign into its home call, location prefix and suffix.
+
+    In `VO/DF6MS/P` the home call is DF6MS, VO is the location and P the suffix. With two
+    parts and no operating suffix, the shorter part is the location, as in `DF6MS/EA8`.
+    """
+    parts = [part for part in callsign.split("/") if part]
+    if len(parts) <= 1:
+        return ParsedCallsign(parts[0] if parts else "")
+    if len(parts) >= 3:
+        return ParsedCallsign(parts[1], prefix=parts[0], suffix=parts[-1])
+
+    first, second = parts
+    if second in OPERATING_SUFFIXES or second.isdigit():
+        return ParsedCallsign(first, suffix=second)
+    if len(first) <= len(second):
+        return ParsedCallsign(second, prefix=first)
+    return ParsedCallsign(first, prefix=second)
+
+
 @dataclass(frozen=True)
 class CtyResolver:
-    exact_callsigns: dict[str, CtyCountry]
+    """
+    Resolves callsigns to CTY entities.
+
+    Prefixes are compiled into a character trie once per resolver, so a lookup walks the
+    callsign once and stops at the first character no prefix continues with. Override
+    prefixes win over every CTY prefix and exact callsign they cover, a None entity
+    marks a callsign range that must not resolve.
+    """
+
+    exact_callsigns: dict[str, CtyCountry | None]
     prefixes: dict[str, CtyCountry]
     entities_by_dxcc_code: dict[int, CtyCountry]
+    prefix_overrides: dict[str, CtyCountry | None] = field(default_factory=dict)
+    _prefix_trie: dict = field(init=False, repr=False, compare=False)
+    _any_entities_by_dxcc_code: dict[int, CtyCountry] = field(init=False, repr=False, compare=False)
+    _override_prefixes: tuple[str, ...] = field(init=False, repr=False, compare=False)
+    # Memoized resolve_callsign results, a reloaded CTY file comes with a new resolver and an empty cache.
+    _resolved_callsigns: dict[str, CtyCountry | None] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "_prefix_trie", _build_prefix_trie(self.prefixes, self.prefix_overrides))
+        object.__setattr__(self, "_override_prefixes", tuple(self.prefix_overrides))
+        object.__setattr__(self, "_resolved_callsigns", {})
+        any_entities_by_dxcc_code = dict(self.entities_by_dxcc_code)
+        for entity in self.prefixes.values():
+            any_entities_by_dxcc_code.setdefault(entity.dxcc_code, entity)
+        object.__setattr__(self, "_any_entities_by_dxcc_code", any_entities_by_dxcc_code)
+
+    def with_overrides(
+        self,
+        callsign_overrides: dict[str, CtyCountry | None],
+        prefix_overrides: dict[str, CtyCountry | None],
+    ) -> "CtyResolver":
+        """Return a resolver answering from the overrides first, then from this resolver's CTY data."""
+        exact_callsigns = {
+            callsign: entity
+            for callsign, entity in self.exact_callsigns.items()
+            if not callsign.startswith(tuple(prefix_overrides))
+        }
+        exact_callsigns.update(callsign_overrides)
+        return CtyResolver(
+            exact_callsigns=exact_callsigns,
+            prefixes=self.prefixes,
+            entities_by_dxcc_code=self.entities_by_dxcc_code,
+            prefix_overrides={**self.prefix_overrides, **prefix_overrides},
+        )
 
     def resolve_entity(self, callsign: str) -> CtyCountry | None:
         normalized = normalize_callsign(callsign)
         if not normalized:
             return None
 
-        entity = self.exact_callsigns.get(normalized)
-        if entity is not None:
+        entity = self.exact_callsigns.get(normalized, _MISSING)
+        if entity is not _MISSING:
             return entity
 
-        for end in range(len(normalized), 0, -1):
-            entity = self.prefixes.get(normalized[:end])
+        node = self._prefix_trie
+        entity = None
+        for char in normalized:
+            node = node.get(char)
+            if node is None:
+                break
+            entity = node.get(_TRIE_ENTITY, entity)
+        return entity
+
+    def resolve_callsign(self, callsign: str) -> CtyCountry | None:
+        """Resolve a callsign, including portable forms such as VO/DF6MS and DF6MS/P, memoized per resolver."""
+        normalized = normalize_callsign(callsign)
+        entity = self._resolved_callsigns.get(normalized, _MISSING)
+        if entity is _MISSING:
+            entity = self._resolve_portable_callsign(normalized)
+            if len(self._resolved_callsigns) >= RESOLVED_CALLSIGNS_MAX_SIZE:
+                self._resolved_callsigns.clear()
+            self._resolved_callsigns[normalized] = entity
+        return entity
+
+    def _resolve_portable_callsign(self, normalized: str) -> CtyCountry | None:
+        if "/" not in normalized or normalized in self.exact_callsigns:
+            return self.resolve_entity(normalized)
+        if self._override_prefixes and normalized.startswith(self._override_prefixes):
+            return self.resolve_entity(normalized)
+
+        parsed = parse_callsign(normalized)
+        if parsed.prefix is not None:
+            entity = self._resolve_location_prefix(parsed.prefix)
             if entity is not None:
                 return entity
+        return self.resolve_entity(parsed.home_call)
+
+    def _resolve_location_prefix(self, prefix: str) -> CtyCountry | None:
+        """
+        Resolve a bare location prefix, VO has no entity of its own but every prefix under it is Canada.
+
+        A prefix whose longer prefixes belong to several DXCC entities is ambiguous and resolves to None.
+        """
+        node = self._prefix_trie
+        entity = None
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return entity
+            entity = node.get(_TRIE_ENTITY, entity)
+        if entity is not None:
+            return entity
 
+        entities = set()
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            if node.get(_TRIE_ENTITY) is not None:
+                entities.add(node[_TRIE_ENTITY])
+                if len({entity.dxcc_code for entity in entities}) > 1:
+                    return None
+            nodes.extend(child for key, child in node.items() if key != _TRIE_ENTITY)
+        if len(entities) == 1:
+            return entities.pop()
+        if entities:
+            # Prefixes of one DXCC entity with different zones, the entity's own CTY row decides.
+            return self.get_any_entity_by_dxcc_code(next(iter(entities)).dxcc_code)
         return None
 
     def resolve_country(self, callsign: str) -> CtyCountry | None:
-        return self.resolve_entity(callsign)
+        return self.resolve_callsign(callsign)
 
     def resolve(self, callsign: str) -> tuple[int, str] | None:
-        entity = self.resolve_entity(callsign)
+        entity = self.resolve_callsign(callsign)
         if entity is None:
             return None
         return entity.dxcc_code, entity.continent
 
     def resolve_country_and_continent(self, callsign: str) -> tuple[str, str] | None:
-        entity = self.resolve_entity(callsign)
+        entity = self.resolve_callsign(callsign)
         if entity is None:
             return None
         return entity.country, entity.continent
@@ -89,6 +236,32 @@ class CtyResolver:
     def get_entity_by_dxcc_code(self, dxcc_code: int) -> CtyCountry | None:
         return self.entities_by_dxcc_code.get(dxcc_code)
 
+    def get_any_entity_by_dxcc_code(self, dxcc_code: int) -> CtyCountry | None:
+        """Like get_entity_by_dxcc_code, falling back to an entity of a secondary (*) CTY row."""
+        return self._any_entities_by_dxcc_code.get(dxcc_code)
+
+
+def _build_prefix_trie(
+    prefixes: dict[str, CtyCountry],
+    prefix_overrides: dict[str, CtyCountry | None],
+) -> dict:
+    root: dict = {}
+    for prefix, entity in prefixes.items():
+        _trie_node(root, prefix)[_TRIE_ENTITY] = entity
+
+    for prefix, entity in prefix_overrides.items():
+        node = _trie_node(root, prefix)
+        node.clear()
+        node[_TRIE_ENTITY] = entity
+    return root
+
+
+def _trie_node(root: dict, prefix: str) -> dict:
+    node = root
+    for char in prefix:
+        node = node.setdefault(char, {})
+    return node
+
 
 def normalize_callsign(callsign: str) -> str:
     return callsign.strip().upper()
@@ -223,35 +396,152 @@ def build_cty_resolver(rows: list[list[str]]) -> CtyResolver:
     )
 
 
+def cty_file_version(path: Path) -> str:
+    """Identify the contents of a CTY file by its download ETag, size and mtime."""
+    stat = path.stat()
+    metadata = _read_metadata(path.with_name(CTY_METADATA_PATH.name))
+    return f"{metadata.get('etag') or ''}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _snapshot_path(path: Path) -> Path:
+    return path.with_suffix(CTY_SNAPSHOT_SUFFIX)
+
+
+def write_cty_snapshot(resolver: CtyResolver, snapshot_path: Path, version: str):
+    """Write the resolver as an entity table plus dicts of indexes into it."""
+    entity_indexes: dict[CtyCountry, int] = {}
+
+    def index(entity: CtyCountry) -> int:
+        return entity_indexes.setdefault(entity, len(entity_indexes))
+
+    snapshot = {
+        "format": CTY_SNAPSHOT_FORMAT,
+        "version": version,
+        "exact_callsigns": {callsign: index(entity) for callsign, entity in resolver.exact_callsigns.items()},
+        "prefixes": {prefix: index(entity) for prefix, entity in resolver.prefixes.items()},
+        "entities_by_dxcc_code": {
+            dxcc_code: index(entity) for dxcc_code, entity in resolver.entities_by_dxcc_code.items()
+        },
+    }
+    snapshot["entities"] = [
+        (
+            entity.country,
+            entity.continent,
+            entity.dxcc_code,
+            entity.latitude,
+            entity.longitude,
+            entity.cq_zone,
+            entity.itu_zone,
+        )
+        for entity in entity_indexes
+    ]
+
+    _replace_file(snapshot_path, marshal.dumps(snapshot))
+
+
+def read_cty_snapshot(snapshot_path: Path, version: str) -> CtyResolver | None:
+    """Load a snapshot written for this version of the CTY file, or None if there is no usable one."""
+    try:
+        with snapshot_path.open("rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            snapshot = marshal.loads(data)
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+
+    if (
+        not isinstance(snapshot, dict)
+        or snapshot.get("format") != CTY_SNAPSHOT_FORMAT
+        or snapshot.get("version") != version
+    ):
+        return None
+
+    entities = [CtyCountry(*fields) for fields in snapshot["entities"]]
+    return CtyResolver(
+        exact_callsigns={callsign: entities[index] for callsign, index in snapshot["exact_callsigns"].items()},
+        prefixes={prefix: entities[index] for prefix, index in snapshot["prefixes"].items()},
+        entities_by_dxcc_code={
+            dxcc_code: entities[index] for dxcc_code, index in snapshot["entities_by_dxcc_code"].items()
+        },
+    )
+
+
 def load_cty_resolver(path: Path = CTY_CACHE_PATH) -> CtyResolver:
-    with path.open(newline="") as file:
-        rows = list(csv.reader(file))
+    """Load the resolver from its snapshot, or parse the CSV and write a snapshot for the next start."""
+    version = cty_file_version(path)
+    snapshot_path = _snapshot_path(path)
+    resolver = read_cty_snapshot(snapshot_path, version)
+    source = snapshot_path
+    if resolver is None:
+        with path.open(newline="") as file:
+            rows = list(csv.reader(file))
+        resolver = build_cty_resolver(rows)
+        source = path
+        try:
+            write_cty_snapshot(resolver, snapshot_path, version)
+        except OSError:
+            logger.warning(f"Failed to write CTY snapshot {snapshot_path}", exc_info=True)
 
-    resolver = build_cty_resolver(rows)
     logger.info(
-        f"Loaded CTY resolver from {path}: "
+        f"Loaded CTY resolver from {source}: "
         f"{len(resolver.exact_callsigns)} exact callsigns, {len(resolver.prefixes)} prefixes"
     )
     return resolver
 
 
-def get_cty_resolver(path: Path = CTY_CACHE_PATH) -> CtyResolver | None:
-    global _CTY_RESOLVER, _CTY_RESOLVER_MTIME, _CTY_RESOLVER_PATH
+def reload_cty_resolver(path: Path = CTY_CACHE_PATH, prepare=None) -> CtyResolver | None:
+    """
+    Load the CTY file again if it changed since it was last loaded, and swap it in.
+
+    prepare is called with the new resolver before the swap, to build anything derived from it
+    on the calling thread rather than on the first lookup. Its result is swapped in together
+    with the resolver and returned by get_prepared_cty_resolver.
+    """
+    global _CTY_STATE
 
+    state = _CTY_STATE
+    loaded = state is not None and state[0] == path
     try:
         mtime = path.stat().st_mtime
     except FileNotFoundError:
-        if _CTY_RESOLVER is not None and _CTY_RESOLVER_PATH == path:
-            return _CTY_RESOLVER
-        return None
+        return state[2] if loaded else None
 
-    if _CTY_RESOLVER is not None and _CTY_RESOLVER_PATH == path and _CTY_RESOLVER_MTIME == mtime:
-        return _CTY_RESOLVER
+    if loaded and state[1] == mtime:
+        return state[2]
 
-    _CTY_RESOLVER = load_cty_resolver(path)
-    _CTY_RESOLVER_PATH = path
-    _CTY_RESOLVER_MTIME = mtime
-    return _CTY_RESOLVER
+    resolver = load_cty_resolver(path)
+    prepared = prepare(resolver) if prepare is not None else None
+    with _CTY_STATE_LOCK:
+        _CTY_STATE = (path, mtime, resolver, prepared)
+    return resolver
+
+
+def get_cty_resolver(path: Path = CTY_CACHE_PATH) -> CtyResolver | None:
+    """Return the loaded resolver without touching the file, run_cty_refresh_loop swaps in new versions."""
+    state = _CTY_STATE
+    if state is not None and state[0] == path:
+        return state[2]
+    return reload_cty_resolver(path)
+
+
+def get_prepared_cty_resolver(prepare, path: Path = CTY_CACHE_PATH) -> tuple[CtyResolver | None, Any]:
+    """
+    Return the loaded resolver and what prepare built from it, read from one state so they always match.
+
+    A resolver loaded without prepare has it built here once and stored with the resolver.
+    """
+    global _CTY_STATE
+
+    resolver = get_cty_resolver(path)
+    state = _CTY_STATE
+    if resolver is None or state is None or state[2] is not resolver:
+        return resolver, None if resolver is None else prepare(resolver)
+    if state[3] is not None:
+        return resolver, state[3]
+
+    prepared = prepare(resolver)
+    with _CTY_STATE_LOCK:
+        if _CTY_STATE is state:
+            _CTY_STATE = (*state[:3], prepared)
+    return resolver, prepared
 
 
 def resolve_country_from_cty(callsign: str, path: Path = CTY_CACHE_PATH) -> tuple[str, str] | None:
@@ -268,12 +558,12 @@ def resolve_dxcc_from_cty(callsign: str, path: Path = CTY_CACHE_PATH) -> tuple[i
     return resolver.resolve(callsign)
 
 
-async def ensure_cty_available(http_client: httpx.AsyncClient | None = None) -> CtyResolver:
+async def ensure_cty_available(http_client: httpx.AsyncClient | None = None, prepare=None) -> CtyResolver:
     cache_result = await refresh_cty_cache(http_client=http_client)
     if not cache_result.available:
         raise RuntimeError(f"CTY file is unavailable: {cache_result.message}")
 
-    resolver = get_cty_resolver()
+    resolver = reload_cty_resolver(cache_result.path, prepare)
     if resolver is None:
         raise RuntimeError(f"CTY resolver is unavailable: {cache_result.path}")
     return resolver
@@ -302,6 +592,18 @@ def _conditional_headers(cache_path: Path, metadata: dict[str, Any]) -> dict[str
     return headers
 
 
+def _replace_file(path: Path, data: bytes) -> None:
+    """Write data through a temporary file unique to this writer, every worker writes the same paths."""
+    file = tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False)
+    try:
+        with file:
+            file.write(data)
+        os.replace(file.name, path)
+    except BaseException:
+        os.unlink(file.name)
+        raise
+
+
 def _write_metadata(metadata_path: Path, response: httpx.Response, url: str) -> None:
     metadata_path.parent.mkdir(parents=True, exist_ok=True)
     metadata = {
@@ -311,7 +613,7 @@ def _write_metadata(metadata_path: Path, response: httpx.Response, url: str) ->
         "content_length": len(response.content),
         "downloaded_at": time.time(),
     }
-    metadata_path.write_text(json.dumps(metadata, indent=2, sort_keys=True) + "\n")
+    _replace_file(metadata_path, (json.dumps(metadata, indent=2, sort_keys=True) + "\n").encode())
 
 
 async def _get_cty_file(
@@ -351,9 +653,7 @@ async def refresh_cty_cache(
             raise ValueError("downloaded CTY file is empty")
 
         cache_path.parent.mkdir(parents=True, exist_ok=True)
-        tmp_path = cache_path.with_name(f"{cache_path.name}.tmp")
-        tmp_path.write_bytes(response.content)
-        tmp_path.replace(cache_path)
+        _replace_file(cache_path, response.content)
         _write_metadata(metadata_path, response, CTY_URL)
 
         logger.info(f"Downloaded CTY file to {cache_path}")
@@ -380,3 +680,32 @@ async def refresh_cty_cache(
             downloaded=False,
             message=f"no CTY file available after refresh failure: {e}",
         )
+
+
+async def run_cty_refresh_loop(
+    valkey_client,
+    metrics_prefix: str,
+    http_client: httpx.AsyncClient | None = None,
+    prepare=None,
+    interval: float = CTY_REFRESH_INTERVAL,
+):
+    """Download a new CTY file when the server has one and swap in its resolver, built on a worker thread."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            cache_result = await refresh_cty_cache(http_client=http_client)
+            if not cache_result.available:
+                continue
+
+            previous = get_cty_resolver(cache_result.path)
+            started = time.monotonic()
+            resolver = await asyncio.to_thread(reload_cty_resolver, cache_result.path, prepare)
+            metrics = {f"{metrics_prefix}:last_cty_refresh": str(time.time())}
+            if resolver is not previous:
+                swap_ms = round((time.monotonic() - started) * 1000, 1)
+                metrics[f"{metrics_prefix}:cty_swap_ms"] = swap_ms
+                logger.info(f"Swapped in the refreshed CTY resolver in {swap_ms} ms")
+            await set_values(valkey_client, metrics)
+        except Exception as e:
+            logger.exception("Failed to refresh the CTY resolver")
+            await push_exception_event(valkey_client, metrics_prefix, f"cty refresh: {e}")
@@ -1,12 +1,14 @@
 from datetime import date, datetime, time
 from typing import Optional
 
-from sqlalchemy import Index, UniqueConstraint
+from sqlalchemy import BigInteger, Index, UniqueConstraint
 from sqlmodel import Field, SQLModel
 
 
 class GeoCache(SQLModel, table=True):
     __tablename__ = "geo_cache"
+    __table_args__ = (Index("ix_geo_cache_hit_count", "hit_count"),)
+
     callsign: str = Field(primary_key=True)
     locator: str
     lat: str
@@ -16,6 +18,11 @@ class GeoCache(SQLModel, table=True):
     date: date
     time: time
     date_time: datetime
+    locator_source: Optional[str] = None
+    state: Optional[str] = None
+    cq_zone: Optional[int] = None
+    itu_zone: Optional[int] = None
+    hit_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
 
 class PropagationMeasurement(SQLModel, table=True):
@@ -34,9 +41,15 @@ class PropagationMeasurement(SQLModel, table=True):
 
 class HolySpot(SQLModel, table=True):
     __tablename__ = "holy_spots2"
-    __table_args__ = (UniqueConstraint("time", "spotter_callsign", "dx_callsign", name="uc_holy_spots2"),)
+    __table_args__ = (
+        # timestamp is part of the key because a partitioned holy_spots2 requires its partition key in it.
+        UniqueConstraint("time", "spotter_callsign", "dx_callsign", "timestamp", name="uc_holy_spots2"),
+        Index("ix_holy_spots2_timestamp", "timestamp"),
+        Index("ix_holy_spots2_seq", "seq"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
+    seq: Optional[int] = Field(default=None, sa_type=BigInteger)
     cluster: str
     time: time
     timestamp: int
@@ -1,19 +1,45 @@
+import asyncio
 import json
-from dataclasses import replace
+import time
+from dataclasses import dataclass, replace
+from functools import partial
 
+from loguru import logger
 from pydantic import BaseModel
+from redis.exceptions import ResponseError
 
 from shared.coordinates import coordinates_to_locator, locator_to_coordinates
-from shared.cty import CtyCountry, get_cty_resolver
-from shared.qrz import get_locator_from_qrz
+from shared.cty import CtyCountry, CtyResolver, get_cty_resolver, get_prepared_cty_resolver
+from shared.geo_cache import GeoCacheStats, TTLCache
+from shared.metrics import set_values
+from shared.qrz import QrzUnavailableError, get_locator_from_qrz
+
+LOCAL_GEO_CACHE_MAX_SIZE = 20000
+LOCAL_GEO_CACHE_TTL = 300
+NEGATIVE_GEO_CACHE_TTL = 300
+GEO_BATCH_CONCURRENCY = 16
+GEO_CACHE_KEY_PREFIX = "geo:"
+# Time until which keys from before the geo: namespace may still exist, set once by the first process using geo: keys.
+LEGACY_GEO_KEYS_UNTIL_KEY = "geo_cache:legacy_keys_until"
+GEO_CACHE_FORMAT_VERSION = "1"
+_LOCATOR_SOURCE_CODES = {"qrz": "q", "cty": "c"}
+_LOCATOR_SOURCES = {code: source for source, code in _LOCATOR_SOURCE_CODES.items()}
 
 
 class GeoException(Exception):
-    def __init__(self, callsign: str, callsign_type: str, data_type: str, notify_monitor: bool = True):
+    def __init__(
+        self,
+        callsign: str,
+        callsign_type: str,
+        data_type: str,
+        notify_monitor: bool = True,
+        cacheable: bool = True,
+    ):
         self.callsign = callsign
         self.callsign_type = callsign_type
         self.data_type = data_type
         self.notify_monitor = notify_monitor
+        self.cacheable = cacheable
 
 
 class GeoData(BaseModel):
@@ -30,6 +56,152 @@ class GeoData(BaseModel):
     itu_zone: int | None = None
 
 
+@dataclass(frozen=True)
+class _NegativeGeoResult:
+    data_type: str
+    notify_monitor: bool
+
+
+# Decoded GeoData, or the failure of the last lookup, in front of the Valkey cache.
+_local_geo_cache = TTLCache(LOCAL_GEO_CACHE_MAX_SIZE, LOCAL_GEO_CACHE_TTL)
+_local_geo_cache_resolver = None
+_negative_geo_cache_ttl = NEGATIVE_GEO_CACHE_TTL
+_in_flight_geo_lookups: dict[str, asyncio.Task] = {}
+# Optional durable tier, told about every fresh lookup and every cache hit so it can persist them.
+_durable_geo_cache = None
+_legacy_geo_keys_until: float | None = None
+geo_cache_stats = GeoCacheStats()
+
+
+def configure_local_geo_cache(max_size: int, ttl: float, negative_ttl: float):
+    global _local_geo_cache, _negative_geo_cache_ttl
+    _local_geo_cache = TTLCache(max_size, ttl)
+    _negative_geo_cache_ttl = negative_ttl
+
+
+def configure_durable_geo_cache(durable_cache):
+    """Register an object with record_lookup(callsign, geo_data) and record_hit(callsign) methods, or None."""
+    global _durable_geo_cache
+    _durable_geo_cache = durable_cache
+
+
+def _get_local_geo_cache() -> TTLCache:
+    """Return the local cache, emptied whenever the CTY resolver was reloaded so DXCC data stays current."""
+    global _local_geo_cache_resolver
+    cty_resolver = get_cty_resolver()
+    if cty_resolver is not _local_geo_cache_resolver:
+        _local_geo_cache.clear()
+        _local_geo_cache_resolver = cty_resolver
+    return _local_geo_cache
+
+
+def geo_cache_key(callsign: str) -> str:
+    return f"{GEO_CACHE_KEY_PREFIX}{callsign}"
+
+
+async def _reading_legacy_geo_keys(valkey_client, geo_expiration: int) -> bool:
+    """
+    Keys from before the geo: namespace expire at most geo_expiration seconds after the first process
+    using geo: keys started. That time is stored once in Valkey, so later restarts do not read them again.
+    """
+    global _legacy_geo_keys_until
+    if _legacy_geo_keys_until is None:
+        until = time.time() + geo_expiration
+        stored_until = await valkey_client.set(LEGACY_GEO_KEYS_UNTIL_KEY, until, nx=True, get=True)
+        _legacy_geo_keys_until = float(stored_until) if stored_until is not None else until
+    return time.time() < _legacy_geo_keys_until
+
+
+async def _get_legacy_geo_value(valkey_client, callsign: str) -> str | None:
+    """Read the legacy bare callsign key, a key of another type under the same name is a miss."""
+    try:
+        return await valkey_client.get(callsign)
+    except ResponseError:
+        return None
+
+
+def encode_geo_cache_value(geo_data: GeoData) -> str:
+    """
+    Encode geo data as `version|source|locator|lat|lon|state|cq_zone|itu_zone`.
+
+    The DXCC fields are left out, they are resolved again from CTY on read so a CTY update
+    applies to cached callsigns as well.
+    """
+    return "|".join(
+        (
+            GEO_CACHE_FORMAT_VERSION,
+            _LOCATOR_SOURCE_CODES.get(geo_data.locator_source, geo_data.locator_source),
+            geo_data.locator,
+            repr(geo_data.lat),
+            repr(geo_data.lon),
+            geo_data.state.replace("|", ""),
+            "" if geo_data.cq_zone is None else str(geo_data.cq_zone),
+            "" if geo_data.itu_zone is None else str(geo_data.itu_zone),
+        )
+    )
+
+
+def _parse_geo_cache_value(value: str) -> dict:
+    if value.startswith("{"):
+        # Written before the compact encoding.
+        return json.loads(value)
+
+    version, locator_source, locator, lat, lon, state, cq_zone, itu_zone = value.split("|")
+    if version != GEO_CACHE_FORMAT_VERSION:
+        raise ValueError(f"unknown geo cache format {version}")
+    return {
+        "locator_source": _LOCATOR_SOURCES.get(locator_source, locator_source),
+        "locator": locator,
+        "lat": float(lat),
+        "lon": float(lon),
+        "state": state,
+        "cq_zone": int(cq_zone) if cq_zone else None,
+        "itu_zone": int(itu_zone) if itu_zone else None,
+    }
+
+
+def decode_geo_cache_value(callsign: str, callsign_type: str, value: str | dict) -> GeoData:
+    """Decode a cached value, raising ValueError if it is not in a known format."""
+    geo_data = _parse_geo_cache_value(value) if isinstance(value, str) else dict(value)
+    cty_country = resolve_dxcc_entity(callsign, callsign_type)
+    geo_data["dxcc_code"] = cty_country.dxcc_code
+    geo_data["country"] = cty_country.country
+    geo_data["continent"] = cty_country.continent
+    geo_data["cached"] = True
+    return GeoData(**geo_data)
+
+
+def _read_cached_geo_data(callsign: str, callsign_type: str, value: str | None) -> GeoData | None:
+    if not value:
+        return None
+    try:
+        return decode_geo_cache_value(callsign, callsign_type, value)
+    except (ValueError, TypeError):
+        logger.warning(f"Ignoring unreadable geo cache value of {callsign}: {value!r}")
+        return None
+
+
+async def _read_legacy_geo_data(
+    valkey_client, callsign: str, callsign_type: str, value: str | None, geo_expiration: int
+) -> GeoData | None:
+    """Decode a value under the legacy bare callsign key and copy it to its geo: key."""
+    geo_data = _read_cached_geo_data(callsign, callsign_type, value)
+    if geo_data is not None:
+        await valkey_client.set(geo_cache_key(callsign), encode_geo_cache_value(geo_data), ex=geo_expiration)
+    return geo_data
+
+
+def seed_local_geo_cache(callsign: str, geo_data: GeoData, ttl: float | None = None):
+    """Put geo data loaded from another tier into the local cache."""
+    local_cache = _get_local_geo_cache()
+    local_cache.set(callsign, geo_data, ttl=local_cache.ttl if ttl is None else min(local_cache.ttl, ttl))
+
+
+async def report_geo_cache_metrics(valkey_client, prefix: str):
+    await set_values(valkey_client, geo_cache_stats.metrics(prefix))
+    geo_cache_stats.reset()
+
+
 _DXCC_OVERRIDES_BY_CALLSIGN = {
     "2R0PLA": (223, "England", "EU"),
     "4U5ITU": (117, "ITU HQ", "EU"),
@@ -60,35 +232,38 @@ _DXCC_OVERRIDES_BY_PREFIX = {
 }
 
 
-def _resolve_dxcc_override(callsign: str) -> tuple[int, str, str] | None:
-    callsign = callsign.upper()
-    if callsign in _DXCC_OVERRIDES_BY_CALLSIGN:
-        return _DXCC_OVERRIDES_BY_CALLSIGN[callsign]
-    for prefix, dxcc_code in _DXCC_OVERRIDES_BY_PREFIX.items():
-        if callsign.startswith(prefix):
-            return dxcc_code
-    return None
+def _build_override_entity(cty_resolver: CtyResolver, override: tuple[int, str, str]) -> CtyCountry | None:
+    dxcc_code, country, continent = override
+    cty_country = cty_resolver.get_any_entity_by_dxcc_code(dxcc_code)
+    if cty_country is None:
+        return None
+    return replace(cty_country, country=country, continent=continent)
 
 
-def _resolve_cty_entity(callsign: str) -> CtyCountry | None:
-    cty_resolver = get_cty_resolver()
+def prepare_cty_resolver(cty_resolver: CtyResolver) -> CtyResolver:
+    """Compile the DXCC overrides into a CTY resolver, usable on a worker thread before the resolver is swapped in."""
+    return cty_resolver.with_overrides(
+        {
+            callsign: _build_override_entity(cty_resolver, override)
+            for callsign, override in _DXCC_OVERRIDES_BY_CALLSIGN.items()
+        },
+        {
+            prefix: _build_override_entity(cty_resolver, override)
+            for prefix, override in _DXCC_OVERRIDES_BY_PREFIX.items()
+        },
+    )
+
+
+def _get_override_resolver() -> CtyResolver:
+    """Return the CTY resolver with the DXCC overrides compiled in, swapped in together with the CTY resolver."""
+    cty_resolver, override_resolver = get_prepared_cty_resolver(prepare_cty_resolver)
     if cty_resolver is None:
         raise RuntimeError("CTY resolver is unavailable")
+    return override_resolver
 
-    dxcc_override = _resolve_dxcc_override(callsign)
-    if dxcc_override is not None:
-        dxcc_code, country, continent = dxcc_override
-        cty_country = cty_resolver.get_entity_by_dxcc_code(dxcc_code)
-        if cty_country is None:
-            cty_country = next(
-                (entity for entity in cty_resolver.prefixes.values() if entity.dxcc_code == dxcc_code),
-                None,
-            )
-        if cty_country is None:
-            return None
-        return replace(cty_country, country=country, continent=continent)
 
-    return cty_resolver.resolve_entity(callsign)
+def _resolve_cty_entity(callsign: str) -> CtyCountry | None:
+    return _get_override_resolver().resolve_callsign(callsign)
 
 
 def resolve_dxcc_entity(
@@ -122,6 +297,33 @@ def resolve_country_and_continent(
     return cty_country.country, cty_country.continent
 
 
+def _get_local_geo_data(local_cache: TTLCache, callsign: str, callsign_type: str) -> GeoData | None:
+    """Return the locally cached geo data, raise the cached failure, or return None on a miss."""
+    local_geo_data = local_cache.get(callsign)
+    if isinstance(local_geo_data, GeoData):
+        geo_cache_stats.local_hits += 1
+        if _durable_geo_cache is not None:
+            _durable_geo_cache.record_hit(callsign)
+        return local_geo_data
+    if isinstance(local_geo_data, _NegativeGeoResult):
+        geo_cache_stats.local_negative_hits += 1
+        raise GeoException(
+            callsign, callsign_type, local_geo_data.data_type, notify_monitor=local_geo_data.notify_monitor
+        )
+    return None
+
+
+def _remember_geo_data(local_cache: TTLCache, callsign: str, geo_data: GeoData, geo_expiration: int):
+    if _durable_geo_cache is not None:
+        if geo_data.cached:
+            _durable_geo_cache.record_hit(callsign)
+        else:
+            _durable_geo_cache.record_lookup(callsign, geo_data)
+
+    local_geo_data = geo_data if geo_data.cached else geo_data.model_copy(update={"cached": True})
+    local_cache.set(callsign, local_geo_data, ttl=min(local_cache.ttl, geo_expiration))
+
+
 async def get_geo_details(
     valkey_client,
     qrz_session_key: str,
@@ -130,22 +332,173 @@ async def get_geo_details(
     http_client,
     callsign_type,
 ) -> GeoData:
+    local_cache = _get_local_geo_cache()
+    local_geo_data = _get_local_geo_data(local_cache, callsign, callsign_type)
+    if local_geo_data is not None:
+        return local_geo_data
+
+    try:
+        geo_data, cacheable = await _get_geo_details_single_flight(
+            valkey_client, qrz_session_key, callsign, geo_expiration, http_client, callsign_type
+        )
+    except GeoException as e:
+        if e.cacheable:
+            local_cache.set(callsign, _NegativeGeoResult(e.data_type, e.notify_monitor), ttl=_negative_geo_cache_ttl)
+        raise
+
+    if cacheable:
+        _remember_geo_data(local_cache, callsign, geo_data, geo_expiration)
+    return geo_data
+
+
+async def get_geo_details_batch(
+    valkey_client,
+    qrz_session_key: str,
+    callsigns: list[str],
+    geo_expiration: int,
+    http_client,
+    callsign_type,
+    concurrency: int = GEO_BATCH_CONCURRENCY,
+) -> tuple[dict[str, GeoData], dict[str, Exception]]:
+    """
+    Resolve many callsigns, returning the geo data and the error of each callsign that failed.
+
+    Valkey is read with one MGET for everything the local cache misses, and only the remaining
+    misses go through get_geo_details, at most concurrency at a time.
+    """
+    results: dict[str, GeoData] = {}
+    errors: dict[str, Exception] = {}
+    local_cache = _get_local_geo_cache()
+
+    pending = []
+    for callsign in dict.fromkeys(callsigns):
+        try:
+            local_geo_data = _get_local_geo_data(local_cache, callsign, callsign_type)
+        except GeoException as e:
+            errors[callsign] = e
+            continue
+        if local_geo_data is not None:
+            results[callsign] = local_geo_data
+        else:
+            pending.append(callsign)
+
+    cached_values = [None] * len(pending)
+    legacy_values = [None] * len(pending)
+    if pending and valkey_client is not None:
+        try:
+            cached_values = await valkey_client.mget([geo_cache_key(callsign) for callsign in pending])
+            if not all(cached_values) and await _reading_legacy_geo_keys(valkey_client, geo_expiration):
+                legacy_values = await valkey_client.mget(pending)
+        except Exception:
+            logger.warning(f"Failed to read {len(pending)} geo cache keys, resolving them one by one", exc_info=True)
+
+    misses = []
+    for callsign, cached_value, legacy_value in zip(pending, cached_values, legacy_values):
+        try:
+            geo_data = _read_cached_geo_data(callsign, callsign_type, cached_value)
+            if geo_data is None and legacy_value:
+                geo_data = await _read_legacy_geo_data(
+                    valkey_client, callsign, callsign_type, legacy_value, geo_expiration
+                )
+        except GeoException as e:
+            errors[callsign] = e
+            continue
+        if geo_data is None:
+            misses.append(callsign)
+            continue
+        geo_cache_stats.valkey_hits += 1
+        _remember_geo_data(local_cache, callsign, geo_data, geo_expiration)
+        results[callsign] = geo_data
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve_miss(callsign: str):
+        async with semaphore:
+            try:
+                results[callsign] = await get_geo_details(
+                    valkey_client, qrz_session_key, callsign, geo_expiration, http_client, callsign_type
+                )
+            except Exception as e:
+                errors[callsign] = e
+
+    await asyncio.gather(*(resolve_miss(callsign) for callsign in misses))
+    return results, errors
+
+
+def _finish_geo_lookup(callsign: str, task: asyncio.Task):
+    if _in_flight_geo_lookups.get(callsign) is task:
+        del _in_flight_geo_lookups[callsign]
+    # Mark the exception as retrieved, the callers that wanted it may all have been cancelled.
+    if not task.cancelled():
+        task.exception()
+
+
+async def _get_geo_details_single_flight(
+    valkey_client,
+    qrz_session_key: str,
+    callsign: str,
+    geo_expiration: int,
+    http_client,
+    callsign_type,
+) -> tuple[GeoData, bool]:
+    """Share one Valkey and QRZ lookup between all concurrent callers missing the local cache for a callsign."""
+    task = _in_flight_geo_lookups.get(callsign)
+    if task is None:
+        task = asyncio.create_task(
+            _get_geo_details_from_valkey_or_qrz(
+                valkey_client, qrz_session_key, callsign, geo_expiration, http_client, callsign_type
+            )
+        )
+        _in_flight_geo_lookups[callsign] = task
+        task.add_done_callback(partial(_finish_geo_lookup, callsign))
+    else:
+        geo_cache_stats.coalesced_lookups += 1
+
+    try:
+        # Shielded so a cancelled caller does not cancel the lookup for the others.
+        return await asyncio.shield(task)
+    except GeoException as e:
+        if e.callsign_type == callsign_type:
+            raise
+        raise GeoException(
+            callsign, callsign_type, e.data_type, notify_monitor=e.notify_monitor, cacheable=e.cacheable
+        ) from e
+
+
+async def _get_geo_details_from_valkey_or_qrz(
+    valkey_client,
+    qrz_session_key: str,
+    callsign: str,
+    geo_expiration: int,
+    http_client,
+    callsign_type,
+) -> tuple[GeoData, bool]:
+    """Return the geo data and whether it may be cached, data built while QRZ is unavailable is not."""
     # Get geo details from cache
+    geo_data = None
     if valkey_client is not None:
-        geo_data = await valkey_client.get(callsign)
-    else:
-        geo_data = None
+        geo_data = _read_cached_geo_data(callsign, callsign_type, await valkey_client.get(geo_cache_key(callsign)))
+        if geo_data is None and await _reading_legacy_geo_keys(valkey_client, geo_expiration):
+            geo_data = await _read_legacy_geo_data(
+                valkey_client,
+                callsign,
+                callsign_type,
+                await _get_legacy_geo_value(valkey_client, callsign),
+                geo_expiration,
+            )
 
-    if geo_data:
-        geo_data = json.loads(geo_data)
-        cty_country = resolve_dxcc_entity(callsign, callsign_type)
-        geo_data["dxcc_code"] = cty_country.dxcc_code
-        geo_data["country"] = cty_country.country
-        geo_data["continent"] = cty_country.continent
-        geo_data["cached"] = True
-        return GeoData(**geo_data)
+    if geo_data is not None:
+        geo_cache_stats.valkey_hits += 1
+        return geo_data, True
 
-    qrz_locator_dict = await get_locator_from_qrz(qrz_session_key, callsign, http_client)
+    geo_cache_stats.misses += 1
+    try:
+        qrz_locator_dict = await get_locator_from_qrz(qrz_session_key, callsign, http_client)
+        cacheable = True
+    except QrzUnavailableError as e:
+        logger.debug(f"Using CTY for {callsign}: {e}")
+        qrz_locator_dict = {}
+        cacheable = False
 
     locator = qrz_locator_dict.get("locator")
     state = qrz_locator_dict.get("state")
@@ -167,26 +520,27 @@ async def get_geo_details(
                 callsign_type,
                 "locator",
                 notify_monitor=cty_country is not None,
+                cacheable=cacheable,
             )
 
     if cty_country is None:
         cty_country = resolve_dxcc_entity(callsign, callsign_type)
     lat, lon = locator_to_coordinates(locator)
 
-    geo_data = {
-        "locator_source": locator_source,
-        "locator": locator,
-        "lat": lat,
-        "lon": lon,
-        "dxcc_code": cty_country.dxcc_code,
-        "country": cty_country.country,
-        "continent": cty_country.continent,
-        "state": state or "",
-        "cq_zone": cq_zone,
-        "itu_zone": itu_zone,
-    }
-    if valkey_client is not None:
-        await valkey_client.set(callsign, json.dumps(geo_data), ex=geo_expiration)
-    geo_data["cached"] = False
+    geo_data = GeoData(
+        cached=False,
+        locator_source=locator_source,
+        locator=locator,
+        lat=lat,
+        lon=lon,
+        dxcc_code=cty_country.dxcc_code,
+        country=cty_country.country,
+        continent=cty_country.continent,
+        state=state or "",
+        cq_zone=cq_zone,
+        itu_zone=itu_zone,
+    )
+    if valkey_client is not None and cacheable:
+        await valkey_client.set(geo_cache_key(callsign), encode_geo_cache_value(geo_data), ex=geo_expiration)
 
-    return GeoData(**geo_data)
+    return geo_data, cacheable
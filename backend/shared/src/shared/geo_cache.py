@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+MISSING = object()
+
+
+class TTLCache:
+    """A bounded LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, max_size: int, ttl: float, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str):
+        """Return the cached value, or MISSING if the key is absent or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return MISSING
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: float | None = None):
+        self._entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+@dataclass
+class GeoCacheStats:
+    """Lookup counters of the geo cache tiers since the last report."""
+
+    local_hits: int = 0
+    local_negative_hits: int = 0
+    valkey_hits: int = 0
+    misses: int = 0
+    coalesced_lookups: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.local_hits + self.local_negative_hits + self.valkey_hits + self.misses + self.coalesced_lookups
+
+    def metrics(self, prefix: str) -> dict:
+        lookups = self.lookups
+        valkey_lookups = self.valkey_hits + self.misses
+        return {
+            f"{prefix}:geo_lookups": lookups,
+            f"{prefix}:geo_local_hit_ratio": (
+                round((self.local_hits + self.local_negative_hits) / lookups, 4) if lookups else 0
+            ),
+            f"{prefix}:geo_valkey_hit_ratio": round(self.valkey_hits / valkey_lookups, 4) if valkey_lookups else 0,
+            f"{prefix}:geo_coalesced_lookups": self.coalesced_lookups,
+        }
+
+    def reset(self):
+        self.local_hits = 0
+        self.local_negative_hits = 0
+        self.valkey_hits = 0
+        self.misses = 0
+        self.coalesced_lookups = 0
@@ -1,3 +1,4 @@
+import bisect
 import json
 import time
 
@@ -6,10 +7,52 @@ import redis.asyncio
 PREFIX = "monitor"
 
 
+class LatencyHistogram:
+    """Counts latencies into fixed millisecond buckets, reported and reset periodically."""
+
+    BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, seconds * 1000)] += 1
+
+    def percentile(self, fraction: float) -> float | None:
+        """Return the upper bound in ms of the bucket holding the given fraction, inf for the overflow bucket."""
+        total = sum(self.counts)
+        if total == 0:
+            return None
+        threshold = fraction * total
+        seen = 0
+        for bound, count in zip((*self.BUCKETS_MS, float("inf")), self.counts):
+            seen += count
+            if seen >= threshold:
+                return bound
+        return float("inf")
+
+    def metrics(self, key: str) -> dict:
+        metrics = {f"{key}:count": sum(self.counts)}
+        for bound, count in zip(self.BUCKETS_MS, self.counts):
+            metrics[f"{key}:bucket_{bound}ms"] = count
+        metrics[f"{key}:bucket_inf"] = self.counts[-1]
+        for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            value = self.percentile(fraction)
+            metrics[f"{key}:{name}"] = "" if value is None else value
+        return metrics
+
+    def reset(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+
+
 async def set_timestamp(valkey: redis.asyncio.Redis, key: str):
     await valkey.set(f"{PREFIX}:{key}", str(time.time()))
 
 
+def queue_timestamp(pipeline: redis.asyncio.client.Pipeline, key: str):
+    pipeline.set(f"{PREFIX}:{key}", str(time.time()))
+
+
 async def incr_counter(valkey: redis.asyncio.Redis, key: str):
     await valkey.incr(f"{PREFIX}:{key}")
 
@@ -18,6 +61,48 @@ async def set_value(valkey: redis.asyncio.Redis, key: str, value):
     await valkey.set(f"{PREFIX}:{key}", str(value))
 
 
+async def set_values(valkey: redis.asyncio.Redis, values: dict):
+    await valkey.mset({f"{PREFIX}:{key}": str(value) for key, value in values.items()})
+
+
+def queue_values(pipeline: redis.asyncio.client.Pipeline, values: dict):
+    pipeline.mset({f"{PREFIX}:{key}": str(value) for key, value in values.items()})
+
+
+# Stores one worker's value, prunes the workers whose expiry passed and sums the rest, in one atomic call.
+# KEYS: values hash, expiry sorted set and the total key. ARGV: worker ID, value, current time and ttl.
+REPORT_WORKER_VALUE_SCRIPT = """
+redis.call("HSET", KEYS[1], ARGV[1], ARGV[2])
+redis.call("ZADD", KEYS[2], tonumber(ARGV[3]) + tonumber(ARGV[4]), ARGV[1])
+local expired = redis.call("ZRANGEBYSCORE", KEYS[2], "-inf", ARGV[3])
+if #expired > 0 then
+    redis.call("ZREMRANGEBYSCORE", KEYS[2], "-inf", ARGV[3])
+    redis.call("HDEL", KEYS[1], unpack(expired))
+end
+local total = 0
+for _, worker_value in ipairs(redis.call("HVALS", KEYS[1])) do
+    total = total + tonumber(worker_value)
+end
+redis.call("EXPIRE", KEYS[1], ARGV[4])
+redis.call("EXPIRE", KEYS[2], ARGV[4])
+redis.call("SET", KEYS[3], total)
+return total
+"""
+
+
+async def report_worker_value(valkey: redis.asyncio.Redis, key: str, worker_id: str, value: int, ttl: int) -> int:
+    """
+    Publish one worker's value and store the sum over all live workers under key.
+
+    Values are kept in one hash and their expiry times in a sorted set, so the live workers
+    are found without scanning the keyspace. Workers that stop reporting drop out after ttl.
+    The update runs as one script, so a worker reporting concurrently is never pruned.
+    """
+    script = valkey.register_script(REPORT_WORKER_VALUE_SCRIPT)
+    keys = [f"{PREFIX}:{key}:workers", f"{PREFIX}:{key}:workers_expiry", f"{PREFIX}:{key}"]
+    return int(await script(keys=keys, args=[worker_id, value, time.time(), ttl]))
+
+
 async def push_drop_event(valkey: redis.asyncio.Redis, reason: str, raw_spot: str):
     event = json.dumps({"reason": reason, "raw_spot": raw_spot, "time": time.time()})
     await valkey.rpush(f"{PREFIX}:collector:drop_events", event)
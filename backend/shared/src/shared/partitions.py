@@ -0,0 +1,81 @@
+from datetime import UTC, date, datetime, timedelta
+
+HOLY_SPOTS_TABLE = "holy_spots2"
+HOLY_SPOTS_DEFAULT_PARTITION = f"{HOLY_SPOTS_TABLE}_default"
+HOLY_SPOTS_PARTITION_PREFIX = f"{HOLY_SPOTS_TABLE}_p"
+PARTITION_PRECREATE_DAYS = 7
+
+IS_PARTITIONED_QUERY = (
+    "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table_name"
+)
+LIST_PARTITIONS_QUERY = (
+    "SELECT child.relname FROM pg_inherits "
+    "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+    "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+    "WHERE parent.relname = :table_name"
+)
+
+
+def day_start_timestamp(day: date) -> int:
+    return int(datetime(day.year, day.month, day.day, tzinfo=UTC).timestamp())
+
+
+def holy_spots_partition_name(day: date) -> str:
+    return f"{HOLY_SPOTS_PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def parse_holy_spots_partition_day(partition_name: str) -> date | None:
+    if not partition_name.startswith(HOLY_SPOTS_PARTITION_PREFIX):
+        return None
+    try:
+        return datetime.strptime(partition_name[len(HOLY_SPOTS_PARTITION_PREFIX) :], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def create_holy_spots_partition_sql(day: date) -> str:
+    start = day_start_timestamp(day)
+    end = day_start_timestamp(day + timedelta(days=1))
+    return (
+        f"CREATE TABLE IF NOT EXISTS {holy_spots_partition_name(day)} "
+        f"PARTITION OF {HOLY_SPOTS_TABLE} FOR VALUES FROM ({start}) TO ({end})"
+    )
+
+
+def split_default_partition_sql(day: date) -> list[str]:
+    """
+    Statements that create the partition of day when the default partition already holds rows of that day.
+
+    PostgreSQL refuses to create a partition whose range has rows in the default partition, so the
+    default partition is detached while its rows of that day move to the new partition.
+    """
+    start = day_start_timestamp(day)
+    end = day_start_timestamp(day + timedelta(days=1))
+    day_rows = f"timestamp >= {start} AND timestamp < {end}"
+    return [
+        f"ALTER TABLE {HOLY_SPOTS_TABLE} DETACH PARTITION {HOLY_SPOTS_DEFAULT_PARTITION}",
+        create_holy_spots_partition_sql(day),
+        f"INSERT INTO {HOLY_SPOTS_TABLE} SELECT * FROM {HOLY_SPOTS_DEFAULT_PARTITION} WHERE {day_rows}",
+        f"DELETE FROM {HOLY_SPOTS_DEFAULT_PARTITION} WHERE {day_rows}",
+        f"ALTER TABLE {HOLY_SPOTS_TABLE} ATTACH PARTITION {HOLY_SPOTS_DEFAULT_PARTITION} DEFAULT",
+    ]
+
+
+def default_partition_has_rows_sql(day: date) -> str:
+    start = day_start_timestamp(day)
+    end = day_start_timestamp(day + timedelta(days=1))
+    return f"SELECT 1 FROM {HOLY_SPOTS_DEFAULT_PARTITION} WHERE timestamp >= {start} AND timestamp < {end} LIMIT 1"
+
+
+def holy_spots_partition_days(first_day: date, last_day: date) -> list[date]:
+    return [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+
+
+def expired_holy_spots_partitions(partition_names: list[str], cutoff_day: date) -> list[str]:
+    """Return the daily partitions whose whole day is before cutoff_day."""
+    expired = []
+    for partition_name in partition_names:
+        day = parse_holy_spots_partition_day(partition_name)
+        if day is not None and day < cutoff_day:
+            expired.append(partition_name)
+    return sorted(expired)
@@ -1,14 +1,133 @@
 import asyncio
+import random
+import time
 import xml.etree.ElementTree as ET
 
 import httpx
 from loguru import logger
 
+from shared.metrics import LatencyHistogram, set_values
 
 QRZ_KEEPALIVE_EXPIRY_SECONDS = 1.0
 HTTPX_DEFAULT_MAX_CONNECTIONS = 100
 HTTPX_DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
 
+QRZ_MAX_ATTEMPTS = 3
+QRZ_BACKOFF_BASE_SECONDS = 0.2
+QRZ_BACKOFF_MAX_SECONDS = 2.0
+# A lookup waits at most this long for the rate limiter before falling back to CTY.
+QRZ_RATE_LIMIT_MAX_WAIT_SECONDS = 2.0
+
+
+class QrzUnavailableError(Exception):
+    """QRZ was not queried or did not answer, the caller should fall back to CTY without caching the result."""
+
+
+class TokenBucket:
+    """
+    A token bucket rate limiter shared by all concurrent callers.
+
+    Callers reserve a token up front and sleep until it is due, so they are served in order.
+    """
+
+    def __init__(self, rate: float, burst: int, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: float) -> float | None:
+        """Reserve a token and return the seconds to wait for it, or None if that would exceed max_wait."""
+        self._refill()
+        wait = max(0.0, (1 - self._tokens) / self.rate)
+        if wait > max_wait:
+            return None
+        self._tokens -= 1
+        return wait
+
+    async def acquire(self, max_wait: float) -> bool:
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for reset_timeout seconds.
+
+    After that a single probe call is let through, and its outcome closes or reopens the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+
+    def allow_request(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("QRZ recovered, closing the circuit breaker")
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def abandon_probe(self):
+        """Reopen after a probe that never got a QRZ response, so the next call probes again."""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            logger.warning(f"QRZ failed {self.failures} times, falling back to CTY for {self.reset_timeout}s")
+            self.state = self.OPEN
+            self._opened_at = self.clock()
+
+
+qrz_rate_limiter = TokenBucket(rate=10.0, burst=20)
+qrz_circuit_breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30.0)
+qrz_latency = LatencyHistogram()
+
+
+def configure_qrz_client(rate: float, burst: int, failure_threshold: int, reset_timeout: float):
+    global qrz_rate_limiter, qrz_circuit_breaker
+    qrz_rate_limiter = TokenBucket(rate=rate, burst=burst)
+    qrz_circuit_breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+
+
+async def report_qrz_metrics(valkey_client, prefix: str):
+    metrics = qrz_latency.metrics(f"{prefix}:qrz_latency_ms")
+    metrics[f"{prefix}:qrz_breaker_state"] = qrz_circuit_breaker.state
+    await set_values(valkey_client, metrics)
+    qrz_latency.reset()
+
+
+def qrz_backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(QRZ_BACKOFF_MAX_SECONDS, QRZ_BACKOFF_BASE_SECONDS * 2**attempt))
+
 
 class QrzSessionManager:
     def __init__(
@@ -137,58 +256,45 @@ async def get_locator_from_qrz(qrz_session_key: str, callsign: str, http_client:
 
     url = f"https://xmldata.qrz.com/xml/current/?s={qrz_session_key};callsign={callsign}"
 
-    retries = 0
-    response = None
-    max_retries = 5
-    while response is None:
+    # The breaker goes first, so an outage fails fast instead of waiting for a token.
+    if not qrz_circuit_breaker.allow_request():
+        raise QrzUnavailableError("QRZ circuit breaker is open")
+    try:
+        acquired = await qrz_rate_limiter.acquire(QRZ_RATE_LIMIT_MAX_WAIT_SECONDS)
+    except BaseException:
+        qrz_circuit_breaker.abandon_probe()
+        raise
+    if not acquired:
+        qrz_circuit_breaker.abandon_probe()
+        raise QrzUnavailableError("QRZ rate limit exceeded")
+
+    attempt = 0
+    while True:
+        started = time.monotonic()
         try:
             response = await http_client.get(url, timeout=5)
             response.raise_for_status()
-        except httpx.TimeoutException as e:
-            if retries == max_retries:
-                raise type(e)(f"xmldata.qrz.com timeout: {e}") from e
-            else:
-                logger.warning("Timeout error, retrying")
-                retries += 1
-        except httpx.NetworkError as e:
-            if retries == max_retries:
-                raise type(e)(f"xmldata.qrz.com network: {e}") from e
-            else:
-                logger.warning("Network error, retrying")
-                retries += 1
-        except httpx.ProtocolError as e:
-            if retries == max_retries:
-                raise type(e)(f"xmldata.qrz.com protocol: {e}") from e
-            else:
-                logger.warning(f"Protocol error, retrying ({retries + 1}/{max_retries}): {type(e).__name__}: {e}")
-                retries += 1
-        except httpx.ProxyError as e:
-            if retries == max_retries:
-                raise type(e)(f"xmldata.qrz.com proxy: {e}") from e
-            else:
-                logger.warning("Proxy error, retrying")
-                retries += 1
-        except httpx.UnsupportedProtocol as e:
-            if retries == max_retries:
-                raise type(e)(f"xmldata.qrz.com unsupported protocol: {e}") from e
-            else:
-                logger.warning("Unsupported protocol error, retrying")
-                retries += 1
-        except httpx.TransportError as e:
-            if retries == max_retries:
-                raise type(e)(f"xmldata.qrz.com transport: {e}") from e
-            else:
-                logger.warning("Transport error, retrying")
-                retries += 1
+            break
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            qrz_latency.observe(time.monotonic() - started)
+            qrz_circuit_breaker.record_failure()
+            attempt += 1
+            if attempt == QRZ_MAX_ATTEMPTS or qrz_circuit_breaker.state != CircuitBreaker.CLOSED:
+                raise QrzUnavailableError(f"xmldata.qrz.com {type(e).__name__}: {e}") from e
 
-    if response.status_code != 200:
-        return {
-            "locator": None,
-            "state": None,
-            "cq_zone": None,
-            "itu_zone": None,
-            "error": f"qrz response code {response.status_code}",
-        }
+            delay = qrz_backoff_delay(attempt)
+            logger.warning(f"QRZ {type(e).__name__}, retrying in {delay:.2f}s ({attempt}/{QRZ_MAX_ATTEMPTS - 1}): {e}")
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            qrz_circuit_breaker.abandon_probe()
+            raise
+        except BaseException:
+            # Any other error still settles a half open probe, or the breaker would never close again.
+            qrz_circuit_breaker.record_failure()
+            raise
+
+    qrz_latency.observe(time.monotonic() - started)
+    qrz_circuit_breaker.record_success()
 
     ns = {"qrz": "http://xmldata.qrz.com"}
     root = ET.fromstring(response.text)
@@ -20,6 +20,9 @@ class PostgresSettings(BaseSettings):
     postgres_port: str = Field(..., description="PostgreSQL port in Docker environment")
     postgres_host_local: str = Field(..., description="PostgreSQL host in local environment")
     postgres_port_local: str = Field(..., description="PostgreSQL port in local environment")
+    postgres_partition_holy_spots: bool = Field(
+        default=False, description="Partition holy_spots2 by day when running the timestamp index migration"
+    )
 
     @property
     def _in_docker(self) -> bool:
@@ -56,6 +59,9 @@ class ValkeySettings(BaseSettings):
 
     valkey_db: str = Field(default="0", description="Valkey database number")
     valkey_geo_expiration: int = Field(default=3600, description="Valkey geo data expiration time in seconds")
+    geo_local_cache_size: int = Field(default=20000, description="Maximum callsigns kept in the in-process geo cache")
+    geo_local_cache_ttl: int = Field(default=300, description="In-process geo cache expiration time in seconds")
+    geo_negative_cache_ttl: int = Field(default=300, description="Seconds a failed geo lookup is cached in-process")
 
     valkey_host: str = Field(..., description="Valkey host in Docker environment")
     valkey_port: int = Field(..., description="Valkey port in Docker environment")
@@ -100,3 +106,9 @@ class QrzSettings(BaseSettings):
     qrz_password: str = Field(..., description="QRZ.com password")
     qrz_api_key: str = Field(..., description="QRZ.com API key")
     qrz_session_key_refresh: int = Field(default=3600, description="QRZ session key refresh interval in seconds")
+    qrz_rate_limit: float = Field(default=10.0, description="Maximum QRZ lookups per second")
+    qrz_rate_limit_burst: int = Field(default=20, description="QRZ lookups allowed in a burst above the rate limit")
+    qrz_breaker_failure_threshold: int = Field(
+        default=5, description="Consecutive failed QRZ lookups before falling back to CTY"
+    )
+    qrz_breaker_reset_seconds: float = Field(default=30.0, description="Seconds before retrying QRZ after it failed")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import string
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "shared" / "src"))
+
+from shared import geo  # noqa: E402
+from shared.cty import CTY_CACHE_PATH, CtyResolver, load_cty_resolver, normalize_callsign  # noqa: E402
+
+
+class LegacyResolver:
+    """The resolver before the prefix trie: one dict lookup per prefix length and linear override scans."""
+
+    def __init__(self, cty_resolver: CtyResolver):
+        self.cty_resolver = cty_resolver
+
+    def _resolve_override(self, callsign: str):
+        callsign = callsign.upper()
+        if callsign in geo._DXCC_OVERRIDES_BY_CALLSIGN:
+            return geo._DXCC_OVERRIDES_BY_CALLSIGN[callsign]
+        for prefix, override in geo._DXCC_OVERRIDES_BY_PREFIX.items():
+            if callsign.startswith(prefix):
+                return override
+        return None
+
+    def _resolve_cty(self, callsign: str):
+        normalized = normalize_callsign(callsign)
+        if not normalized:
+            return None
+        entity = self.cty_resolver.exact_callsigns.get(normalized)
+        if entity is not None:
+            return entity
+        for end in range(len(normalized), 0, -1):
+            entity = self.cty_resolver.prefixes.get(normalized[:end])
+            if entity is not None:
+                return entity
+        return None
+
+    def resolve_entity(self, callsign: str):
+        override = self._resolve_override(callsign)
+        if override is None:
+            return self._resolve_cty(callsign)
+
+        dxcc_code, country, continent = override
+        entity = self.cty_resolver.get_entity_by_dxcc_code(dxcc_code)
+        if entity is None:
+            entity = next(
+                (entity for entity in self.cty_resolver.prefixes.values() if entity.dxcc_code == dxcc_code), None
+            )
+        if entity is None:
+            return None
+        return replace(entity, country=country, continent=continent)
+
+
+def generate_callsigns(cty_resolver: CtyResolver, count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    prefixes = list(cty_resolver.prefixes)
+    exact_callsigns = list(cty_resolver.exact_callsigns)
+    overrides = list(geo._DXCC_OVERRIDES_BY_CALLSIGN) + [f"{prefix}1AB" for prefix in geo._DXCC_OVERRIDES_BY_PREFIX]
+    callsigns = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.05 and exact_callsigns:
+            callsigns.append(rng.choice(exact_callsigns))
+        elif kind < 0.07:
+            callsigns.append(rng.choice(overrides))
+        else:
+            suffix = "".join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 3)))
+            callsign = f"{rng.choice(prefixes)}{rng.randint(0, 9)}{suffix}"
+            if rng.random() < 0.1:
+                callsign += rng.choice(("/P", "/M", "/QRP"))
+            callsigns.append(callsign)
+    return callsigns
+
+
+def benchmark(name: str, resolve, callsigns: list[str], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for callsign in callsigns:
+            resolve(callsign)
+        best = min(best, time.perf_counter() - started)
+    per_lookup_ns = best / len(callsigns) * 1e9
+    print(f"{name:>8}: {per_lookup_ns:8.1f} ns per lookup (best of {rounds})")
+    return per_lookup_ns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the compiled CTY resolver with the legacy prefix loop")
+    parser.add_argument("--cty-path", type=Path, default=CTY_CACHE_PATH, help="Path to cty.csv")
+    parser.add_argument("--callsigns", type=int, default=100000, help="Number of callsigns to resolve")
+    parser.add_argument("--rounds", type=int, default=5, help="Number of timed rounds")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the generated callsigns")
+    args = parser.parse_args()
+
+    if not args.cty_path.exists():
+        sys.exit(f"CTY file not found: {args.cty_path}")
+
+    cty_resolver = load_cty_resolver(args.cty_path)
+    legacy = LegacyResolver(cty_resolver)
+
+    started = time.perf_counter()
+    compiled = geo.prepare_cty_resolver(cty_resolver)
+    print(f"Compiled the override resolver in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    callsigns = generate_callsigns(cty_resolver, args.callsigns, args.seed)
+    mismatches = [
+        callsign for callsign in callsigns if legacy.resolve_entity(callsign) != compiled.resolve_entity(callsign)
+    ]
+    if mismatches:
+        print(f"{len(mismatches)} callsigns resolve differently, e.g. {mismatches[:5]}")
+
+    legacy_ns = benchmark("legacy", legacy.resolve_entity, callsigns, args.rounds)
+    compiled_ns = benchmark("compiled", compiled.resolve_entity, callsigns, args.rounds)
+    print(f"Speedup: {legacy_ns / compiled_ns:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
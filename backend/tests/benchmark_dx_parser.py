@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import argparse
+import gzip
+import random
+import re
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "shared" / "src"))
+sys.path.insert(0, str(Path(__file__).parents[1] / "collectors" / "src"))
+
+from collectors.telnet.client import DX_LINE_PREFIX, parse_dx_line  # noqa: E402
+
+LEGACY_DX_CC_RE = re.compile(r"^DX de (\S+):\s*(\d+\.\d+)\s+(\S+)\s+(.*?)\s+?(\w+) (\d+Z)\s+(\w+)")
+LEGACY_DX_AR_RE = re.compile(r"^DX de (\S+):\s*(\d+\.\d+)\s+(\S+)\s+(.*?)\s+?(\d+Z)")
+
+
+def legacy_parse_dx_line(line: str) -> dict | None:
+    """The parser before the combined regex: one regex per cluster format on the decoded line."""
+    match = LEGACY_DX_CC_RE.match(line.strip())
+    if match:
+        spot = {
+            "spotter_callsign": match.group(1),
+            "frequency": float(match.group(2)),
+            "dx_callsign": match.group(3),
+            "comment": match.group(4).strip(),
+            "dx_locator": match.group(5),
+            "time": match.group(6),
+            "spotter_locator": match.group(7),
+        }
+    else:
+        match = LEGACY_DX_AR_RE.match(line.strip())
+        if match is None:
+            return None
+        spot = {
+            "spotter_callsign": match.group(1),
+            "frequency": float(match.group(2)),
+            "dx_callsign": match.group(3),
+            "comment": match.group(4).strip(),
+            "time": match.group(5),
+            "dx_locator": "",
+            "spotter_locator": "",
+        }
+    spot["spotter_callsign"] = re.sub(r"-\d+$", "", spot["spotter_callsign"])
+    return spot
+
+
+def legacy_parse_chunk(lines: list[bytes]) -> list[dict]:
+    spots = []
+    for line_bytes in lines:
+        line = line_bytes.decode("utf-8", errors="ignore").replace("\r", "")
+        if not line.startswith("DX de"):
+            continue
+        spot = legacy_parse_dx_line(line)
+        if spot is not None:
+            spots.append(spot)
+    return spots
+
+
+def parse_chunk(lines: list[bytes]) -> list[dict]:
+    spots = []
+    for line_bytes in lines:
+        line_bytes = line_bytes.replace(b"\r", b"")
+        if not line_bytes.startswith(DX_LINE_PREFIX):
+            continue
+        spot = parse_dx_line(line_bytes)
+        if spot is not None:
+            spots.append(spot)
+    return spots
+
+
+def read_recorded_lines(log_dir: Path) -> list[bytes]:
+    """Feed lines from the per-host task logs, the message follows the third ' - ' separator."""
+    lines = []
+    for path in sorted(log_dir.rglob("*.log*")):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rb") as file:
+            for record in file:
+                parts = record.rstrip(b"\n").split(b" - ", 3)
+                if len(parts) == 4:
+                    lines.append(parts[3] + b"\r")
+    return lines
+
+
+def generate_lines(count: int, seed: int) -> list[bytes]:
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        spotter = (
+            f"{rng.choice(('K', 'W', 'DL', '4X', 'JA'))}{rng.randint(0, 9)}{rng.choice(string.ascii_uppercase) * 2}"
+        )
+        dx = f"{rng.choice(('EA8', 'VK', 'ZS', 'PY'))}{rng.randint(0, 9)}{rng.choice(string.ascii_uppercase) * 3}"
+        frequency = f"{rng.choice((7000, 14000, 21000)) + rng.randint(0, 300)}.{rng.randint(0, 9)}"
+        comment = rng.choice(("CW 12 dB 25 WPM CQ", "FT8 -10 dB", "", "TNX QSO"))
+        minute = f"{rng.randint(0, 23):02}{rng.randint(0, 59):02}Z"
+        kind = rng.random()
+        if kind < 0.4:
+            line = f"DX de {spotter}-#:  {frequency:>9}  {dx:<12} {comment:<30} {minute}"
+        elif kind < 0.8:
+            line = f"DX de {spotter}-2:  {frequency:>9}  {dx:<12} {comment:<24} KM72 {minute} FN42"
+        else:
+            line = f"WWV de VE7CC <{rng.randint(0, 23)}>:   SFI=150, A=5, K=1, No Storms"
+        lines.append(line.encode() + b"\r")
+    return lines
+
+
+def benchmark(name: str, parse, lines: list[bytes], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        parse(lines)
+        best = min(best, time.perf_counter() - started)
+    per_line_ns = best / len(lines) * 1e9
+    print(f"{name:>8}: {per_line_ns:8.1f} ns per line (best of {rounds})")
+    return per_line_ns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the single-pass DX line parser with the legacy parser")
+    parser.add_argument("--log-dir", type=Path, help="Directory of recorded telnet task logs")
+    parser.add_argument("--lines", type=int, default=100000, help="Number of generated lines without --log-dir")
+    parser.add_argument("--rounds", type=int, default=5, help="Number of timed rounds")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the generated lines")
+    args = parser.parse_args()
+
+    if args.log_dir:
+        lines = read_recorded_lines(args.log_dir)
+        if not lines:
+            sys.exit(f"No recorded telnet lines found in {args.log_dir}")
+    else:
+        lines = generate_lines(args.lines, args.seed)
+    spot_lines = sum(line.startswith(DX_LINE_PREFIX) for line in lines)
+    print(f"{len(lines)} lines, {spot_lines} spot lines")
+
+    legacy_spots = legacy_parse_chunk(lines)
+    spots = parse_chunk(lines)
+    mismatches = [(legacy, spot) for legacy, spot in zip(legacy_spots, spots) if legacy != spot]
+    if len(legacy_spots) != len(spots) or mismatches:
+        print(f"Parsed {len(spots)} spots, legacy {len(legacy_spots)}, {len(mismatches)} differ, e.g. {mismatches[:3]}")
+
+    legacy_ns = benchmark("legacy", legacy_parse_chunk, lines, args.rounds)
+    single_ns = benchmark("single", parse_chunk, lines, args.rounds)
+    print(f"Speedup: {legacy_ns / single_ns:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
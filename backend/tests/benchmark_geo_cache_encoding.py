@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "shared" / "src"))
+
+from shared import geo  # noqa: E402
+from shared.coordinates import locator_to_coordinates  # noqa: E402
+from shared.geo import GeoData  # noqa: E402
+
+
+def generate_geo_data(count: int, seed: int) -> list[tuple[str, GeoData]]:
+    rng = random.Random(seed)
+    entries = []
+    for index in range(count):
+        locator = (
+            rng.choice("ABCDEFGHIJKLMNOPQR")
+            + rng.choice("ABCDEFGHIJKLMNOPQR")
+            + str(rng.randint(0, 9))
+            + str(rng.randint(0, 9))
+            + rng.choice(string.ascii_lowercase[:24])
+            + rng.choice(string.ascii_lowercase[:24])
+        )
+        lat, lon = locator_to_coordinates(locator)
+        callsign = f"{rng.choice(('K', 'W', 'DL', '4X', 'JA', 'VK'))}{rng.randint(0, 9)}{index:X}"
+        entries.append(
+            (
+                callsign,
+                GeoData(
+                    cached=False,
+                    locator_source=rng.choice(("qrz", "qrz", "qrz", "cty")),
+                    locator=locator,
+                    lat=lat,
+                    lon=lon,
+                    dxcc_code=291,
+                    country="United States",
+                    continent="NA",
+                    state=rng.choice(("", "", "CA", "NY", "TX")),
+                    cq_zone=rng.randint(1, 40),
+                    itu_zone=rng.randint(1, 90),
+                ),
+            )
+        )
+    return entries
+
+
+def encode_legacy(geo_data: GeoData) -> str:
+    """The JSON blob stored under the bare callsign before the compact encoding."""
+    return json.dumps(geo_data.model_dump(exclude={"cached"}))
+
+
+def decode_legacy(value: str) -> GeoData:
+    fields = json.loads(value)
+    fields["cached"] = True
+    return GeoData(**fields)
+
+
+def decode_compact(value: str) -> GeoData:
+    fields = geo._parse_geo_cache_value(value)
+    fields.update(dxcc_code=291, country="United States", continent="NA", cached=True)
+    return GeoData(**fields)
+
+
+def benchmark_decode(name: str, decode, values: list[str], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for value in values:
+            decode(value)
+        best = min(best, time.perf_counter() - started)
+    per_value_ns = best / len(values) * 1e9
+    print(f"{name:>8} decode: {per_value_ns:8.1f} ns per value (best of {rounds})")
+    return per_value_ns
+
+
+def measure_valkey_memory(host: str, port: int, entries: list[tuple[str, GeoData]]):
+    import redis
+
+    client = redis.Redis(host=host, port=port, decode_responses=True)
+    key_prefix = "benchmark:geo_encoding"
+    encodings = {
+        "legacy": lambda callsign, geo_data: (f"{key_prefix}:{callsign}", encode_legacy(geo_data)),
+        "compact": lambda callsign, geo_data: (
+            f"{key_prefix}:{geo.geo_cache_key(callsign)}",
+            geo.encode_geo_cache_value(geo_data),
+        ),
+    }
+    try:
+        for name, encode in encodings.items():
+            keys = []
+            with client.pipeline(transaction=False) as pipeline:
+                for callsign, geo_data in entries:
+                    key, value = encode(callsign, geo_data)
+                    keys.append(key)
+                    pipeline.set(key, value, ex=600)
+                pipeline.execute()
+            with client.pipeline(transaction=False) as pipeline:
+                for key in keys:
+                    pipeline.memory_usage(key, samples=0)
+                usage = pipeline.execute()
+            print(f"{name:>8} valkey: {sum(usage) / len(usage):8.1f} bytes per key (MEMORY USAGE)")
+            client.delete(*keys)
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the legacy JSON and compact geo cache encodings")
+    parser.add_argument("--entries", type=int, default=50000, help="Number of cached callsigns")
+    parser.add_argument("--rounds", type=int, default=5, help="Number of timed decode rounds")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the generated entries")
+    parser.add_argument("--valkey-host", help="Also measure MEMORY USAGE on this Valkey server")
+    parser.add_argument("--valkey-port", type=int, default=6379, help="Valkey port")
+    args = parser.parse_args()
+
+    entries = generate_geo_data(args.entries, args.seed)
+    legacy_values = [encode_legacy(geo_data) for _, geo_data in entries]
+    compact_values = [geo.encode_geo_cache_value(geo_data) for _, geo_data in entries]
+
+    legacy_bytes = sum(len(value.encode()) for value in legacy_values) / len(entries)
+    compact_bytes = sum(len(value.encode()) for value in compact_values) / len(entries)
+    print(f"  legacy  value: {legacy_bytes:8.1f} bytes on average, e.g. {legacy_values[0]}")
+    print(f" compact  value: {compact_bytes:8.1f} bytes on average, e.g. {compact_values[0]}")
+
+    legacy_ns = benchmark_decode("legacy", decode_legacy, legacy_values, args.rounds)
+    compact_ns = benchmark_decode("compact", decode_compact, compact_values, args.rounds)
+    print(f"Value size: {compact_bytes / legacy_bytes:.0%} of legacy, decode speedup: {legacy_ns / compact_ns:.2f}x")
+
+    if args.valkey_host:
+        measure_valkey_memory(args.valkey_host, args.valkey_port, entries)
+
+
+if __name__ == "__main__":
+    main()
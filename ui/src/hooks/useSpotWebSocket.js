@@ -1,6 +1,7 @@
 import { is_canada_dxcc_code, is_us_state_dxcc_code } from "@/data/dxcc_entities.js";
 import { continents, modes } from "@/data/filters_data.js";
 import { normalize_spot_dxcc_fields } from "@/utils/spot_dxcc.js";
+import { COLUMNAR_SUBPROTOCOL, decode_spots_message } from "@/utils/spot_frames.js";
 import { find_zone_number } from "@/utils/zones.js";
 import { useCallback, useEffect, useRef, useState } from "react";
 import useWebSocket, { ReadyState } from "react-use-websocket";
@@ -56,6 +57,41 @@ export function trim_spots_to_last_hour(spots) {
     return spots.filter(spot => spot.time > current_time - 3600);
 }
 
+export function max_spot_seq(spots, current_seq) {
+    return spots.reduce(
+        (max_seq, spot) => (Number.isInteger(spot.seq) ? Math.max(max_seq, spot.seq) : max_seq),
+        current_seq,
+    );
+}
+
+// Replay replies carry last_seq and more, live broadcasts do not. While a replay is paging, the
+// cursor follows the replay pages only and live seqs are merged in once the last page arrives,
+// so a live spot never moves the cursor past spots that were not replayed yet.
+export function next_seq_state(seq_state, data) {
+    if (data.last_seq === undefined) {
+        const live_seq = max_spot_seq(data.spots, seq_state.live_seq);
+        if (seq_state.replaying) {
+            return { ...seq_state, live_seq };
+        }
+        return { ...seq_state, last_seq: Math.max(seq_state.last_seq, live_seq), live_seq };
+    }
+    if (data.more) {
+        return { ...seq_state, last_seq: data.last_seq, replaying: true };
+    }
+    return {
+        ...seq_state,
+        last_seq: Math.max(data.last_seq, seq_state.live_seq),
+        replaying: false,
+    };
+}
+
+export function build_reconnect_message(last_seq, last_time) {
+    if (last_seq > 0) {
+        return { last_seq };
+    }
+    return { last_time };
+}
+
 export default function useSpotWebSocket() {
     const [raw_spots, set_spots] = useState([]);
     const [new_spot_ids, set_new_spot_ids] = useState(new Set());
@@ -63,6 +99,7 @@ export default function useSpotWebSocket() {
 
     const [is_first_connection, set_is_first_connection] = useState(true);
     const last_spot_time_ref = useRef(0);
+    const seq_state_ref = useRef({ last_seq: 0, live_seq: 0, replaying: false });
     const next_spot_id_ref = useRef(0);
 
     const { lastJsonMessage, readyState, sendJsonMessage, getWebSocket } = useWebSocket(
@@ -73,9 +110,15 @@ export default function useSpotWebSocket() {
                     sendJsonMessage({ initial: true });
                     set_is_first_connection(false);
                 } else {
-                    sendJsonMessage({ last_time: last_spot_time_ref.current });
+                    sendJsonMessage(
+                        build_reconnect_message(
+                            seq_state_ref.current.last_seq,
+                            last_spot_time_ref.current,
+                        ),
+                    );
                 }
             },
+            protocols: COLUMNAR_SUBPROTOCOL,
             reconnectAttempts: Number.POSITIVE_INFINITY,
             reconnectInterval: attemptNumber => Math.min(5000 * 2 ** (attemptNumber - 1), 30000),
             shouldReconnect: () => true,
@@ -84,7 +127,11 @@ export default function useSpotWebSocket() {
 
     useEffect(() => {
         if (lastJsonMessage) {
-            const data = lastJsonMessage;
+            const data = decode_spots_message(lastJsonMessage);
+            seq_state_ref.current = next_seq_state(seq_state_ref.current, data);
+            if (data.more) {
+                sendJsonMessage({ last_seq: data.last_seq });
+            }
             let new_spots = data.spots
                 .map(spot => {
                     const mode = spot.mode === "DIGITAL" ? "DIGI" : spot.mode;
@@ -11,7 +11,7 @@ import { AdifParser } from "adif-parser-ts";
 
 export const HUNTER_ADIF_MAX_FILE_SIZE_BYTES = 20 * 1024 * 1024;
 export const HUNTER_ADIF_MAX_QSO_RECORDS = 50_000;
-export const HUNTER_RESOLVE_BATCH_SIZE = 100;
+export const HUNTER_RESOLVE_BATCH_SIZE = 1000;
 export const HUNTER_IMPORT_PHASES = Object.freeze({
     PARSING: "parsing",
     PROCESSING: "processing",
@@ -0,0 +1,48 @@
+// Requesting this subprotocol makes /spots_ws send columnar frames, servers without it send spot objects.
+export const COLUMNAR_SUBPROTOCOL = "holycluster.columnar.v1";
+
+const STATION_PREFIXES = ["spotter", "dx"];
+
+// Keys the server only sets when they have a value, so a null in a columnar frame means the key is absent.
+const OPTIONAL_SPOT_KEYS = new Set([
+    "seq",
+    "type",
+    "pota_reference",
+    "pota_name",
+    "pota_description",
+    "sota_points",
+]);
+
+export function decode_columnar_spots(frame) {
+    const { stations, columns } = frame;
+    const spots = [];
+    for (let position = 0; position < frame.length; position++) {
+        const spot = {};
+        for (const prefix of STATION_PREFIXES) {
+            const [callsign, lon, lat] = stations[columns[prefix][position]];
+            spot[`${prefix}_callsign`] = callsign;
+            spot[`${prefix}_loc`] = [lon, lat];
+        }
+        for (const [key, values] of Object.entries(columns)) {
+            if (STATION_PREFIXES.includes(key)) {
+                continue;
+            }
+            const value = values[position];
+            if (value === null && OPTIONAL_SPOT_KEYS.has(key)) {
+                continue;
+            }
+            spot[key] = value;
+        }
+        spots.push(spot);
+    }
+    return spots;
+}
+
+// Returns the message with its spots as objects, whichever frame format the server sent.
+export function decode_spots_message(message) {
+    if (message.format !== "columnar") {
+        return message;
+    }
+    const { stations, columns, length, format, ...fields } = message;
+    return { ...fields, spots: decode_columnar_spots(message) };
+}
@@ -143,10 +143,10 @@ describe("hunter_adif", () => {
         expect(result.hunter.imports).toHaveLength(2);
     });
 
-    it("reports resolver progress by 100-callsign batches", async () => {
+    it("reports resolver progress by 1000-callsign batches", async () => {
         const resolved_batches = [];
         const progress = [];
-        const adif_text = Array.from({ length: 250 }, (_, index) =>
+        const adif_text = Array.from({ length: 2500 }, (_, index) =>
             adif_record({ CALL: `K${index}ABC` }),
         ).join("");
 
@@ -172,7 +172,7 @@ describe("hunter_adif", () => {
             on_progress: update => progress.push(update),
         });
 
-        expect(resolved_batches.map(batch => batch.length)).toEqual([100, 100, 50]);
+        expect(resolved_batches.map(batch => batch.length)).toEqual([1000, 1000, 500]);
         expect(progress.map(update => update.phase)).toEqual([
             "parsing",
             "processing",
@@ -184,12 +184,12 @@ describe("hunter_adif", () => {
             "complete",
         ]);
         expect(progress.filter(update => update.phase === "resolving")).toEqual([
-            { phase: "resolving", completed: 0, total: 250, percentage: 0 },
-            { phase: "resolving", completed: 100, total: 250, percentage: 40 },
-            { phase: "resolving", completed: 200, total: 250, percentage: 80 },
-            { phase: "resolving", completed: 250, total: 250, percentage: 100 },
+            { phase: "resolving", completed: 0, total: 2500, percentage: 0 },
+            { phase: "resolving", completed: 1000, total: 2500, percentage: 40 },
+            { phase: "resolving", completed: 2000, total: 2500, percentage: 80 },
+            { phase: "resolving", completed: 2500, total: 2500, percentage: 100 },
         ]);
-        expect(result.metadata.resolved_count).toBe(250);
+        expect(result.metadata.resolved_count).toBe(2500);
     });
 
     it("worker client falls back when a custom resolver is supplied", async () => {
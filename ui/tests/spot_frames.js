@@ -0,0 +1,53 @@
+import { describe, expect, it } from "vitest";
+
+import { decode_spots_message } from "@/utils/spot_frames.js";
+
+describe("decode_spots_message", () => {
+    it("keeps spot object messages as they are", () => {
+        const message = { type: "update", spots: [{ dx_callsign: "K1ABC" }] };
+        expect(decode_spots_message(message)).toBe(message);
+    });
+
+    it("rebuilds the spots of a columnar frame", () => {
+        const message = {
+            type: "update",
+            format: "columnar",
+            length: 2,
+            stations: [
+                ["4X5BR", 34.8, 32.1],
+                ["K1ABC", -72.5, 41.5],
+            ],
+            columns: {
+                spotter: [0, 1],
+                dx: [1, 0],
+                freq: [14025, 7010],
+                seq: [41, null],
+            },
+            last_seq: 41,
+            more: false,
+        };
+
+        expect(decode_spots_message(message)).toEqual({
+            type: "update",
+            last_seq: 41,
+            more: false,
+            spots: [
+                {
+                    spotter_callsign: "4X5BR",
+                    spotter_loc: [34.8, 32.1],
+                    dx_callsign: "K1ABC",
+                    dx_loc: [-72.5, 41.5],
+                    freq: 14025,
+                    seq: 41,
+                },
+                {
+                    spotter_callsign: "K1ABC",
+                    spotter_loc: [-72.5, 41.5],
+                    dx_callsign: "4X5BR",
+                    dx_loc: [34.8, 32.1],
+                    freq: 7010,
+                },
+            ],
+        });
+    });
+});
@@ -1,8 +1,11 @@
 import { describe, expect, it } from "vitest";
 
 import {
+    build_reconnect_message,
     enrich_spot_zones_if_missing,
     has_valid_enriched_value,
+    max_spot_seq,
+    next_seq_state,
     normalize_band,
     trim_spots_to_last_hour,
 } from "@/hooks/useSpotWebSocket.js";
@@ -252,3 +255,31 @@ describe("check_hunter_needed", () => {
         ).toBe("HI");
     });
 });
+
+describe("reconnect protocol", () => {
+    it("resumes from the last seq once one was received", () => {
+        expect(build_reconnect_message(42, 1000)).toEqual({ last_seq: 42 });
+    });
+
+    it("falls back to last_time without a seq", () => {
+        expect(build_reconnect_message(0, 1000)).toEqual({ last_time: 1000 });
+    });
+
+    it("ignores spots without a seq", () => {
+        expect(max_spot_seq([{ seq: 5 }, {}, { seq: 3 }], 4)).toBe(5);
+        expect(max_spot_seq([{}], 4)).toBe(4);
+    });
+
+    it("keeps live seqs out of the cursor until the replay is done", () => {
+        let seq_state = { last_seq: 10, live_seq: 10, replaying: false };
+        seq_state = next_seq_state(seq_state, { spots: [{ seq: 11 }], last_seq: 11, more: true });
+        seq_state = next_seq_state(seq_state, { spots: [{ seq: 90 }] });
+        expect(seq_state.last_seq).toBe(11);
+
+        seq_state = next_seq_state(seq_state, { spots: [{ seq: 12 }], last_seq: 12, more: false });
+        expect(seq_state).toEqual({ last_seq: 90, live_seq: 90, replaying: false });
+
+        seq_state = next_seq_state(seq_state, { spots: [{ seq: 91 }] });
+        expect(seq_state.last_seq).toBe(91);
+    });
+});